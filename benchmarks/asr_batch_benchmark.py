@@ -0,0 +1,155 @@
+"""
+批量识别基准测试
+模拟多个会话同时结束语音段，比较逐段识别（单识别线程排队）与 ASRScheduler 动态批处理
+的吞吐量（段/秒）与每段识别延迟。
+
+用法:
+    python -m benchmarks.asr_batch_benchmark --fixtures benchmarks/fixtures --concurrency 1,4,8
+    python -m benchmarks.asr_batch_benchmark --synthetic 32 --json result.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.asr_scheduler import ASRScheduler
+from src.audio_manager import AudioManager
+from src.speech_recognition import SpeechRecognizer
+from benchmarks.latency_benchmark import (
+    load_fixture, load_reference, synthetic_fixtures, run_capture, percentiles, peak_rss_mb
+)
+from config import ASR_BATCH_MAX_SIZE, ASR_BATCH_MAX_WAIT
+
+MODES = [
+    ("serial", "逐段识别"),
+    ("batched", "动态批处理"),
+]
+
+def capture_segments(fixtures: list) -> list:
+    """经过真实的 VAD/端点检测切出语音段，返回 [(名称, 语音段, 语音区间)]"""
+    audio_manager = AudioManager()
+    segments = []
+    for name, audio, _ in fixtures:
+        captured = run_capture(audio_manager, audio)
+        if captured is None or captured["segment"] is None:
+            print(f"⚠️ {name}: 未检测到语音段，跳过")
+            continue
+        segments.append((name, captured["segment"], captured["speech_spans"]))
+    return segments
+
+def run_waves(submit, segments: list, concurrency: int) -> dict:
+    """每一波同时提交 concurrency 段语音，全部完成后再提交下一波"""
+    latencies = []
+    texts = {}
+    start = time.perf_counter()
+    for i in range(0, len(segments), concurrency):
+        wave = segments[i:i + concurrency]
+        submitted = time.perf_counter()
+        futures = [(name, submit(segment, spans)) for name, segment, spans in wave]
+        for name, future in futures:
+            texts[name] = future.result()
+            latencies.append(time.perf_counter() - submitted)
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput": len(segments) / elapsed if elapsed else float("nan"),
+        "latency": percentiles(latencies),
+        "texts": texts,
+    }
+
+def run_benchmark(segments: list, concurrency_levels: list, recognizer: SpeechRecognizer = None,
+                  max_batch_size: int = ASR_BATCH_MAX_SIZE, max_wait: float = ASR_BATCH_MAX_WAIT) -> dict:
+    """在各并发度下分别运行逐段与批处理识别"""
+    recognizer = recognizer or SpeechRecognizer()
+    recognizer.wait_ready()  # 模型加载与预热不计入统计
+
+    serial = ThreadPoolExecutor(max_workers=1)
+    scheduler = ASRScheduler(recognizer, max_batch_size=max_batch_size, max_wait=max_wait)
+    submitters = {
+        "serial": lambda segment, spans: serial.submit(recognizer.transcribe, segment, spans),
+        "batched": scheduler.submit,
+    }
+
+    results = []
+    try:
+        for concurrency in concurrency_levels:
+            row = {"concurrency": concurrency}
+            for mode, _ in MODES:
+                row[mode] = run_waves(submitters[mode], segments, concurrency)
+            # 批处理结果与逐段结果不一致的语音段数（批量路径不做温度回退，偶有差异）
+            row["mismatches"] = sum(
+                row["serial"]["texts"][name] != row["batched"]["texts"][name] for name, _, _ in segments
+            )
+            results.append(row)
+    finally:
+        serial.shutdown()
+        scheduler.close()
+
+    return {
+        "utterances": len(segments),
+        "max_batch_size": max_batch_size,
+        "max_wait": max_wait,
+        "levels": results,
+        "scheduler": scheduler.stats(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def format_report(result: dict) -> str:
+    """格式化为文本表格（吞吐量为段/秒，延迟为毫秒）"""
+    lines = [
+        f"📊 批量识别基准（{result['utterances']} 段语音，批次上限 {result['max_batch_size']}，"
+        f"等待 {result['max_wait'] * 1000:.0f} ms）",
+        f"{'并发':>4}  {'方式':<8}{'段/秒':>10}{'p50':>10}{'p95':>10}{'加速':>8}",
+    ]
+    for row in result["levels"]:
+        baseline = row["serial"]["throughput"]
+        for mode, label in MODES:
+            stats = row[mode]
+            lines.append(
+                f"{row['concurrency']:>4}  {label:<8}{stats['throughput']:>10.2f}"
+                f"{stats['latency']['p50'] * 1000:>10.1f}{stats['latency']['p95'] * 1000:>10.1f}"
+                f"{stats['throughput'] / baseline:>7.2f}x"
+            )
+        if row["mismatches"]:
+            lines.append(f"      ⚠️ {row['mismatches']} 段批处理结果与逐段结果不同")
+    stats = result["scheduler"]
+    lines.append(f"平均批次大小: {stats['mean_batch_size']:.2f}（逐段识别 {stats['serial_utterances']} 段）")
+    lines.append(f"峰值内存: {result['peak_rss_mb']:.1f} MB")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="逐段识别与动态批处理识别的吞吐量对比")
+    parser.add_argument("--fixtures", help="WAV 录音目录")
+    parser.add_argument("--synthetic", type=int, default=0, help="生成指定数量的合成片段")
+    parser.add_argument("--concurrency", default="1,4,8", help="同时结束的语音段数，逗号分隔")
+    parser.add_argument("--max-batch-size", type=int, default=ASR_BATCH_MAX_SIZE, help="批次上限")
+    parser.add_argument("--max-wait", type=float, default=ASR_BATCH_MAX_WAIT, help="批次收集等待时间（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", help="将完整结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    fixtures = []
+    if args.fixtures:
+        for path in sorted(glob.glob(os.path.join(args.fixtures, "*.wav"))):
+            fixtures.append((os.path.basename(path), load_fixture(path), load_reference(path)))
+    if args.synthetic:
+        fixtures.extend(synthetic_fixtures(args.synthetic, args.seed))
+    if not fixtures:
+        parser.error("请通过 --fixtures 或 --synthetic 提供测试音频")
+
+    segments = capture_segments(fixtures)
+    if not segments:
+        parser.error("没有检测到任何语音段")
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+
+    result = run_benchmark(segments, levels, max_batch_size=args.max_batch_size, max_wait=args.max_wait)
+    print(format_report(result))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
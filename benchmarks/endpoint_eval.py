@@ -0,0 +1,141 @@
+"""
+语义端点离线评估
+在标注好的文本上评估 EndpointDecider：各积极程度下完整语句的提前结束率、
+不完整语句被提前截断的比例，以及平均端点等待时间与节省的时间。
+
+数据为 JSONL，每行 {"text": 部分识别结果, "complete": 是否已说完}；未提供时使用内置样例。
+
+用法:
+    python -m benchmarks.endpoint_eval
+    python -m benchmarks.endpoint_eval --data labels.jsonl --levels 0,0.25,0.5,0.75,1
+    python -m benchmarks.endpoint_eval --data labels.jsonl --fit --save endpoint_weights.json
+"""
+
+import argparse
+import json
+
+import numpy as np
+
+from src.endpointing import EndpointDecider, extract_features, load_weights, DEFAULT_WEIGHTS, FEATURES
+from config import SILENCE_DURATION, ENDPOINT_MIN_SILENCE
+
+# 内置样例：(文本, 是否已说完)
+SAMPLES = [
+    ("今天天气怎么样？", True),
+    ("帮我设置一个明天早上七点的闹钟。", True),
+    ("你知道北京有哪些好吃的吗", True),
+    ("这个问题你怎么看呢", True),
+    ("好的", True),
+    ("谢谢", True),
+    ("给我讲个笑话吧", True),
+    ("现在几点了", True),
+    ("我想去上海旅游，有什么推荐的地方吗？", True),
+    ("What's the weather like today?", True),
+    ("Can you tell me a joke", True),
+    ("Thank you", True),
+    ("我想问一下", False),
+    ("然后", False),
+    ("我觉得这个方案的", False),
+    ("你能不能帮我", False),
+    ("如果明天下雨的话，", False),
+    ("嗯，那个", False),
+    ("我们先去超市然后", False),
+    ("因为", False),
+    ("I was wondering if", False),
+    ("Tell me about the", False),
+    ("So what I want is, um", False),
+    ("帮我查一下北京和", False),
+]
+
+def load_samples(path: str) -> list:
+    """读取 JSONL 标注数据"""
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                samples.append((item["text"], bool(item["complete"])))
+    return samples
+
+def evaluate(samples: list, levels: list, weights: dict = None) -> list:
+    """按积极程度逐级评估，端点等待时间以 SILENCE_DURATION / ENDPOINT_MIN_SILENCE 计"""
+    complete = [text for text, label in samples if label]
+    incomplete = [text for text, label in samples if not label]
+    results = []
+    for level in levels:
+        decider = EndpointDecider(aggressiveness=level, weights=weights)
+        waits = [decider.required_silence(text) for text, _ in samples]
+        early = sum(decider.required_silence(text) < SILENCE_DURATION for text in complete)
+        cutoff = sum(decider.required_silence(text) < SILENCE_DURATION for text in incomplete)
+        mean_wait = sum(waits) / len(waits)
+        results.append({
+            "aggressiveness": level,
+            "threshold": decider.threshold,
+            "early_rate": early / len(complete) if complete else float("nan"),
+            "false_cutoff_rate": cutoff / len(incomplete) if incomplete else float("nan"),
+            "mean_wait": mean_wait,
+            "saved": max(SILENCE_DURATION - mean_wait, 0.0),
+        })
+    return results
+
+def fit_weights(samples: list, epochs: int = 2000, learning_rate: float = 0.5, l2: float = 0.01) -> dict:
+    """用梯度下降在标注数据上拟合逻辑回归权重（从默认权重开始）"""
+    x = np.array([[extract_features(text)[name] for name in FEATURES] for text, _ in samples])
+    y = np.array([float(label) for _, label in samples])
+    w = np.array([DEFAULT_WEIGHTS[name] for name in FEATURES])
+    b = DEFAULT_WEIGHTS["bias"]
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(x @ w + b)))
+        error = p - y
+        w -= learning_rate * (x.T @ error / len(y) + l2 * w)
+        b -= learning_rate * error.mean()
+    weights = {"bias": round(float(b), 4)}
+    weights.update({name: round(float(value), 4) for name, value in zip(FEATURES, w)})
+    return weights
+
+def format_report(results: list, count: int) -> str:
+    """格式化为文本表格（时间单位为秒）"""
+    lines = [
+        f"📊 语义端点评估（{count} 条样本，完整静音 {SILENCE_DURATION} 秒，提前结束静音 {ENDPOINT_MIN_SILENCE} 秒）",
+        f"{'积极程度':>8}{'阈值':>8}{'提前结束':>10}{'误截断':>10}{'平均等待':>10}{'节省':>8}",
+    ]
+    for row in results:
+        lines.append(
+            f"{row['aggressiveness']:>8.2f}{row['threshold']:>8.2f}{row['early_rate']:>10.0%}"
+            f"{row['false_cutoff_rate']:>10.0%}{row['mean_wait']:>10.2f}{row['saved']:>8.2f}"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="语义端点判定的离线评估")
+    parser.add_argument("--data", help="JSONL 标注数据（text, complete），默认使用内置样例")
+    parser.add_argument("--levels", default="0,0.25,0.5,0.75,1", help="积极程度，逗号分隔")
+    parser.add_argument("--weights", help="分类器权重 JSON，默认使用内置权重")
+    parser.add_argument("--fit", action="store_true", help="在标注数据上拟合分类器权重")
+    parser.add_argument("--save", help="将拟合得到的权重写入 JSON 文件（配合 ENDPOINT_WEIGHTS_FILE 使用）")
+    parser.add_argument("--json", help="将完整结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    samples = load_samples(args.data) if args.data else SAMPLES
+    if not samples:
+        parser.error("标注数据为空")
+    levels = [float(level) for level in args.levels.split(",") if level.strip()]
+
+    weights = load_weights(args.weights) if args.weights else DEFAULT_WEIGHTS
+    if args.fit:
+        weights = fit_weights(samples)
+        print(f"🧮 拟合权重: {json.dumps(weights, ensure_ascii=False)}")
+        if args.save:
+            with open(args.save, "w", encoding="utf-8") as f:
+                json.dump(weights, f, ensure_ascii=False, indent=2)
+
+    results = evaluate(samples, levels, weights=weights)
+    print(format_report(results, len(samples)))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"weights": weights, "levels": results}, f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+基准测试替身
+可配置延迟、结果确定的进程内 LLM 与 TTS 替身，接口与 AsyncOpenAI / TextToSpeech 一致
+（经过 HTTP 的 LLM 替身见 src/mock_llm_server.py）
+"""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+from src.mock_llm_server import split_tokens
+from src.mock_tts import MockTTS, SILENT_MP3_FRAME, SILENT_MP3_FRAME_DURATION
+
+DEFAULT_REPLY = "好的，我明白了。今天天气晴朗，气温二十度左右，适合出门散步。还有什么可以帮你的吗？"
+
+def _chunk(content: str):
+    """构造与 OpenAI 流式响应结构一致的数据块"""
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content))])
+
+class FakeChatStream:
+    """流式响应替身"""
+
+    def __init__(self, tokens: list, first_token_latency: float, token_interval: float,
+                 jitter: float, rng: random.Random):
+        self.tokens = tokens
+        self.first_token_latency = first_token_latency
+        self.token_interval = token_interval
+        self.jitter = jitter
+        self.rng = rng
+
+    def _delay(self, base: float) -> float:
+        return max(0.0, base + self.rng.uniform(-self.jitter, self.jitter) * base)
+
+    def __aiter__(self):
+        return self._generate()
+
+    async def _generate(self):
+        await asyncio.sleep(self._delay(self.first_token_latency))
+        for i, token in enumerate(self.tokens):
+            if i:
+                await asyncio.sleep(self._delay(self.token_interval))
+            yield _chunk(token)
+
+    async def close(self):
+        pass
+
+class FakeChatClient:
+    """AsyncOpenAI 替身：首 token 延迟、token 速率与抖动可配置，随机种子固定"""
+
+    def __init__(self, reply: str = DEFAULT_REPLY, first_token_latency: float = 0.3,
+                 tokens_per_second: float = 40.0, jitter: float = 0.0, seed: int = 0):
+        self.reply = reply
+        self.first_token_latency = first_token_latency
+        self.token_interval = 1.0 / tokens_per_second
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _tokens(self) -> list:
+        return split_tokens(self.reply)
+
+    async def _create(self, model=None, messages=None, max_tokens=None, stream=False, **kwargs):
+        tokens = self._tokens()
+        if stream:
+            return FakeChatStream(tokens, self.first_token_latency, self.token_interval,
+                                  self.jitter, self.rng)
+
+        await asyncio.sleep(self.first_token_latency + self.token_interval * len(tokens))
+        message = SimpleNamespace(content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+# TTS 替身与应用内 TTS_BACKEND = "mock" 使用同一实现
+FakeTTS = MockTTS
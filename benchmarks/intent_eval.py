@@ -0,0 +1,95 @@
+"""
+本地命令匹配离线评估
+在标注好的文本上检查 IntentRouter：命令及其常见变体应命中对应意图，
+与命令字面相近的普通说法（“结束后”“说再见”“停止了”等）不应被当作命令。
+
+数据为 JSONL，每行 {"text": 识别结果, "intent": 期望意图或 null}；未提供时使用内置样例。
+存在误判时以非零状态码退出，可在修改命令表或匹配阈值后直接运行回归。
+
+用法:
+    python -m benchmarks.intent_eval
+    python -m benchmarks.intent_eval --data intents.jsonl --threshold 85
+"""
+
+import argparse
+import json
+import sys
+
+from src.intent_router import IntentRouter
+from config import INTENT_FUZZY_THRESHOLD
+
+# 内置样例：(文本, 期望意图，None 表示不应命中命令)
+SAMPLES = [
+    ("退出", "exit"),
+    ("退出吧", "exit"),
+    ("再见！", "exit"),
+    ("Quit.", "exit"),
+    ("停", "stop"),
+    ("别说了啊", "stop"),
+    ("Stop!", "stop"),
+    ("再说一遍", "repeat"),
+    ("Say that agian", "repeat"),
+    ("大声点", "louder"),
+    ("声音大点", "louder"),
+    ("小声一点吧", "quieter"),
+    ("清空历史吧", "clear_history"),
+    ("Clear histroy", "clear_history"),
+    # 与命令字面相近的普通说法
+    ("结束后", None),
+    ("结束了", None),
+    ("结束了吗", None),
+    ("再见面", None),
+    ("说再见", None),
+    ("退出去", None),
+    ("停止了", None),
+    ("停电了", None),
+    ("stop it", None),
+    ("exit code", None),
+    ("声音好大", None),
+    ("今天天气怎么样", None),
+]
+
+def load_samples(path: str) -> list:
+    """读取 JSONL 标注数据"""
+    samples = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                item = json.loads(line)
+                samples.append((item["text"], item.get("intent")))
+    return samples
+
+def evaluate(samples: list, router: IntentRouter) -> list:
+    """逐条匹配，返回 (文本, 期望意图, 实际结果) 列表"""
+    return [(text, expected, router.match(text)) for text, expected in samples]
+
+def format_report(results: list) -> str:
+    """格式化为文本报告，列出所有误判"""
+    errors = [(text, expected, match) for text, expected, match in results
+              if (match.intent if match else None) != expected]
+    commands = sum(expected is not None for _, expected, _ in results)
+    lines = [f"📊 本地命令匹配评估（{len(results)} 条样本，其中命令 {commands} 条）"]
+    for text, expected, match in errors:
+        got = f"{match.intent}（{match.method}: {match.phrase}, {match.score}）" if match else "未命中"
+        lines.append(f"❌ {text!r}: 期望 {expected or '未命中'}，实际 {got}")
+    lines.append(f"✅ 正确 {len(results) - len(errors)}/{len(results)}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="本地命令匹配的离线评估")
+    parser.add_argument("--data", help="JSONL 标注数据（text, intent），默认使用内置样例")
+    parser.add_argument("--threshold", type=int, default=INTENT_FUZZY_THRESHOLD, help="模糊匹配阈值")
+    args = parser.parse_args()
+
+    samples = load_samples(args.data) if args.data else SAMPLES
+    if not samples:
+        parser.error("标注数据为空")
+
+    results = evaluate(samples, IntentRouter(fuzzy_threshold=args.threshold))
+    print(format_report(results))
+    if any((match.intent if match else None) != expected for _, expected, match in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+打断响应基准测试
+用慢速 LLM 替身驱动 ConversationManager 的流式回复，在回复中途模拟用户插话，
+测量从打断到本轮结束（可以开始处理下一段语音）的时间。
+
+LLM 生成下一句期间被打断时，回复应在 INTERRUPT_POLL_INTERVAL 量级内结束，
+而不是等到下一句生成出来；超过 --max-latency 时以非零状态码退出。
+回复音频经 WebSocketAudioManager 发往空的发送函数，无需声卡、网络或 Whisper 模型。
+
+用法:
+    python -m benchmarks.interrupt_benchmark
+    python -m benchmarks.interrupt_benchmark --llm-tokens-per-second 5 --interrupt-after 2 --turns 10
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.conversation_manager import ConversationManager
+from src.latency_tracer import LatencyTracer
+from src.session_server import WebSocketAudioManager
+from src.signal_handler import SignalHandler
+from benchmarks.fakes import FakeChatClient, FakeTTS
+
+# 长句回复：句子之间相隔数十个 token，打断多半发生在等待下一句期间
+LONG_REPLY = (
+    "从前有座山山里有座庙庙里有个老和尚正在给小和尚讲一个很长很长的故事。"
+    "故事讲的是从前有座山山里有座庙庙里有个老和尚正在给小和尚讲一个很长很长的故事。"
+    "这个故事没有结尾所以只能一直讲下去直到有人打断为止。"
+)
+
+async def discard(data):
+    """回复音频的发送函数：直接丢弃"""
+
+async def run_turn(manager: ConversationManager, user_input: str, interrupt_after: float) -> dict:
+    """发起一轮回复，interrupt_after 秒后模拟插话，返回打断到本轮结束的时间"""
+    trace = manager.tracer.new_turn()
+    turn = asyncio.ensure_future(manager._handle_turn(user_input, trace))
+    await asyncio.wait((turn,), timeout=interrupt_after)
+    if turn.done():
+        return {"completed": True, "latency": None}
+
+    interrupted_at = time.perf_counter()
+    manager._on_barge_in()
+    await turn
+    return {"completed": False, "latency": time.perf_counter() - interrupted_at}
+
+async def run_benchmark(client: FakeChatClient, tts: FakeTTS, turns: int, interrupt_after: float) -> dict:
+    """依次进行多轮被打断的回复，返回打断延迟统计"""
+    manager = ConversationManager(
+        SignalHandler(install=False),
+        audio_manager=WebSocketAudioManager(discard),
+        # 本基准只测回复阶段，不经过语音识别
+        speech_recognizer=SimpleNamespace(wait_ready=lambda: None),
+        tts=tts,
+        client=client,
+        tracer=LatencyTracer(trace_file=None),
+        session_store=None,
+    )
+    manager.response_cache = None  # 每轮都请求 LLM
+
+    results = []
+    for i in range(turns):
+        results.append(await run_turn(manager, f"讲一个很长的故事（第 {i + 1} 次）", interrupt_after))
+
+    latencies = [result["latency"] for result in results if result["latency"] is not None]
+    return {
+        "turns": results,
+        "interrupted": len(latencies),
+        "latency_p50": float(np.percentile(latencies, 50)) if latencies else float("nan"),
+        "latency_max": max(latencies) if latencies else float("nan"),
+        "token_interval": client.token_interval,
+    }
+
+def format_report(result: dict, interrupt_after: float) -> str:
+    """格式化为文本报告（毫秒）"""
+    lines = [
+        f"📊 打断响应（{len(result['turns'])} 轮，回复开始 {interrupt_after} 秒后插话，"
+        f"LLM token 间隔 {result['token_interval'] * 1000:.0f} ms）",
+    ]
+    if result["interrupted"]:
+        lines.append(f"打断到本轮结束 p50 / max: {result['latency_p50'] * 1000:.1f} / {result['latency_max'] * 1000:.1f} ms")
+    completed = len(result["turns"]) - result["interrupted"]
+    if completed:
+        lines.append(f"⚠️ {completed} 轮在插话前已完成回复，请减小 --interrupt-after 或降低 LLM 速度")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="流式回复的打断响应基准测试")
+    parser.add_argument("--turns", type=int, default=5, help="回复轮数")
+    parser.add_argument("--interrupt-after", type=float, default=1.0, help="回复开始多少秒后插话")
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="替身 LLM 首 token 延迟（秒）")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=10.0, help="替身 LLM 生成速度")
+    parser.add_argument("--tts-first-byte", type=float, default=0.2, help="替身 TTS 首字节延迟（秒）")
+    parser.add_argument("--max-latency", type=float, default=0.5, help="打断到本轮结束的最长允许时间（秒）")
+    parser.add_argument("--json", help="将完整结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    client = FakeChatClient(reply=LONG_REPLY, first_token_latency=args.llm_first_token,
+                            tokens_per_second=args.llm_tokens_per_second)
+    tts = FakeTTS(first_byte_latency=args.tts_first_byte)
+    result = asyncio.run(run_benchmark(client, tts, args.turns, args.interrupt_after))
+    print(format_report(result, args.interrupt_after))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if result["interrupted"] and result["latency_max"] > args.max_latency:
+        print(f"❌ 打断响应超过 {args.max_latency} 秒")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+端到端延迟基准测试
+用 WAV 录音驱动真实的 AudioManager VAD/端点检测与 SpeechRecognizer.transcribe，
+LLM 与 TTS 使用可配置延迟的确定性替身，无需麦克风、网络或 GPU。
+
+有参考文本时同时统计识别错误率（WER，中日韩文字按字计），
+--decoding 可依次比较多种 Whisper 解码策略的速度与准确率。
+--session 以内存映射方式回放会话存储中录下的用户语音，参考文本为当时的识别结果。
+
+用法:
+    python -m benchmarks.latency_benchmark --fixtures benchmarks/fixtures
+    python -m benchmarks.latency_benchmark --fixtures benchmarks/fixtures --decoding adaptive,greedy,beam
+    python -m benchmarks.latency_benchmark --synthetic 20 --json result.json
+    python -m benchmarks.latency_benchmark --session logs/sessions/20240101-120000
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+from src.audio_manager import AudioManager
+from src.speech_recognition import SpeechRecognizer
+from src.resampler import resample
+from src.session_store import SessionStore
+from src.text_segmenter import SentenceSplitter
+from benchmarks.fakes import FakeChatClient, FakeTTS
+from config import (
+    SAMPLE_RATE, ASR_SAMPLE_RATE, BUFFER_SIZE, SILENCE_DURATION, MODEL_NAME, MAX_TOKENS, WHISPER_DECODING
+)
+
+# 每段录音前后补充的静音（秒），前者供 VAD 估计噪声底，后者保证端点检测能够触发
+LEAD_SILENCE = 0.5
+TRAIL_SILENCE = SILENCE_DURATION + 1.0
+
+STAGES = [
+    ("endpoint", "端点等待"),
+    ("asr", "语音识别"),
+    ("llm_first_token", "LLM 首 token"),
+    ("llm_first_sentence", "LLM 首句"),
+    ("llm_total", "LLM 完整回复"),
+    ("tts_first_byte", "TTS 首字节"),
+    ("first_audio", "端到端首音频"),
+]
+
+# WER 分词：中日韩文字逐字计，其余按连续的字母数字计
+WER_TOKEN_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]|[^\W_]+")
+
+def wer_tokens(text: str) -> list:
+    """规范化（全半角统一、小写、去标点）后切分为 WER 计算单位"""
+    return WER_TOKEN_PATTERN.findall(unicodedata.normalize("NFKC", text or "").lower())
+
+def edit_distance(reference: list, hypothesis: list) -> int:
+    """词级编辑距离（替换、删除、插入各计 1）"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i]
+        for j, hyp in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp)))
+        previous = current
+    return previous[-1]
+
+def word_error_rate(pairs: list) -> float:
+    """语料级 WER：总编辑距离 / 参考文本总长度，pairs 为 [(参考文本, 识别结果)]"""
+    errors = total = 0
+    for reference, hypothesis in pairs:
+        ref = wer_tokens(reference)
+        errors += edit_distance(ref, wer_tokens(hypothesis))
+        total += len(ref)
+    return errors / total if total else float("nan")
+
+def load_fixture(path: str) -> np.ndarray:
+    """读取 WAV 并转换为采集采样率的单声道 float32"""
+    import soundfile as sf
+
+    audio, rate = sf.read(path, dtype="float32", always_2d=True)
+    audio = audio.mean(axis=1)
+    return resample(audio, rate, SAMPLE_RATE)
+
+def load_reference(path: str) -> str:
+    """读取与 WAV 同名的 .txt 参考文本（可选）"""
+    text_path = os.path.splitext(path)[0] + ".txt"
+    if not os.path.exists(text_path):
+        return None
+    with open(text_path, encoding="utf-8") as f:
+        return f.read().strip()
+
+def session_fixtures(path: str) -> list:
+    """回放会话存储中的用户语音（按轮次从内存映射读取），当时的识别结果作为参考文本"""
+    store = SessionStore(path, fsync=False)
+    fixtures = []
+    try:
+        for i, record in enumerate(store.records()):
+            pcm = store.user_pcm(i)
+            if not len(pcm):
+                continue
+            audio = resample(pcm.astype(np.float32) / 32767, store.sample_rate, SAMPLE_RATE)
+            fixtures.append((f"{os.path.basename(path.rstrip(os.sep))}#{i}", audio, record["user"] or None))
+    finally:
+        store.close()
+    return fixtures
+
+def synthetic_fixtures(count: int, seed: int = 0) -> list:
+    """生成类语音的调幅噪声片段（只用于测量延迟，识别结果无意义）"""
+    rng = np.random.default_rng(seed)
+    fixtures = []
+    for i in range(count):
+        duration = rng.uniform(1.0, 6.0)
+        t = np.arange(int(duration * SAMPLE_RATE)) / SAMPLE_RATE
+        envelope = 0.5 * (1 + np.sin(2 * np.pi * 3 * t)) * 0.3
+        carrier = np.sin(2 * np.pi * 180 * t) + 0.3 * rng.standard_normal(len(t))
+        fixtures.append((f"synthetic-{i:03d}", (envelope * carrier).astype(np.float32), None))
+    return fixtures
+
+def run_capture(audio_manager: AudioManager, audio: np.ndarray) -> dict:
+    """按采集块大小把录音送入 AudioManager，返回切出的语音段与端点延迟"""
+    padded = np.concatenate((
+        np.zeros(int(LEAD_SILENCE * SAMPLE_RATE), dtype=np.float32),
+        audio,
+        np.zeros(int(TRAIL_SILENCE * SAMPLE_RATE), dtype=np.float32),
+    ))
+
+    audio_manager.begin_listening()
+    cpu_start = time.process_time()
+    for i in range(0, len(padded), BUFFER_SIZE):
+        audio_manager.feed(padded[i:i + BUFFER_SIZE])
+        if audio_manager.segment_ready.is_set():
+            break
+    capture_cpu = time.process_time() - cpu_start
+    fed = min(i + BUFFER_SIZE, len(padded)) / SAMPLE_RATE
+
+    if not audio_manager.segment_ready.is_set():
+        audio_manager.cancel_recording()
+        return None
+
+    segment = audio_manager.wait_segment()
+    return {
+        "segment": None if segment is None else segment.copy(),
+        "speech_spans": audio_manager.segment_speech_spans(),
+        # 端点延迟：最后一个 VAD 语音帧之后到端点判定之间经过的音频时长
+        "endpoint": (audio_manager.ring.total - audio_manager.speech_end) / ASR_SAMPLE_RATE,
+        "capture_rtf": capture_cpu / fed,
+    }
+
+async def run_response(client: FakeChatClient, tts: FakeTTS, user_input: str) -> dict:
+    """流式获取替身 LLM 回复，测量首 token、首句与首音频字节的时间"""
+    start = time.perf_counter()
+    timings = {}
+    splitter = SentenceSplitter()
+    first_sentence = None
+
+    stream = await client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=[{"role": "user", "content": user_input}],
+        max_tokens=MAX_TOKENS,
+        stream=True
+    )
+    async for chunk in stream:
+        delta = chunk.choices[0].delta.content
+        if not delta:
+            continue
+        timings.setdefault("llm_first_token", time.perf_counter() - start)
+        sentences = splitter.feed(delta)
+        if sentences and first_sentence is None:
+            first_sentence = sentences[0]
+            timings["llm_first_sentence"] = time.perf_counter() - start
+    timings["llm_total"] = time.perf_counter() - start
+
+    if first_sentence is None:
+        first_sentence = splitter.flush()
+        timings["llm_first_sentence"] = timings["llm_total"]
+
+    tts_start = time.perf_counter()
+    async for _ in tts.stream(first_sentence):
+        timings["tts_first_byte"] = time.perf_counter() - tts_start
+        break
+    return timings
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return float("nan")
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"p50": float("nan"), "p95": float("nan"), "p99": float("nan"), "mean": float("nan")}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": float(np.mean(values))}
+
+def run_benchmark(fixtures: list, client: FakeChatClient, tts: FakeTTS,
+                  recognizer: SpeechRecognizer = None) -> dict:
+    """依次处理所有录音，返回各阶段延迟统计"""
+    recognizer = recognizer or SpeechRecognizer()
+    recognizer.wait_ready()  # 模型加载与预热不计入统计
+    audio_manager = AudioManager()
+
+    samples = {key: [] for key, _ in STAGES}
+    asr_rtf = []
+    capture_rtf = []
+    turns = []
+
+    for name, audio, reference in fixtures:
+        captured = run_capture(audio_manager, audio)
+        if captured is None or captured["segment"] is None:
+            print(f"⚠️ {name}: 未检测到语音段，跳过")
+            continue
+
+        segment = captured["segment"]
+        asr_start = time.perf_counter()
+        text = recognizer.transcribe(segment, captured["speech_spans"])
+        asr = time.perf_counter() - asr_start
+
+        timings = asyncio.run(run_response(client, tts, text or "你好"))
+        timings["endpoint"] = captured["endpoint"]
+        timings["asr"] = asr
+        timings["first_audio"] = (
+            captured["endpoint"] + asr + timings["llm_first_sentence"] + timings["tts_first_byte"]
+        )
+
+        for key, _ in STAGES:
+            samples[key].append(timings[key])
+        asr_rtf.append(asr / (len(segment) / ASR_SAMPLE_RATE))
+        capture_rtf.append(captured["capture_rtf"])
+        turns.append({"name": name, "text": text, "reference": reference, **timings})
+
+    references = [(turn["reference"], turn["text"]) for turn in turns if turn["reference"] is not None]
+    return {
+        "turns": turns,
+        "stages": {key: percentiles(values) for key, values in samples.items()},
+        "asr_rtf": percentiles(asr_rtf),
+        "capture_rtf": percentiles(capture_rtf),
+        "wer": word_error_rate(references),
+        "wer_utterances": len(references),
+        "decoding": recognizer.decoding_stats(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+def format_report(result: dict) -> str:
+    """格式化为文本表格（毫秒）"""
+    lines = [
+        f"📊 延迟基准（{len(result['turns'])} 段录音，单位 ms）",
+        f"{'阶段':<12}{'p50':>10}{'p95':>10}{'p99':>10}{'mean':>10}",
+    ]
+    for key, label in STAGES:
+        stats = result["stages"][key]
+        lines.append(
+            f"{label:<12}" + "".join(f"{stats[p] * 1000:>10.1f}" for p in ("p50", "p95", "p99", "mean"))
+        )
+    lines.append(f"ASR 实时率 p50/p95: {result['asr_rtf']['p50']:.3f} / {result['asr_rtf']['p95']:.3f}")
+    lines.append(f"采集处理实时率 p50/p95: {result['capture_rtf']['p50']:.4f} / {result['capture_rtf']['p95']:.4f}")
+    if result["wer_utterances"]:
+        lines.append(f"WER: {result['wer'] * 100:.1f}%（{result['wer_utterances']} 段有参考文本）")
+    decoding = result["decoding"]
+    lines.append(f"解码策略: {decoding['decoding']}，束搜索回退率 {decoding['fallback_rate'] * 100:.1f}%")
+    lines.append(f"峰值内存: {result['peak_rss_mb']:.1f} MB")
+    return "\n".join(lines)
+
+def format_comparison(results: dict) -> str:
+    """多种解码策略的速度与准确率对比（毫秒）"""
+    lines = [
+        "📊 解码策略对比",
+        f"{'策略':<10}{'ASR p50':>10}{'ASR p95':>10}{'实时率':>8}{'WER':>8}{'回退率':>8}",
+    ]
+    for decoding, result in results.items():
+        asr = result["stages"]["asr"]
+        wer = f"{result['wer'] * 100:.1f}%" if result["wer_utterances"] else "-"
+        lines.append(
+            f"{decoding:<10}{asr['p50'] * 1000:>10.1f}{asr['p95'] * 1000:>10.1f}"
+            f"{result['asr_rtf']['p50']:>8.3f}{wer:>8}{result['decoding']['fallback_rate'] * 100:>7.1f}%"
+        )
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="离线端到端延迟基准测试")
+    parser.add_argument("--fixtures", help="WAV 录音目录（同名 .txt 为可选参考文本）")
+    parser.add_argument("--synthetic", type=int, default=0, help="生成指定数量的合成片段")
+    parser.add_argument("--session", help="回放会话存储目录中录下的用户语音")
+    parser.add_argument("--llm-first-token", type=float, default=0.3, help="替身 LLM 首 token 延迟（秒）")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=40.0, help="替身 LLM 生成速度")
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="替身 LLM 延迟抖动比例")
+    parser.add_argument("--tts-first-byte", type=float, default=0.2, help="替身 TTS 首字节延迟（秒）")
+    parser.add_argument("--decoding", default=WHISPER_DECODING,
+                        help="Whisper 解码策略（adaptive / greedy / beam），逗号分隔时依次比较")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument("--json", help="将完整结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    fixtures = []
+    if args.fixtures:
+        for path in sorted(glob.glob(os.path.join(args.fixtures, "*.wav"))):
+            fixtures.append((os.path.basename(path), load_fixture(path), load_reference(path)))
+    if args.session:
+        fixtures.extend(session_fixtures(args.session))
+    if args.synthetic:
+        fixtures.extend(synthetic_fixtures(args.synthetic, args.seed))
+    if not fixtures:
+        parser.error("请通过 --fixtures、--session 或 --synthetic 提供测试音频")
+
+    client = FakeChatClient(first_token_latency=args.llm_first_token,
+                            tokens_per_second=args.llm_tokens_per_second,
+                            jitter=args.llm_jitter, seed=args.seed)
+    tts = FakeTTS(first_byte_latency=args.tts_first_byte)
+
+    # 各策略共用同一个已加载的模型
+    recognizer = SpeechRecognizer()
+    results = {}
+    for decoding in [d.strip() for d in args.decoding.split(",") if d.strip()]:
+        recognizer.set_decoding(decoding)
+        results[decoding] = run_benchmark(fixtures, client, tts, recognizer)
+        print(format_report(results[decoding]))
+    if len(results) > 1:
+        print(format_comparison(results))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results if len(results) > 1 else next(iter(results.values())),
+                      f, ensure_ascii=False, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -3,31 +3,182 @@ API_KEY = "your_api_key"
 BASE_URL = "your_base_url"
 MODEL_NAME = "your_model_name"
 MAX_TOKENS = 300
+LLM_BACKEND = "openai"         # "openai" 连接 BASE_URL / "mock" 使用本地替身服务（离线压测）
+
+# LLM 连接池配置
+LLM_HTTP2 = True               # 启用 HTTP/2（需安装 h2，否则使用 HTTP/1.1 keep-alive）
+LLM_MAX_CONNECTIONS = 4        # 连接池最大连接数
+LLM_KEEPALIVE_EXPIRY = 120.0   # 空闲连接保留时长（秒）
+LLM_CONNECT_TIMEOUT = 5.0      # 建立连接超时（秒）
+LLM_READ_TIMEOUT = 60.0        # 请求超时（秒）
+LLM_PRECONNECT_ON_SPEECH = True   # 检测到用户说话即预连接，握手与说话重叠
+LLM_KEEPALIVE_PING_INTERVAL = 15.0   # 用户说话期间的保活间隔（秒），0 表示不发送保活请求
 
 # Whisper 模型配置
 WHISPER_MODEL_PATH = "faster-whisper-base"
 WHISPER_DEVICE = "cpu"
 WHISPER_COMPUTE_TYPE = "int8"
+WHISPER_WARMUP = True          # 模型加载后解码一段静音，预热推理内核
+WHISPER_DECODING = "adaptive"  # 解码策略：adaptive 先贪心、低置信度时改用束搜索 / greedy / beam
+WHISPER_BEAM_SIZE = 5          # 束搜索宽度
+WHISPER_LOGPROB_THRESHOLD = -0.7           # 贪心结果平均对数概率低于此值时改用束搜索
+WHISPER_COMPRESSION_RATIO_THRESHOLD = 2.4  # 贪心结果压缩比高于此值（重复输出）时改用束搜索
+WHISPER_LANGUAGE = None        # 固定识别语言（如 "zh"），None 表示自动检测
+WHISPER_PIN_LANGUAGE = True    # 自动检测时，首次高置信度识别后固定语言，跳过逐段的语言检测
+WHISPER_LANGUAGE_PIN_PROBABILITY = 0.8     # 固定语言所需的检测置信度
+STREAMING_ASR = False          # 录音过程中流式识别，语音结束后只解码未提交的尾部
+STREAMING_ASR_INTERVAL = 0.5   # 后台解码间隔（秒）
+STREAMING_ASR_MIN_AUDIO = 1.0  # 未提交音频达到该时长（秒）才开始解码
 
 # 音频录制配置
 SAMPLE_RATE = 44100            # 采样率
-SILENCE_THRESHOLD = 0.1        # 静音阈值
-SILENCE_DURATION = 1.5         # 静音时长（秒）
+ASR_SAMPLE_RATE = 16000        # 识别采样率（采集时一次性重采样）
+ASR_WORKER_PROCESSES = 0       # 识别工作进程数（各自加载模型），0 表示在主进程中识别
+ASR_WORKER_CPU_THREADS = 2     # 每个工作进程的推理线程数（进程数 × 线程数 ≈ 物理核数为宜）
+ASR_WORKER_TASK_TIMEOUT = 60.0 # 单次识别超时（秒），超时的工作进程会被重启
+ASR_WORKER_HEALTH_INTERVAL = 1.0  # 工作进程健康检查间隔（秒）
+ASR_BATCH_MAX_SIZE = 8         # 批量识别的最大语音段数（服务端多会话共享模型时）
+ASR_BATCH_MAX_WAIT = 0.01      # 检测到并发时，等待其他语音段加入批次的最长时间（秒）
+SILENCE_THRESHOLD = 0.1        # 静音阈值（VAD_BACKEND = "rms" 时使用）
+SILENCE_DURATION = 0.8         # 端点静音时长（秒），语音结束后等待该时长即停止录音
 BUFFER_SIZE = 1024             # 读取帧大小
+PRE_ROLL_DURATION = 0.3        # 语音段起点前保留的时长（秒），避免词首被截断
+MAX_RECORD_DURATION = 30       # 单段语音最长时长（秒）
+RING_BUFFER_DURATION = 60      # 采集环形缓冲区容量（秒），需大于单段最长时长
+
+# VAD 配置
+VAD_BACKEND = "adaptive"       # "adaptive": 自适应噪声底；"rms": 固定 SILENCE_THRESHOLD
+VAD_FRAME_DURATION = 0.01      # VAD 帧长（秒）
+VAD_SNR_DB = 12                # 高于噪声底多少分贝判为语音
+VAD_MIN_DB = -50               # 语音帧的最低能量（dBFS）
+VAD_MAX_ZCR = 0.35             # 低能量帧过零率超过该值视为宽带噪声
+VAD_HANGOVER = 0.2             # 语音帧后的拖尾时长（秒）
+VAD_NOISE_WINDOW = 3.0         # 噪声底估计窗口（秒），取窗口内的最小帧能量
+VAD_SPAN_MERGE_GAP = 0.3       # 间隔小于该值的语音区间合并（秒）
+VAD_TAIL_PADDING = 0.2         # 语音段在最后一个语音帧之后保留的时长（秒）
 
 # TTS 配置
 TTS_VOICE = "zh-CN-XiaoxiaoNeural"
+TTS_BACKEND = "edge"           # "edge" 使用 Edge TTS / "mock" 使用本地替身（定时产出静音音频）
+TTS_CACHE_ENABLED = True       # 缓存合成结果，重复文本无需再次请求
+TTS_CACHE_DIR = ".cache/tts"   # 磁盘缓存目录（跨进程重启保留）
+TTS_CACHE_MEMORY_MB = 16       # 内存缓存上限（MB）
+TTS_CACHE_DISK_MB = 256        # 磁盘缓存上限（MB），超出后淘汰最久未使用的条目
+
+# 播放配置
+PLAYBACK_ENGINE = "stream"     # "stream": 进程内流式解码播放；"subprocess": ffplay/mpg123
+PLAYBACK_SAMPLE_RATE = 24000   # 输出流采样率（与 Edge TTS 输出一致）
+PLAYBACK_BLOCK_SIZE = 480      # 输出块大小（帧），决定打断响应粒度
+PLAYBACK_VOLUME = 1.0          # 播放音量（进程内播放时生效）
+PLAYBACK_VOLUME_STEP = 0.25    # “大声点/小声点”每次调整的幅度
+
+# 插话（barge-in）配置
+BARGE_IN_ENABLED = True        # 播放期间保持采集，检测到用户语音时立即停止播放
+BARGE_IN_MIN_DURATION = 0.15   # 回复期间语音需持续的时长（秒）才判定为插话
+INTERRUPT_POLL_INTERVAL = 0.05 # 等待 LLM 下一句期间检查打断标志的间隔（秒）
+ECHO_SUPPRESSION_GAIN = 0.5    # 播放期间语音阈值 = max(静音阈值, 增益 × 输出信号 RMS)；校准完成前（或关闭校准时）使用
+ECHO_CALIBRATION = True        # 播放期间按麦克风实测电平 / 输出电平估计扬声器到麦克风的耦合增益
+ECHO_CALIBRATION_MARGIN = 2.0  # 校准后的增益 = 耦合增益中位数 × 余量（语音需比回声高出约 6 dB）
+ECHO_CALIBRATION_BLOCKS = 50   # 至少积累多少个播放期间的采集块后才使用校准值
+ECHO_TAIL_DURATION = 0.3       # 输出信号参考窗口（秒），覆盖扬声器到麦克风的回声延迟
 
 # 对话配置
-MAX_HISTORY_LENGTH = 30        # 历史长度
+HISTORY_TOKEN_BUDGET = 1500    # 对话历史的 token 预算（本地估算），超出后最旧的轮次折叠进摘要
+HISTORY_MIN_TURNS = 1          # 无论预算如何都保留的最近轮次数
+HISTORY_SUMMARY_MAX_TOKENS = 200   # 滚动摘要的 token 上限
+HISTORY_SUMMARY_PROMPT = (
+    "将以下对话要点合并进已有摘要，保留用户的事实信息、偏好与未完成的请求，"
+    "省略寒暄，使用简洁的陈述句，不超过 150 字。"
+)
+STREAM_RESPONSE = True         # 流式获取回复，逐句合成播放
+STREAM_MIN_CLAUSE_LENGTH = 8   # 逗号等分句标点处切分的最小长度（字符）
+STREAM_MAX_UNIT_LENGTH = 80    # 无标点时强制切分的长度（字符）
+PIPELINE_QUEUE_SIZE = 4        # 流水线各阶段之间队列的容量
+RESPONSE_CACHE_ENABLED = False     # 缓存简短问句的回复，命中时跳过 LLM 请求
+RESPONSE_CACHE_TTL = 600           # 缓存条目有效期（秒）
+# 不缓存的问句（正则，匹配原始识别文本，忽略大小写）：答案随时间变化的问句即使在 TTL 内也会过期
+RESPONSE_CACHE_EXCLUDE_PATTERN = (
+    r"几点|时间|日期|几号|星期|礼拜|周几|今天|明天|昨天|后天|今晚|今年|现在|刚才|最近|最新|天气|新闻"
+    r"|\b(time|date|day|today|tonight|tomorrow|yesterday|now|weather|news|latest)\b"
+)
+RESPONSE_CACHE_MAX_ENTRIES = 256   # 缓存条目上限，超出后淘汰最久未使用的条目
+RESPONSE_CACHE_MAX_QUERY_LENGTH = 24   # 只缓存规范化后不超过该长度（字符）的问句
+RESPONSE_CACHE_FUZZY_THRESHOLD = 85    # 模糊匹配阈值（0-100），0 表示只做精确匹配
+RESPONSE_CACHE_CONTEXT_TURNS = 0       # 上下文指纹包含的最近对话轮数，0 表示与上下文无关
+SPECULATIVE_LLM = False            # 部分识别结果稳定时提前发出 LLM 请求（需启用 STREAMING_ASR）
+SPECULATIVE_STABLE_WINDOW = 0.2    # 部分识别结果保持不变的最短时间（秒）
+SPECULATIVE_MIN_SILENCE = 0.3      # 端点静音已持续的最短时间（秒），应小于 SILENCE_DURATION
+ENDPOINT_AGGRESSIVENESS = 0.0      # 语义端点的积极程度（0~1），0 表示关闭，始终等待 SILENCE_DURATION（需启用 STREAMING_ASR）
+ENDPOINT_MIN_SILENCE = 0.3         # 判定用户已说完时的端点静音时长（秒）
+ENDPOINT_WEIGHTS_FILE = None       # 拟合得到的端点分类器权重（JSON，由 benchmarks/endpoint_eval.py --fit 生成），None 使用内置权重
 SYSTEM_PROMPT = (
     "You are a super intelligent artificial intelligence assistant,"
     " and you are currently in an oral communication environment."
 )
 
-# 退出命令与阈值
-EXIT_COMMANDS = ["quit", "退出", "结束","exit"]
-EXIT_FUZZY_THRESHOLD = 80
+# 本地命令（不经过 LLM）：意图 -> 触发短语
+INTENT_COMMANDS = {
+    "exit": ["quit", "退出", "结束", "exit", "再见", "结束对话"],
+    "stop": ["停", "停止", "别说了", "闭嘴", "stop"],
+    "repeat": ["再说一遍", "重复一遍", "你刚才说什么", "repeat", "say that again"],
+    "louder": ["大声点", "大声一点", "声音大一点", "louder", "volume up"],
+    "quieter": ["小声点", "小声一点", "声音小一点", "quieter", "volume down"],
+    "clear_history": ["清空历史", "清空对话", "忘掉之前的对话", "重新开始", "clear history"],
+}
+INTENT_FUZZY_THRESHOLD = 80    # 模糊匹配阈值（0-100，得分须高于阈值），0 表示只做精确与前缀匹配
+INTENT_FUZZY_MIN_LENGTH = 4    # 只对不短于该长度的命令短语做模糊匹配（“结束”+任意一字的得分恰为 80）
+INTENT_FUZZY_EXCLUDE = ("exit",)  # 不做模糊匹配的意图（误判代价高，只接受精确与前缀匹配）
+INTENT_MAX_LENGTH = 12         # 超过该长度（规范化后的字符数）的输入不视为命令
+INTENT_PREFIX_MAX_EXTRA = 2    # 前缀匹配时命令后允许的额外字符数（如“退出吧”）
+INTENT_PREFIX_PARTICLES = "吧啊呀啦嘛"  # 前缀匹配时命令后允许的语气词（不含“了”“吗”“呢”，避免“结束了吗”被当作退出）
+
+# 启动配置
+STARTUP_REPORT = False         # 预热完成后打印启动耗时分解
+
+# 本地替身配置（LLM_BACKEND / TTS_BACKEND = "mock" 时使用）
+MOCK_LLM_HOST = "127.0.0.1"
+MOCK_LLM_PORT = 0              # 0 表示自动分配端口
+MOCK_LLM_REPLIES = [           # 脚本化回复，按顺序循环使用，"{user}" 替换为用户输入
+    "好的，我听到你说：{user}。还有什么可以帮你的吗？",
+    "今天天气晴朗，气温二十度左右，适合出门散步。",
+]
+MOCK_LLM_FIRST_TOKEN_LATENCY = 0.3   # 首 token 延迟（秒）
+MOCK_LLM_TOKENS_PER_SECOND = 40.0    # token 生成速度
+MOCK_LLM_JITTER = 0.2                # 延迟抖动比例
+MOCK_LLM_ERROR_RATE = 0.0            # 错误注入概率（500 / 429 / 流式中途断开）
+MOCK_LLM_SEED = 0                    # 随机种子，保证压测可复现
+MOCK_TTS_FIRST_BYTE_LATENCY = 0.2    # 首个音频块延迟（秒）
+MOCK_TTS_SPEED = 5.0                 # 合成速度（每秒合成的音频秒数）
+MOCK_TTS_SECONDS_PER_CHAR = 0.2      # 每个字符对应的音频时长（秒）
+
+# 服务端模式配置（server.py）
+SERVER_HOST = "0.0.0.0"
+SERVER_PORT = 8765
+SERVER_MAX_SESSIONS = 8        # 同时服务的会话上限，超出时拒绝新连接
+SERVER_SAMPLE_RATE = 16000     # 客户端 PCM 的默认采样率（int16 小端单声道）
+SERVER_ASR_WORKERS = 2         # 共享 Whisper 模型的并发识别线程数
+SERVER_ASR_BATCHING = True     # 多会话同时结束的语音段合并为一次批量识别
+SERVER_SEND_TIMEOUT = 5.0      # 回复音频发送超时（秒），客户端接收过慢时打断回复
+SERVER_MAX_MESSAGE_SIZE = 1 << 20  # 单条 WebSocket 消息上限（字节）
+SERVER_MAX_QUEUE = 32          # 每个连接缓冲的入站消息数，超出后依靠 TCP 反压
+
+# 批量转写配置（transcribe_batch.py）
+BATCH_WORKERS = 0              # 并行转写进程数，0 表示按 CPU 核数 / BATCH_CPU_THREADS 自动确定
+BATCH_CPU_THREADS = 2          # 每个转写进程的推理线程数
+BATCH_DECODING = "adaptive"    # 批量转写的解码策略（adaptive 按 30 秒窗口回退 / greedy 吞吐优先 / beam）
+BATCH_OUTPUT = "transcripts.jsonl"  # 默认结果文件（JSON Lines，追加写入）
+
+# 会话存储配置
+SESSION_STORE_ENABLED = False          # 持久化每轮对话（文本、时间与音频），启动时可恢复对话历史
+SESSION_STORE_DIR = "logs/sessions"    # 会话存储目录，每个会话一个子目录（服务端会话在其下的 server/ 中）
+SESSION_RESUME = True                  # 本地模式启动时接着最近的会话，恢复预算内的最近对话
+SESSION_STORE_AUDIO = True             # 同时保存用户语音（int16 PCM，约 115 MB/小时）与回复音频（MP3）
+SESSION_STORE_FSYNC = True             # 每轮写入后 fsync，崩溃或断电时最多丢失正在写入的一轮
+
+# 延迟追踪配置
+TRACE_FILE = "logs/turn_traces.jsonl"  # 每轮延迟追踪（JSON Lines），None 表示不写入
+METRICS_FILE = None                    # Prometheus 文本格式指标文件，如 "logs/metrics.prom"
+TRACE_HISTOGRAM_WINDOW = 500           # 直方图统计最近多少轮
 
 # 调试模式
 VERBOSE = False
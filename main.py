@@ -3,28 +3,37 @@
 支持实时语音识别、AI对话和语音合成
 """
 
+import time
+START_TIME = time.perf_counter()
+
 import asyncio
 import sys
+from src.startup import startup_timer
 from src.conversation_manager import ConversationManager
 from src.signal_handler import SignalHandler
 from config import VERBOSE
 
+startup_timer.reset(START_TIME)
+startup_timer.mark("模块导入完成")
+
 def log(msg):
     if VERBOSE:
         print(msg)
 
 async def main():
     print("🎤 智能语音对话助手启动中...")
-    print("📝 提示：在 AI 播放语音时，按 Ctrl+C 可以打断播放并继续对话")
+    print("📝 提示：在 AI 播放语音时，直接说话或按 Ctrl+C 可以打断播放并继续对话")
     print("🚪 提示：在等待输入时，按 Ctrl+C 可以退出程序")
     print("🎯 提示：也可以说 '退出'、'结束' 或 'quit' 来退出程序")
+    print("🧭 提示：'再说一遍'、'大声点'、'小声点'、'清空历史' 等命令在本地执行")
     print("-" * 50)
     
     # 初始化信号处理器
     signal_handler = SignalHandler()
     
-    # 初始化对话管理器
-    conversation_manager = ConversationManager(signal_handler)
+    # 初始化对话管理器（Whisper 模型在后台加载）
+    with startup_timer.phase("组件初始化"):
+        conversation_manager = ConversationManager(signal_handler)
     
     try:
         # 启动对话循环
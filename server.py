@@ -0,0 +1,26 @@
+"""
+多会话语音对话服务入口
+通过 WebSocket 接收远程客户端的 PCM 音频，每个连接运行独立的对话，共享同一个 Whisper 模型
+"""
+
+import argparse
+import asyncio
+
+from src.session_server import SessionServer
+from config import SERVER_HOST, SERVER_PORT, SERVER_MAX_SESSIONS
+
+def main():
+    parser = argparse.ArgumentParser(description="多会话 WebSocket 语音对话服务")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--max-sessions", type=int, default=SERVER_MAX_SESSIONS, help="同时服务的会话上限")
+    args = parser.parse_args()
+
+    server = SessionServer(args.host, args.port, args.max_sessions)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("\n服务已停止。")
+
+if __name__ == "__main__":
+    main()
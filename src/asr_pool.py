@@ -0,0 +1,255 @@
+"""
+识别工作进程池模块
+每个工作进程持有一个 Whisper 模型，音频通过共享内存交给工作进程，
+解码不再与采集回调和事件循环争用主进程的 GIL
+"""
+
+import multiprocessing
+import signal
+import threading
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+
+from .speech_recognition import SpeechRecognizer
+from config import (
+    ASR_WORKER_PROCESSES, ASR_WORKER_CPU_THREADS, ASR_WORKER_TASK_TIMEOUT, ASR_WORKER_HEALTH_INTERVAL,
+    WHISPER_PIN_LANGUAGE, ASR_SAMPLE_RATE, MAX_RECORD_DURATION, PRE_ROLL_DURATION, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 每个工作进程的共享内存槽容量（采样数），足以容纳最长的一段语音
+SLOT_SAMPLES = int((MAX_RECORD_DURATION + PRE_ROLL_DURATION + 1) * ASR_SAMPLE_RATE)
+
+def _worker_main(conn, shm_name: str, slot_samples: int, cpu_threads: int, pin_language: bool):
+    """工作进程入口：加载模型后循环处理识别请求
+
+    请求为 (方法名, 采样数, 音频, 参数)。音频为 None 时从共享内存槽读取前“采样数”个采样；
+    主进程在收到结果之前不会改写该槽，因此可以直接在共享内存上解码，无需复制。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程处理
+    shm = shared_memory.SharedMemory(name=shm_name)
+    slot = np.ndarray((slot_samples,), dtype=np.float32, buffer=shm.buf)
+    try:
+        recognizer = SpeechRecognizer(cpu_threads=cpu_threads, pin_language=pin_language)
+        conn.send(recognizer.wait_ready())
+
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                break
+            if request is None:
+                break
+            method, length, audio, options = request
+            if audio is None:
+                audio = slot[:length]
+            conn.send(getattr(recognizer, method)(audio, **options))
+    finally:
+        del slot
+        shm.close()
+
+class _Worker:
+    """一个工作进程及其管道与共享内存槽"""
+
+    def __init__(self, index: int, cpu_threads: int, pin_language: bool):
+        self.index = index
+        self.cpu_threads = cpu_threads
+        self.pin_language = pin_language
+        self.shm = shared_memory.SharedMemory(create=True, size=SLOT_SAMPLES * 4)
+        self.slot = np.ndarray((SLOT_SAMPLES,), dtype=np.float32, buffer=self.shm.buf)
+        self.process = None
+        self.conn = None
+        self.state = "stopped"  # starting / ready / failed / stopped
+        self.restarts = 0
+
+    def start(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, self.shm.name, SLOT_SAMPLES, self.cpu_threads, self.pin_language),
+            name=f"asr-worker-{self.index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.state = "starting"
+
+    def stop(self, timeout: float = 2.0):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join(timeout)
+        self.conn.close()
+        self.process = None
+        self.state = "stopped"
+
+    def write(self, audio: np.ndarray) -> tuple:
+        """把音频写入共享内存槽，返回 (采样数, 需随请求发送的音频)；超出槽容量时随请求发送"""
+        if len(audio) > SLOT_SAMPLES:
+            return len(audio), np.ascontiguousarray(audio, dtype=np.float32)
+        self.slot[:len(audio)] = audio
+        return len(audio), None
+
+    def release(self):
+        del self.slot
+        self.shm.close()
+        self.shm.unlink()
+
+class ASRWorkerPool:
+    """多进程识别池，接口与 SpeechRecognizer 的 wait_ready / transcribe / transcribe_words 一致
+
+    调用线程取得一个空闲工作进程，把音频写入它的共享内存槽，通过管道只发送采样数与参数，
+    等待结果期间释放 GIL。后台线程接收各进程的就绪消息，并定期检查空闲进程是否存活；
+    识别过程中进程退出或超过 ASR_WORKER_TASK_TIMEOUT 时，该次识别返回空结果并重启进程。
+    """
+
+    def __init__(self, num_workers: int = ASR_WORKER_PROCESSES, cpu_threads: int = ASR_WORKER_CPU_THREADS,
+                 task_timeout: float = ASR_WORKER_TASK_TIMEOUT,
+                 health_interval: float = ASR_WORKER_HEALTH_INTERVAL,
+                 pin_language: bool = WHISPER_PIN_LANGUAGE):
+        self.task_timeout = task_timeout
+        self.health_interval = health_interval
+        # spawn 启动的子进程不继承主进程的线程与音频设备状态
+        self.context = multiprocessing.get_context("spawn")
+
+        # 语言在各工作进程中分别固定
+        self.workers = [_Worker(i, cpu_threads, pin_language) for i in range(max(1, num_workers))]
+        self._idle = []
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self.tasks = 0
+        self.failures = 0
+
+        for worker in self.workers:
+            worker.start(self.context)
+        log(f"🔄 正在启动 {len(self.workers)} 个识别工作进程...")
+        self._monitor = threading.Thread(target=self._run_monitor, daemon=True)
+        self._monitor.start()
+
+    def _run_monitor(self):
+        """后台线程：接收就绪消息，重启已退出的空闲进程"""
+        while not self._closed.is_set():
+            with self._cond:
+                starting = {w.conn: w for w in self.workers if w.state == "starting"}
+            if starting:
+                for conn in connection.wait(list(starting), timeout=self.health_interval):
+                    self._on_started(starting[conn])
+            else:
+                self._closed.wait(self.health_interval)
+            self._check_health()
+
+    def _on_started(self, worker: _Worker):
+        try:
+            ready = worker.conn.recv()
+        except (EOFError, OSError):
+            ready = False
+        with self._cond:
+            if ready:
+                worker.state = "ready"
+                self._idle.append(worker)
+                log(f"✅ 识别工作进程 {worker.index} 就绪")
+            else:
+                worker.state = "failed"
+                log(f"❌ 识别工作进程 {worker.index} 启动失败")
+            self._cond.notify_all()
+
+    def _check_health(self):
+        with self._cond:
+            dead = [w for w in self._idle if not w.process.is_alive()]
+            for worker in dead:
+                self._idle.remove(worker)
+        for worker in dead:
+            log(f"⚠️ 识别工作进程 {worker.index} 已退出，正在重启...")
+            self._restart(worker)
+
+    def _restart(self, worker: _Worker):
+        worker.stop(timeout=0.5)
+        if self._closed.is_set():
+            return
+        worker.restarts += 1
+        with self._cond:
+            worker.start(self.context)
+
+    def wait_ready(self) -> bool:
+        """等待所有工作进程完成启动，返回是否至少有一个可用"""
+        with self._cond:
+            self._cond.wait_for(lambda: all(w.state != "starting" for w in self.workers))
+            return any(w.state == "ready" for w in self.workers)
+
+    def _acquire(self) -> _Worker:
+        with self._cond:
+            self._cond.wait_for(lambda: self._idle or self._closed.is_set()
+                                or all(w.state == "failed" for w in self.workers))
+            return self._idle.pop() if self._idle else None
+
+    def _release(self, worker: _Worker):
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _call(self, method: str, audio: np.ndarray, default, **options):
+        """在空闲工作进程中执行一次识别（阻塞）"""
+        worker = self._acquire()
+        if worker is None:
+            return default
+        self.tasks += 1
+        try:
+            length, payload = worker.write(audio)
+            worker.conn.send((method, length, payload, options))
+            if not worker.conn.poll(self.task_timeout):
+                raise TimeoutError(f"识别超过 {self.task_timeout} 秒")
+            result = worker.conn.recv()
+        except (EOFError, OSError, TimeoutError) as e:
+            self.failures += 1
+            log(f"❌ 识别工作进程 {worker.index} 异常（{e or '进程已退出'}），正在重启...")
+            self._restart(worker)
+            return default
+        self._release(worker)
+        return result
+
+    def transcribe(self, audio_data: np.ndarray, speech_spans: list = None) -> str:
+        """将音频数据转录为文本（只把语音区间写入共享内存）"""
+        if audio_data is None or len(audio_data) == 0:
+            return ""
+        audio = SpeechRecognizer._speech_audio(audio_data, speech_spans)
+        spans = [(0, len(audio))] if speech_spans else None
+        return self._call("transcribe", audio, "", speech_spans=spans)
+
+    def transcribe_words(self, audio_data: np.ndarray, initial_prompt: str = None) -> list:
+        """快速转录并返回带时间戳的词列表，用于流式识别"""
+        if audio_data is None or len(audio_data) == 0:
+            return []
+        return self._call("transcribe_words", audio_data, [], initial_prompt=initial_prompt)
+
+    def close(self):
+        """停止所有工作进程并释放共享内存"""
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._monitor.join()
+        for worker in self.workers:
+            worker.stop()
+            worker.release()
+
+    def stats(self) -> dict:
+        """工作进程状态统计"""
+        return {
+            "workers": len(self.workers),
+            "ready": sum(w.state == "ready" for w in self.workers),
+            "restarts": sum(w.restarts for w in self.workers),
+            "tasks": self.tasks,
+            "failures": self.failures,
+        }
@@ -0,0 +1,145 @@
+"""
+识别调度模块
+收集多个会话同时结束的语音段，在共享的 Whisper 模型上合并为一次批量编码与解码
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Executor, Future
+
+import numpy as np
+
+from .speech_recognition import SpeechRecognizer
+from config import ASR_BATCH_MAX_SIZE, ASR_BATCH_MAX_WAIT, VERBOSE
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+class ASRScheduler:
+    """动态批处理的识别调度器
+
+    调度线程取出第一个待识别的语音段后，一并取走已在排队的语音段；上一批次包含多段
+    （说明有并发）时，再最多等待 max_wait 秒收集其他语音段，批次满 max_batch_size 即立即开始。
+    解码期间到达的语音段自然排队进入下一批，因此并发越高批次越大；
+    只有一段时仍走 SpeechRecognizer.transcribe 的逐段路径，单用户的识别结果与延迟不受影响。
+    超过一个 Whisper 窗口或没有 VAD 语音区间的语音段同样逐段识别。
+    逐段识别交给 executor 中的识别线程并行执行，调度线程只负责组批与批量解码，
+    长语音不会阻塞其他会话；未提供 executor 时在调度线程中依次识别。
+    """
+
+    def __init__(self, recognizer: SpeechRecognizer, max_batch_size: int = ASR_BATCH_MAX_SIZE,
+                 max_wait: float = ASR_BATCH_MAX_WAIT, executor: Executor = None):
+        self.recognizer = recognizer
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+
+        self.pending = queue.Queue()  # (音频, 语音区间, Future)
+        self.batches = 0
+        self.batched_utterances = 0
+        self.serial_utterances = 0
+        self._concurrent = False  # 上一批次是否包含多段语音
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, audio_data: np.ndarray, speech_spans: list = None) -> Future:
+        """提交一段语音，返回结果为识别文本的 Future（asyncio 中可用 asyncio.wrap_future 等待）"""
+        future = Future()
+        self.pending.put((audio_data, speech_spans, future))
+        return future
+
+    def transcribe(self, audio_data: np.ndarray, speech_spans: list = None) -> str:
+        """同步识别（阻塞到所在批次完成）"""
+        return self.submit(audio_data, speech_spans).result()
+
+    def close(self):
+        """停止调度线程（已提交的语音段仍会完成识别）"""
+        self.pending.put(None)
+
+    def _collect(self, first) -> list:
+        """以 first 为首收集一个批次"""
+        batch = [first]
+        deadline = time.monotonic() + (self.max_wait if self._concurrent else 0)
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                item = self.pending.get(timeout=timeout) if timeout > 0 else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                # 保留停止标记，处理完本批次后退出
+                self.pending.put(None)
+                break
+            batch.append(item)
+        self._concurrent = len(batch) > 1
+        return batch
+
+    def _run(self):
+        while True:
+            first = self.pending.get()
+            if first is None:
+                return
+            batch = [item for item in self._collect(first) if item[2].set_running_or_notify_cancel()]
+            try:
+                self._process(batch)
+            except Exception as e:
+                log(f"❌ 批量识别错误: {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result("")
+
+    def _process(self, batch: list):
+        """可批量的语音段合并解码，其余逐段识别"""
+        limit = self.recognizer.max_batch_samples() if len(batch) > 1 else 0
+        batchable, audios = [], []
+        for audio_data, speech_spans, future in batch:
+            audio = None
+            if speech_spans and audio_data is not None and len(audio_data):
+                audio = SpeechRecognizer._speech_audio(audio_data, speech_spans)
+            if audio is not None and 0 < len(audio) <= limit:
+                batchable.append(future)
+                audios.append(audio)
+            else:
+                self._transcribe_serial(audio_data, speech_spans, future)
+
+        if len(batchable) == 1:
+            # 其余语音段都不可批量，剩下的一段按逐段路径识别
+            audio_data, speech_spans, _ = next(item for item in batch if item[2] is batchable[0])
+            self._transcribe_serial(audio_data, speech_spans, batchable[0])
+        elif batchable:
+            texts = self.recognizer.transcribe_batch(audios)
+            self.batches += 1
+            self.batched_utterances += len(batchable)
+            log(f"🧩 批量识别 {len(batchable)} 段语音")
+            for future, text in zip(batchable, texts):
+                future.set_result(text)
+
+    def _transcribe_serial(self, audio_data: np.ndarray, speech_spans: list, future: Future):
+        """逐段识别一段语音（有 executor 时在识别线程中执行，不等待结果）"""
+        self.serial_utterances += 1
+        if self.executor is None:
+            future.set_result(self.recognizer.transcribe(audio_data, speech_spans))
+            return
+
+        def run():
+            try:
+                text = self.recognizer.transcribe(audio_data, speech_spans)
+            except Exception as e:
+                log(f"❌ 识别错误: {e}")
+                text = ""
+            if not future.done():
+                future.set_result(text)
+
+        self.executor.submit(run)
+
+    def stats(self) -> dict:
+        """批处理统计"""
+        return {
+            "batches": self.batches,
+            "batched_utterances": self.batched_utterances,
+            "serial_utterances": self.serial_utterances,
+            "mean_batch_size": self.batched_utterances / self.batches if self.batches else 0.0,
+        }
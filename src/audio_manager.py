@@ -3,87 +3,489 @@
 处理音频录制和播放功能
 """
 
-import sounddevice as sd
 import numpy as np
 import tempfile
 import os
 import subprocess
 import threading
 import asyncio
-from config import SAMPLE_RATE, BUFFER_SIZE, SILENCE_THRESHOLD, SILENCE_DURATION, VERBOSE
+import time
+from .audio_player import StreamingPlayer
+from .resampler import PolyphaseResampler
+from .ring_buffer import RingBuffer
+from config import (
+    SAMPLE_RATE, ASR_SAMPLE_RATE, BUFFER_SIZE, SILENCE_THRESHOLD, SILENCE_DURATION,
+    PRE_ROLL_DURATION, MAX_RECORD_DURATION, RING_BUFFER_DURATION,
+    VAD_BACKEND, VAD_FRAME_DURATION, VAD_SNR_DB, VAD_MIN_DB, VAD_MAX_ZCR,
+    VAD_HANGOVER, VAD_NOISE_WINDOW, VAD_SPAN_MERGE_GAP, VAD_TAIL_PADDING,
+    ECHO_SUPPRESSION_GAIN, ECHO_CALIBRATION, ECHO_CALIBRATION_MARGIN, ECHO_CALIBRATION_BLOCKS,
+    BARGE_IN_MIN_DURATION,
+    PLAYBACK_ENGINE, PLAYBACK_VOLUME_STEP, VERBOSE
+)
 
 def log(msg):
     if VERBOSE:
         print(msg)
 
+class RmsVAD:
+    """固定 RMS 阈值的语音活动检测器"""
+    
+    def __init__(self, frame_size: int):
+        self.frame_size = frame_size
+    
+    def reset(self):
+        pass
+    
+    def process(self, frames: np.ndarray, min_level: float = 0.0) -> np.ndarray:
+        """输入 (帧数, 帧长) 的采样矩阵，返回每帧是否为语音"""
+        rms = np.sqrt(np.mean(np.square(frames), axis=1))
+        return rms > max(SILENCE_THRESHOLD, min_level)
+
+class AdaptiveVAD:
+    """自适应语音活动检测器
+
+    按帧计算对数能量与过零率（整块向量化）。噪声底取最近 VAD_NOISE_WINDOW 秒内
+    的最小帧能量（最小值统计），高于噪声底 VAD_SNR_DB 的帧判为语音，
+    并用拖尾（hangover）保持语音状态，避免词间短暂停顿被判为静音。
+    第一个窗口内噪声底不高于固定阈值 SILENCE_THRESHOLD 对应的噪声底：采集开始时用户若已在说话，
+    窗口内全是语音帧，未加限制的噪声底会偏高而漏掉开头的话。
+    """
+    
+    def __init__(self, frame_size: int):
+        self.frame_size = frame_size
+        frame_duration = frame_size / ASR_SAMPLE_RATE
+        self.hangover_frames = int(round(VAD_HANGOVER / frame_duration))
+        self.history = np.empty(max(1, int(VAD_NOISE_WINDOW / frame_duration)))
+        # 预热期间噪声底的上限：能量超过固定阈值的帧总会判为语音
+        self.initial_floor_db = 20.0 * np.log10(SILENCE_THRESHOLD) - VAD_SNR_DB
+        self.reset()
+    
+    def reset(self):
+        self.history.fill(np.inf)
+        self.history_index = 0
+        self.frames_seen = 0
+        self.noise_floor_db = VAD_MIN_DB - VAD_SNR_DB
+        self.since_speech = self.hangover_frames + 1  # 距上一个语音帧的帧数
+    
+    def process(self, frames: np.ndarray, min_level: float = 0.0) -> np.ndarray:
+        """输入 (帧数, 帧长) 的采样矩阵，返回每帧是否为语音"""
+        energy = np.mean(np.square(frames), axis=1)
+        db = 10.0 * np.log10(energy + 1e-12)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        
+        # 更新噪声底（滑动窗口内的最小帧能量）
+        index = np.arange(self.history_index, self.history_index + len(db))
+        np.put(self.history, index, db, mode="wrap")
+        self.history_index = (self.history_index + len(db)) % len(self.history)
+        self.frames_seen += len(db)
+        noise_floor_db = float(self.history.min())
+        if self.frames_seen < len(self.history):
+            noise_floor_db = min(noise_floor_db, self.initial_floor_db)
+        self.noise_floor_db = max(noise_floor_db, VAD_MIN_DB - 2 * VAD_SNR_DB)
+        
+        raw = (db > self.noise_floor_db + VAD_SNR_DB) & (db > VAD_MIN_DB)
+        # 高过零率且能量不高的帧多为嘶声、风噪等宽带噪声
+        raw &= ~((zcr > VAD_MAX_ZCR) & (db < self.noise_floor_db + 2 * VAD_SNR_DB))
+        if min_level > 0:
+            raw &= energy > min_level * min_level
+        
+        # 向量化拖尾：每帧到最近一个语音帧的距离不超过 hangover_frames 即视为语音
+        index = np.arange(len(raw))
+        last = np.maximum.accumulate(np.where(raw, index, -1 - self.since_speech))
+        if len(raw):
+            self.since_speech = len(raw) - 1 - int(last[-1])
+        return index - last <= self.hangover_frames
+
+def create_vad(frame_size: int):
+    """按配置创建 VAD"""
+    if VAD_BACKEND == "rms":
+        return RmsVAD(frame_size)
+    return AdaptiveVAD(frame_size)
+
 class AudioManager:
     """音频管理器"""
     
-    def __init__(self):
+    def __init__(self, vad=None, input_rate: int = SAMPLE_RATE):
+        self.stream = None
+        self.is_listening = False
         self.is_recording = False
-        self.audio_buffer = []
         self.silence_timer = 0.0
-        self.should_stop = False
+        self.segment_start = 0
+        self.segment_end = 0
+        self.speech_end = 0
+        self.speech_spans = []
+        self.segment_ready = threading.Event()
+        
+        # 最近一段语音的开始与端点判定时间（time.monotonic），供延迟追踪使用
+        self.onset_time = None
+        self.endpoint_time = None
+        self._feed_time = 0.0
+        
+        # 语义端点：endpoint_silence 返回当前所需的端点静音时长（秒），为 None 时固定为 SILENCE_DURATION；
+        # 静音开始时调用 pause_callback（例如立即解码一次部分识别结果）
+        self.endpoint_silence = None
+        self.pause_callback = None
+        self.endpoint_wait = None
+        
+        # 插话（barge-in）检测：回复期间需持续一段时间的语音才算用户插话
+        self.barge_in_callback = None
+        self.onset_start = None
+        self.onset_duration = 0.0
+        # 回声由外部消除（如远程客户端）时，无需输出信号作参考也可插话
+        self.external_echo_cancellation = False
+        # 播放期间各采集块的 麦克风电平 / 输出电平，取中位数作为回声耦合增益
+        self._coupling = np.zeros(max(ECHO_CALIBRATION_BLOCKS * 4, 1))
+        self._coupling_count = 0
+        self.echo_gain = ECHO_SUPPRESSION_GAIN
+        
+        # 采集时一次性重采样到识别所需的采样率
+        self.set_input_rate(input_rate)
+        
+        # 常驻采集流写入固定容量的环形缓冲区，内存上限固定
+        self.ring = RingBuffer(int(RING_BUFFER_DURATION * ASR_SAMPLE_RATE))
+        self.pre_roll = int(PRE_ROLL_DURATION * ASR_SAMPLE_RATE)
+        self.max_segment = int(MAX_RECORD_DURATION * ASR_SAMPLE_RATE)
+        self.merge_gap = int(VAD_SPAN_MERGE_GAP * ASR_SAMPLE_RATE)
+        self.tail_padding = int(VAD_TAIL_PADDING * ASR_SAMPLE_RATE)
+        
+        # 可替换的 VAD，按固定帧长处理（不足一帧的采样留到下一块）
+        self.frame_size = int(VAD_FRAME_DURATION * ASR_SAMPLE_RATE)
+        self.vad = vad if vad is not None else create_vad(self.frame_size)
+        self._remainder = np.zeros(0, dtype=np.float32)
+        
+        # 进程内流式播放器，不可用时回退到外部播放器
+        self.player = None
+        if PLAYBACK_ENGINE == "stream":
+            if StreamingPlayer.is_available():
+                self.player = StreamingPlayer()
+            else:
+                log("⚠️ 未安装 PyAV，回退到外部播放器。")
+    
+    def set_input_rate(self, input_rate: int):
+        """设置输入音频的采样率（与识别采样率相同时不做重采样）"""
+        self.input_rate = input_rate
+        self.resampler = None
+        if input_rate != ASR_SAMPLE_RATE:
+            self.resampler = PolyphaseResampler(input_rate, ASR_SAMPLE_RATE)
+    
+    def _echo_level(self) -> float:
+        """播放期间的最低语音电平，按输出信号抬高以抑制扬声器回声"""
+        if self.player is None:
+            return 0.0
+        return self.echo_gain * self.player.echo_reference()
+    
+    def _calibrate_echo(self, block: np.ndarray):
+        """播放期间（未在录音时）记录麦克风电平与输出电平之比，更新回声耦合增益
+        
+        实际耦合随扬声器音量、摆放与麦克风增益相差几个数量级，固定增益要么让外放自我打断，
+        要么让耳机用户无法插话。中位数不受偶尔的短促插话影响；持续的插话会停止播放，不会进入统计。
+        """
+        reference = self.player.echo_reference()
+        if reference < 1e-3 or self.is_recording or len(block) == 0:
+            return
+        ratio = float(np.sqrt(np.mean(np.square(block)))) / reference
+        self._coupling[self._coupling_count % len(self._coupling)] = ratio
+        self._coupling_count += 1
+        if self._coupling_count >= ECHO_CALIBRATION_BLOCKS:
+            filled = self._coupling[:min(self._coupling_count, len(self._coupling))]
+            self.echo_gain = ECHO_CALIBRATION_MARGIN * float(np.median(filled))
     
-    def _rms(self, audio: np.ndarray) -> float:
-        """计算音频片段的 RMS 能量"""
-        return np.sqrt(np.mean(np.square(audio), axis=0))
+    def has_echo_reference(self) -> bool:
+        """是否能区分用户语音与扬声器回声（插话检测的前提）
+        
+        外部播放器回退路径没有输出信号参考，外放的回复会被当作用户插话。
+        """
+        return self.player is not None or self.external_echo_cancellation
+    
+    def adjust_volume(self, steps: int) -> float:
+        """按 PLAYBACK_VOLUME_STEP 调整播放音量，返回调整后的音量（外部播放器不支持时返回 None）"""
+        if self.player is None:
+            return None
+        volume = self.player.volume + steps * PLAYBACK_VOLUME_STEP
+        self.player.volume = min(max(volume, PLAYBACK_VOLUME_STEP), 2.0)
+        return self.player.volume
+    
+    def arm_barge_in(self, callback):
+        """回复期间启用插话检测，检测到用户语音时调用 callback"""
+        self.onset_start = None
+        self.onset_duration = 0.0
+        self.barge_in_callback = callback
+    
+    def disarm_barge_in(self):
+        """停止插话检测"""
+        self.barge_in_callback = None
     
     def _callback(self, indata, frames, time, status):
         """音频输入回调函数"""
-        chunk = indata[:, 0].astype(np.float32)
-        level = self._rms(chunk)
-
-        if not self.is_recording:
-            if level > SILENCE_THRESHOLD:
+        self.feed(indata[:, 0])
+    
+    def feed(self, chunk: np.ndarray):
+        """处理一块采集到的音频（input_rate 采样率），写入环形缓冲区并做端点检测"""
+        self._feed_time = time.monotonic()
+        if self.resampler is not None:
+            block = self.resampler.process(chunk)
+        else:
+            block = np.asarray(chunk, dtype=np.float32)
+        self.ring.write(block)
+        if ECHO_CALIBRATION and self.player is not None:
+            self._calibrate_echo(block)
+        
+        # 分帧：frames_start 为第一帧的全局采样位置
+        frames_start = self.ring.total - len(block) - len(self._remainder)
+        samples = np.concatenate((self._remainder, block))
+        n = len(samples) // self.frame_size
+        self._remainder = samples[n * self.frame_size:]
+        if n == 0:
+            return
+        
+        # VAD 始终运行，保证噪声底持续自适应
+        speech = self.vad.process(
+            samples[:n * self.frame_size].reshape(n, self.frame_size),
+            min_level=self._echo_level()
+        )
+        
+        if self.is_listening:
+            self._update_segment(speech, frames_start)
+    
+    def _update_segment(self, speech: np.ndarray, frames_start: int):
+        """根据逐帧 VAD 结果更新语音段状态"""
+        frame_duration = self.frame_size / ASR_SAMPLE_RATE
+        
+        for i, is_speech in enumerate(speech):
+            pos = frames_start + i * self.frame_size
+            end = pos + self.frame_size
+            
+            if not self.is_recording:
+                if not is_speech:
+                    self.onset_start = None
+                    self.onset_duration = 0.0
+                    continue
+                
+                if self.onset_start is None:
+                    self.onset_start = pos
+                self.onset_duration += frame_duration
+                
+                barge_in_callback = self.barge_in_callback
+                if barge_in_callback is not None:
+                    if self.onset_duration < BARGE_IN_MIN_DURATION:
+                        continue
+                    log("🎤 检测到插话，停止播放...")
+                    self.barge_in_callback = None
+                    barge_in_callback()
+                
                 self.is_recording = True
                 log("🎤 检测到语音，开始录音...")
                 self.silence_timer = 0.0
-            else:
-                return
-        else:
+                # 起点前移 PRE_ROLL_DURATION，保留完整的词首
+                self.segment_start = max(self.onset_start - self.pre_roll, self.ring.oldest)
+                self.speech_spans = [[self.onset_start, end]]
+                self.speech_end = end
+                self.onset_time = self._sample_time(self.onset_start)
+                self.onset_start = None
+                self.onset_duration = 0.0
+                continue
+            
             # 录音中
-            self.audio_buffer.append(chunk)
-            if level <= SILENCE_THRESHOLD:
-                self.silence_timer += frames / SAMPLE_RATE
-                if self.silence_timer >= SILENCE_DURATION:
-                    log("🔇 检测到静音，停止录音。")
-                    self.should_stop = True
-                    raise sd.CallbackStop()
-            else:
+            if is_speech:
                 self.silence_timer = 0.0
+                if pos - self.speech_end <= self.merge_gap:
+                    self.speech_spans[-1][1] = end
+                else:
+                    self.speech_spans.append([pos, end])
+                self.speech_end = end
+            else:
+                if self.silence_timer == 0.0 and self.pause_callback is not None:
+                    self.pause_callback()
+                self.silence_timer += frame_duration
+                endpoint_silence = self.endpoint_silence
+                required = SILENCE_DURATION if endpoint_silence is None else endpoint_silence()
+                if self.silence_timer >= required:
+                    self.endpoint_wait = self.silence_timer
+                    log("🔇 检测到静音，停止录音。")
+                    self._end_segment()
+                    return
+            
+            if end - self.segment_start >= self.max_segment:
+                log("⏱️ 达到最长录音时长，停止录音。")
+                self._end_segment()
+                return
     
-    def record_audio(self) -> np.ndarray:
-        """录制音频直到检测到静音"""
+    def _sample_time(self, pos: int) -> float:
+        """估算全局采样位置 pos 被采集到的时间（time.monotonic）"""
+        return self._feed_time - (self.ring.total - pos) / ASR_SAMPLE_RATE
+    
+    def _end_segment(self):
+        """结束当前语音段：截到最后一个语音帧之后 VAD_TAIL_PADDING 处"""
+        self.endpoint_time = time.monotonic()
+        self.segment_end = min(self.speech_end + self.tail_padding, self.ring.total)
         self.is_recording = False
-        self.audio_buffer = []
-        self.silence_timer = 0.0
-        self.should_stop = False
+        self.is_listening = False
+        self.segment_ready.set()
+    
+    def cancel_recording(self):
+        """取消正在等待的录音，record_audio 将返回 None"""
+        self.is_listening = False
+        self.is_recording = False
+        self.segment_start = self.segment_end = self.ring.total
+        self.speech_spans = []
+        self.segment_ready.set()
+    
+    def start(self):
+        """打开并启动常驻采集流（只在首次调用时打开）"""
+        if self.stream is not None:
+            return
+        import sounddevice as sd
+        self.stream = sd.InputStream(
+            samplerate=SAMPLE_RATE,
+            channels=1,
+            dtype="float32",
+            blocksize=BUFFER_SIZE,
+            callback=self._callback
+        )
+        self.stream.start()
+        log("✅ 音频采集流已打开")
+    
+    def close(self):
+        """关闭采集流与输出流"""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+        if self.player is not None:
+            self.player.close()
+    
+    def current_segment(self) -> np.ndarray:
+        """返回正在录制的语音段的视图，未在录音时返回 None"""
+        if not self.is_recording:
+            return None
+        return self.ring.view(self.segment_start)
+    
+    def segment_speech_spans(self) -> list:
+        """最近一段语音中 VAD 判定的语音区间，采样位置相对于 record_audio 的返回值
 
-        log("👂 等待语音输入...")
-        try:
-            with sd.InputStream(
-                samplerate=SAMPLE_RATE,
-                channels=1,
-                blocksize=BUFFER_SIZE,
-                callback=self._callback
-            ):
-                while not self.should_stop:
-                    sd.sleep(100)
-        except sd.CallbackStop:
+        首个区间向前延伸到段起点（包含预录部分），末个区间延伸到段终点（包含尾部留白）。
+        """
+        length = self.segment_end - self.segment_start
+        spans = [
+            [max(start - self.segment_start, 0), min(end - self.segment_start, length)]
+            for start, end in self.speech_spans
+            if start < self.segment_end
+        ]
+        if spans:
+            spans[0][0] = 0
+            spans[-1][1] = length
+        return [tuple(span) for span in spans]
+    
+    def begin_listening(self):
+        """开始等待下一段语音（不阻塞）"""
+        self.is_recording = False
+        self.silence_timer = 0.0
+        self.onset_time = self.endpoint_time = self.endpoint_wait = None
+        self.segment_ready.clear()
+        self.is_listening = True
+    
+    def wait_segment(self) -> np.ndarray:
+        """阻塞等待当前语音段结束，返回其视图"""
+        while not self.segment_ready.wait(0.1):
             pass
 
-        if self.audio_buffer:
-            return np.concatenate(self.audio_buffer)
+        audio = self.ring.view(self.segment_start, self.segment_end)
+        if len(audio):
+            return audio
         else:
             log("⚠️ 未检测到有效音频。")
             return None
     
-    async def play_audio_with_interrupt(self, audio_file_path: str, signal_handler) -> bool:
+    def record_audio(self) -> np.ndarray:
+        """等待一段完整语音，返回 ASR_SAMPLE_RATE 采样率的 float32 视图
+
+        返回值直接引用环形缓冲区，在缓冲区回绕（RING_BUFFER_DURATION 秒）之前有效；
+        对应的语音区间可通过 segment_speech_spans() 获取。
+        """
+        self.start()
+        self.begin_listening()
+
+        log("👂 等待语音输入...")
+        return self.wait_segment()
+    
+    async def play_stream_with_interrupt(self, chunks, signal_handler,
+                                         announce: bool = True, drain: bool = True) -> bool:
+        """边合成边播放 MP3 数据流，支持打断功能
+
+        drain 为 False 时数据全部交给播放器即返回（逐句播放时使用），之后由 drain_playback() 等待播放结束。
+        """
+        if signal_handler.should_interrupt:
+            return True
+        
+        if self.player is not None:
+            try:
+                self.player.start()
+            except Exception as e:
+                log(f"❌ 打开音频输出流失败，回退到外部播放器: {e}")
+                self.player = None
+        
+        if self.player is None:
+            if self.barge_in_callback is not None:
+                log("⚠️ 外部播放器没有回声参考，本次回复不检测插话。")
+                self.barge_in_callback = None
+            return await self._play_stream_via_file(chunks, signal_handler, announce)
+        
+        signal_handler.set_playing_state(True)
+        
+        if announce:
+            print("🔊 正在播放... (按 Ctrl+C 可打断)")
+        
+        try:
+            return await self.player.play(chunks, signal_handler, drain=drain)
+        except Exception as e:
+            log(f"❌ 播放过程出错: {e}")
+            return False
+        finally:
+            signal_handler.set_playing_state(False)
+    
+    async def drain_playback(self, signal_handler) -> bool:
+        """等待进程内播放器中剩余的音频播放完毕，返回是否被打断"""
+        if self.player is None or self.player.stream is None:
+            return signal_handler.should_interrupt
+        signal_handler.set_playing_state(True)
+        try:
+            return await self.player.drain(signal_handler)
+        finally:
+            signal_handler.set_playing_state(False)
+    
+    async def _play_stream_via_file(self, chunks, signal_handler, announce: bool) -> bool:
+        """回退路径：写入临时文件后交给外部播放器"""
+        audio_chunks = []
+        async for data in chunks:
+            audio_chunks.append(data)
+        
+        if not audio_chunks:
+            log("⚠️ TTS 未生成音频。")
+            return signal_handler.should_interrupt
+        
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
+            for data in audio_chunks:
+                f.write(data)
+            temp_path = f.name
+        
+        try:
+            return await self.play_audio_with_interrupt(temp_path, signal_handler, announce)
+        finally:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+    
+    async def play_audio_with_interrupt(self, audio_file_path: str, signal_handler,
+                                        announce: bool = True) -> bool:
         """播放音频文件，支持打断功能"""
+        if signal_handler.should_interrupt:
+            return True
+        
         signal_handler.set_playing_state(True)
         
-        print("🔊 正在播放... (按 Ctrl+C 可打断)")
+        if announce:
+            print("🔊 正在播放... (按 Ctrl+C 可打断)")
         
         try:
             # 尝试使用不同的播放器
@@ -0,0 +1,191 @@
+"""
+流式音频播放模块
+在进程内增量解码 MP3 数据块，并送入常驻的 sounddevice 输出流
+"""
+
+import asyncio
+import importlib.util
+import threading
+from collections import deque
+
+import numpy as np
+from config import PLAYBACK_SAMPLE_RATE, PLAYBACK_BLOCK_SIZE, PLAYBACK_VOLUME, ECHO_TAIL_DURATION, VERBOSE
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+class Mp3StreamDecoder:
+    """MP3 增量解码器，输入任意切分的字节块，输出 float32 单声道 PCM"""
+
+    def __init__(self, sample_rate: int = PLAYBACK_SAMPLE_RATE):
+        import av
+        self.codec = av.CodecContext.create("mp3", "r")
+        self.resampler = av.AudioResampler(format="flt", layout="mono", rate=sample_rate)
+
+    def _to_pcm(self, frames) -> list:
+        """重采样并转换为一维 float32 数组"""
+        pcm = []
+        for frame in frames:
+            for out in self.resampler.resample(frame):
+                pcm.append(out.to_ndarray().reshape(-1))
+        return pcm
+
+    def decode(self, data: bytes) -> list:
+        """解码新到达的数据块，返回已可播放的 PCM 片段列表"""
+        frames = []
+        for packet in self.codec.parse(data):
+            frames.extend(self.codec.decode(packet))
+        return self._to_pcm(frames)
+
+    def flush(self) -> list:
+        """输入结束，取出解码器与重采样器中剩余的数据"""
+        frames = []
+        for packet in self.codec.parse(None):
+            frames.extend(self.codec.decode(packet))
+        frames.extend(self.codec.decode(None))
+        pcm = self._to_pcm(frames)
+        for out in self.resampler.resample(None):
+            pcm.append(out.to_ndarray().reshape(-1))
+        return pcm
+
+class StreamingPlayer:
+    """常驻输出流播放器"""
+
+    def __init__(self, sample_rate: int = PLAYBACK_SAMPLE_RATE,
+                 block_size: int = PLAYBACK_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.stream = None
+        self.signal_handler = None
+        self.volume = PLAYBACK_VOLUME
+
+        self._pending = deque()
+        self._offset = 0
+        self._queued_samples = 0
+        self._lock = threading.Lock()
+
+        # 最近输出块的 RMS，作为回声抑制的参考信号
+        self._output_levels = np.zeros(max(1, int(ECHO_TAIL_DURATION * sample_rate / block_size)))
+        self._level_index = 0
+
+    @staticmethod
+    def is_available() -> bool:
+        """是否具备进程内解码能力（只检查 PyAV 是否安装，不在启动时导入）"""
+        return importlib.util.find_spec("av") is not None
+
+    def start(self):
+        """打开并启动输出流（只在首次调用时打开，之后保持常驻）"""
+        if self.stream is not None:
+            return
+        import sounddevice as sd
+        self.stream = sd.OutputStream(
+            samplerate=self.sample_rate,
+            channels=1,
+            dtype="float32",
+            blocksize=self.block_size,
+            callback=self._callback
+        )
+        self.stream.start()
+        log("✅ 音频输出流已打开")
+
+    def close(self):
+        """关闭输出流"""
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+    def echo_reference(self) -> float:
+        """最近 ECHO_TAIL_DURATION 秒内输出信号的最大 RMS"""
+        return float(self._output_levels.max())
+
+    def _clear(self):
+        """丢弃所有待播放数据"""
+        with self._lock:
+            self._pending.clear()
+            self._offset = 0
+            self._queued_samples = 0
+
+    def _enqueue(self, pcm: np.ndarray):
+        """追加待播放数据"""
+        if len(pcm) == 0:
+            return
+        with self._lock:
+            self._pending.append(pcm)
+            self._queued_samples += len(pcm)
+
+    def _callback(self, outdata, frames, time, status):
+        """音频输出回调函数"""
+        out = outdata[:, 0]
+
+        # 每个音频块检查一次打断标志，保证在一个块内停止输出
+        if self.signal_handler is not None and self.signal_handler.should_interrupt:
+            self._clear()
+            out.fill(0)
+            self._record_level(0.0)
+            return
+
+        filled = 0
+        with self._lock:
+            while filled < frames and self._pending:
+                chunk = self._pending[0]
+                n = min(frames - filled, len(chunk) - self._offset)
+                out[filled:filled + n] = chunk[self._offset:self._offset + n]
+                filled += n
+                self._offset += n
+                if self._offset >= len(chunk):
+                    self._pending.popleft()
+                    self._offset = 0
+            self._queued_samples -= filled
+        out[filled:] = 0
+        if self.volume != 1.0:
+            np.clip(out[:filled] * self.volume, -1.0, 1.0, out=out[:filled])
+        self._record_level(float(np.sqrt(np.mean(np.square(out)))))
+
+    def _record_level(self, level: float):
+        """记录一个输出块的 RMS"""
+        self._output_levels[self._level_index] = level
+        self._level_index = (self._level_index + 1) % len(self._output_levels)
+
+    async def play(self, chunks, signal_handler, drain: bool = True) -> bool:
+        """边接收 MP3 数据块边解码播放，返回是否被打断
+
+        drain 为 False 时数据全部入队即返回，不等待设备播放完毕：逐句播放时下一句
+        可以紧接着解码入队，句间不留空隙；最后一句之后调用 drain() 等待播放结束。
+        """
+        self.signal_handler = signal_handler
+        decoder = Mp3StreamDecoder(self.sample_rate)
+
+        try:
+            async for data in chunks:
+                if signal_handler.should_interrupt:
+                    break
+                for pcm in decoder.decode(data):
+                    self._enqueue(pcm)
+            else:
+                for pcm in decoder.flush():
+                    self._enqueue(pcm)
+        except BaseException:
+            self._clear()
+            self.signal_handler = None
+            raise
+
+        if drain or signal_handler.should_interrupt:
+            return await self.drain(signal_handler)
+        return False
+
+    async def drain(self, signal_handler) -> bool:
+        """等待已入队的数据播放完毕，返回是否被打断"""
+        block_duration = self.block_size / self.sample_rate
+        try:
+            while self._queued_samples > 0 and not signal_handler.should_interrupt:
+                await asyncio.sleep(block_duration)
+
+            if signal_handler.should_interrupt:
+                log("🔇 播放被打断")
+            return signal_handler.should_interrupt
+        finally:
+            if signal_handler.should_interrupt:
+                self._clear()
+            self.signal_handler = None
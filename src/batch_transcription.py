@@ -0,0 +1,312 @@
+"""
+批量转写模块
+遍历目录或清单中的录音文件，边解码边重采样到 16 kHz，在多个进程中并行转写，
+结果（含片段时间戳）逐条追加写入 JSON Lines，每个文件一条最终记录；中断后重新运行会跳过已完成的文件
+"""
+
+import json
+import os
+import signal
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .resampler import PolyphaseResampler
+from .speech_recognition import SpeechRecognizer
+from config import (
+    BATCH_WORKERS, BATCH_CPU_THREADS, BATCH_DECODING, WHISPER_LANGUAGE, ASR_SAMPLE_RATE, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 遍历目录时识别为录音的扩展名
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3", ".m4a", ".aac", ".opus", ".webm", ".mp4")
+# 流式解码的块大小（帧）
+DECODE_BLOCK_SIZE = 1 << 16
+
+def _to_mono(block: np.ndarray) -> np.ndarray:
+    return block.mean(axis=1) if block.ndim == 2 else block
+
+def _read_wave(path: str) -> np.ndarray:
+    """标准库 wave 逐块读取 PCM WAV（8/16/32 位），边读边重采样"""
+    import wave
+
+    with wave.open(path, "rb") as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        if width not in (1, 2, 4):
+            raise ValueError(f"不支持的 WAV 采样位数: {width * 8}")
+        resampler = PolyphaseResampler(rate, ASR_SAMPLE_RATE) if rate != ASR_SAMPLE_RATE else None
+        chunks = []
+        while True:
+            data = f.readframes(DECODE_BLOCK_SIZE)
+            if not data:
+                break
+            if width == 1:
+                block = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+            else:
+                dtype = "<i2" if width == 2 else "<i4"
+                block = np.frombuffer(data, dtype=dtype).astype(np.float32) / float(1 << (width * 8 - 1))
+            block = _to_mono(block.reshape(-1, channels))
+            chunks.append(resampler.process(block) if resampler is not None else block)
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+def _read_soundfile(path: str) -> np.ndarray:
+    """soundfile（libsndfile）逐块解码 FLAC/OGG/MP3 等格式，边读边重采样"""
+    import soundfile as sf
+
+    with sf.SoundFile(path) as f:
+        resampler = PolyphaseResampler(f.samplerate, ASR_SAMPLE_RATE) if f.samplerate != ASR_SAMPLE_RATE else None
+        chunks = []
+        for block in f.blocks(blocksize=DECODE_BLOCK_SIZE, dtype="float32", always_2d=True):
+            block = _to_mono(block)
+            chunks.append(resampler.process(block) if resampler is not None else block)
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+def _read_av(path: str) -> np.ndarray:
+    """PyAV（FFmpeg）逐帧解码其余格式（M4A/AAC/视频中的音轨），由 libswresample 转为 16 kHz 单声道"""
+    import av
+
+    chunks = []
+    with av.open(path) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="flt", layout="mono", rate=ASR_SAMPLE_RATE)
+        for frame in container.decode(stream):
+            chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(frame))
+        chunks.extend(out.to_ndarray().reshape(-1) for out in resampler.resample(None))
+    return np.concatenate(chunks).astype(np.float32, copy=False) if chunks else np.zeros(0, dtype=np.float32)
+
+def read_audio(path: str) -> np.ndarray:
+    """解码录音为 ASR_SAMPLE_RATE 单声道 float32（不写临时文件）
+
+    PCM WAV 使用标准库，其余格式依次尝试 soundfile 与 PyAV。逐块解码只避免了读入原始采样率的整个文件，
+    返回的仍是整段音频：每小时约 230 MB（16 kHz × 4 字节），拼接时峰值约为两倍，
+    超长录音需按此估算每个工作进程的内存。
+    """
+    if path.lower().endswith(".wav"):
+        try:
+            return _read_wave(path)
+        except Exception as e:
+            # 浮点或压缩编码的 WAV 交给 soundfile / PyAV
+            log(f"⚠️ wave 无法读取 {path}: {e}")
+    try:
+        return _read_soundfile(path)
+    except ImportError:
+        pass
+    except Exception as e:
+        log(f"⚠️ soundfile 无法读取 {path}: {e}")
+    return _read_av(path)
+
+def discover(source: str) -> list:
+    """列出待转写的文件，返回 [{"path": 路径, ...清单中的其他字段}]
+
+    source 可以是目录（递归查找录音）、单个录音文件、每行一个路径的文本清单，
+    或每行一个 JSON 对象（至少包含 "path"）的 .jsonl 清单；清单中的相对路径相对于清单所在目录。
+    """
+    if os.path.isdir(source):
+        items = []
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    items.append({"path": os.path.join(root, name)})
+        return items
+    if source.lower().endswith(AUDIO_EXTENSIONS):
+        return [{"path": source}]
+
+    base = os.path.dirname(source)
+    items = []
+    with open(source, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            item = json.loads(line) if source.endswith(".jsonl") else {"path": line}
+            item["path"] = os.path.join(base, item["path"])
+            items.append(item)
+    return items
+
+def load_records(output: str) -> tuple:
+    """读取已有结果，返回 ({路径: 该文件最后一条记录}, 记录行数)，并截掉中断时写了一半的末行"""
+    records = {}
+    lines = 0
+    if not os.path.exists(output):
+        return records, lines
+    offset = 0
+    with open(output, "rb+") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                f.truncate(offset)
+                log(f"⚠️ {output} 末尾有未写完的记录，已丢弃")
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            lines += 1
+            records[record["path"]] = record
+    return records, lines
+
+def write_records(output: str, records: dict):
+    """用每个文件的一条记录重写结果（先写临时文件再替换，中途中断不会丢失已有结果）"""
+    temp = output + ".tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        for record in records.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(temp, output)
+
+# 工作进程内的识别器（每个进程加载一次模型）
+_recognizer = None
+
+def _init_worker(cpu_threads: int, decoding: str, language: str):
+    global _recognizer
+    # 各文件的语言可能不同，不固定语言
+    _recognizer = SpeechRecognizer(cpu_threads=cpu_threads, decoding=decoding, pin_language=False)
+    _recognizer.language = language
+    _recognizer.wait_ready()
+
+def _init_pool_worker(pids, *args):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C 由主进程处理
+    pids.put(os.getpid())  # 主进程中断时按 PID 终止工作进程
+    _init_worker(*args)
+
+def _transcribe_file(item: dict) -> dict:
+    """在工作进程中解码并转写一个文件，返回结果记录（失败时包含 error）"""
+    path = item["path"]
+    record = {"path": path, "size": item.get("size")}
+    meta = {key: value for key, value in item.items() if key not in ("path", "size")}
+    if meta:
+        record["meta"] = meta  # 清单中的其他字段原样带入结果
+    start = time.perf_counter()
+    try:
+        audio = read_audio(path)
+        record["decode_time"] = round(time.perf_counter() - start, 3)
+        record.update(_recognizer.transcribe_segments(audio))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - start
+    record["elapsed"] = round(elapsed, 3)
+    if record.get("duration"):
+        record["rtf"] = round(elapsed / record["duration"], 4)
+    return record
+
+def _terminate_workers(executor: ProcessPoolExecutor, pids):
+    """取消排队中的任务并终止已启动的工作进程（PID 由各进程启动时上报）"""
+    executor.shutdown(wait=False, cancel_futures=True)
+    while not pids.empty():
+        try:
+            os.kill(pids.get(), signal.SIGTERM)
+        except OSError:
+            pass  # 进程已退出
+
+class BatchTranscriber:
+    """并行批量转写
+
+    工作进程数 × 每进程推理线程数约等于 CPU 核数。文件按大小从大到小提交，
+    避免最后只剩一个长文件在单个进程中转写；各进程自行读取与解码文件，进程间只传递路径与结果。
+    """
+
+    def __init__(self, output: str, workers: int = BATCH_WORKERS, cpu_threads: int = BATCH_CPU_THREADS,
+                 decoding: str = BATCH_DECODING, language: str = WHISPER_LANGUAGE):
+        self.output = output
+        self.cpu_threads = cpu_threads
+        self.workers = workers or max(1, (os.cpu_count() or 1) // max(cpu_threads, 1))
+        self.decoding = decoding
+        self.language = language
+
+    def pending(self, items: list) -> list:
+        """过滤掉已完成的文件（路径与大小均相同且成功），按文件大小降序排列
+
+        将要重新转写的文件（此前失败或已被修改）的旧记录先从结果中移除，
+        使结果中每个文件只有一条最终记录。
+        """
+        records, lines = load_records(self.output)
+        pending = []
+        for item in items:
+            try:
+                item["size"] = os.path.getsize(item["path"])
+            except OSError:
+                item["size"] = None
+            record = records.get(item["path"])
+            if record is None or "error" in record or record.get("size") != item["size"]:
+                pending.append(item)
+        stale = [item["path"] for item in pending if item["path"] in records]
+        for path in stale:
+            del records[path]
+        if stale or lines > len(records):
+            write_records(self.output, records)
+        skipped = len(items) - len(pending)
+        if skipped:
+            print(f"⏭️ 跳过已完成的 {skipped} 个文件")
+        pending.sort(key=lambda item: item["size"] or 0, reverse=True)
+        return pending
+
+    def _results(self, items: list):
+        """按完成顺序产出结果记录"""
+        initargs = (self.cpu_threads, self.decoding, self.language)
+        if self.workers == 1:
+            _init_worker(*initargs)
+            for item in items:
+                yield _transcribe_file(item)
+            return
+
+        context = multiprocessing.get_context("spawn")
+        pids = context.SimpleQueue()
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            # spawn 启动的子进程不继承主进程的线程状态
+            mp_context=context,
+            initializer=_init_pool_worker,
+            initargs=(pids,) + initargs,
+        )
+        try:
+            futures = [executor.submit(_transcribe_file, item) for item in items]
+            for future in as_completed(futures):
+                yield future.result()
+        except BaseException:
+            # 中断时取消排队中的文件并终止正在转写的进程（工作进程忽略 SIGINT，否则退出时要等它们转写完），
+            # 未完成的文件不会写入结果，下次运行时重新转写
+            _terminate_workers(executor, pids)
+            raise
+        executor.shutdown()
+
+    def run(self, items: list) -> dict:
+        """转写全部未完成的文件，每完成一个立即追加写入结果，返回统计信息"""
+        items = self.pending(items)
+        stats = {"files": len(items), "done": 0, "failed": 0, "audio_seconds": 0.0, "wall_seconds": 0.0}
+        if not items:
+            return stats
+
+        output_dir = os.path.dirname(self.output)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        print(f"🚀 转写 {len(items)} 个文件（{self.workers} 个进程 × {self.cpu_threads} 线程，解码策略 {self.decoding}）")
+        start = time.perf_counter()
+        try:
+            with open(self.output, "a", encoding="utf-8") as f:
+                for record in self._results(items):
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    finished = stats["done"] + stats["failed"] + 1
+                    if "error" in record:
+                        stats["failed"] += 1
+                        print(f"❌ [{finished}/{len(items)}] {record['path']}: {record['error']}")
+                    else:
+                        stats["done"] += 1
+                        stats["audio_seconds"] += record["duration"]
+                        log(f"✅ [{finished}/{len(items)}] {record['path']}"
+                            f"（{record['duration']:.1f} 秒，RTF {record.get('rtf', 0):.3f}）")
+        finally:
+            stats["wall_seconds"] = time.perf_counter() - start
+        return stats
+
+def format_stats(stats: dict) -> str:
+    """汇总吞吐量（音频秒数 / 实际耗时）"""
+    wall = stats["wall_seconds"]
+    speed = stats["audio_seconds"] / wall if wall else 0.0
+    return (f"📊 完成 {stats['done']}/{stats['files']} 个文件，失败 {stats['failed']} 个；"
+            f"音频 {stats['audio_seconds'] / 3600:.2f} 小时，耗时 {wall:.1f} 秒，{speed:.1f}× 实时")
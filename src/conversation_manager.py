@@ -4,17 +4,33 @@
 """
 
 import asyncio
-from openai import OpenAI
-from fuzzywuzzy import fuzz
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from .audio_manager import AudioManager
-from .speech_recognition import SpeechRecognizer
+from .speech_recognition import SpeechRecognizer, StreamingTranscriber
+from .asr_pool import ASRWorkerPool
 from .text_to_speech import TextToSpeech
+from .text_segmenter import SentenceSplitter
+from .history import ConversationHistory
+from .response_cache import ResponseCache
+from .startup import startup_timer
+from .latency_tracer import LatencyTracer
+from .mock_llm_server import MockChatServer
+from .http_pool import LLMConnectionPool
+from .intent_router import IntentRouter
+from .speculation import SpeculativeRequest, SPECULATION_POLL_INTERVAL
+from .endpointing import EndpointDecider
+from .session_store import SessionStore, encode_pcm
 from config import (
-    API_KEY, BASE_URL, MODEL_NAME, MAX_TOKENS,
-    MAX_HISTORY_LENGTH, SYSTEM_PROMPT,
-    EXIT_COMMANDS, EXIT_FUZZY_THRESHOLD,
-    VERBOSE
+    API_KEY, BASE_URL, MODEL_NAME, MAX_TOKENS, LLM_BACKEND,
+    HISTORY_SUMMARY_MAX_TOKENS, HISTORY_SUMMARY_PROMPT, SYSTEM_PROMPT, STREAM_RESPONSE, STREAMING_ASR,
+    PIPELINE_QUEUE_SIZE, BARGE_IN_ENABLED, ASR_WORKER_PROCESSES,
+    RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_CONTEXT_TURNS,
+    SPECULATIVE_LLM, SPECULATIVE_STABLE_WINDOW, SPECULATIVE_MIN_SILENCE, ENDPOINT_AGGRESSIVENESS,
+    SESSION_STORE_ENABLED, SESSION_RESUME, SESSION_STORE_AUDIO,
+    STARTUP_REPORT, VERBOSE
 )
 
 def log(msg):
@@ -22,112 +38,851 @@ def log(msg):
         print(msg)
 
 class ConversationManager:
-    """对话管理器"""
+    """对话管理器
     
-    def __init__(self, signal_handler):
+    一轮对话由若干 asyncio 阶段组成，阶段之间通过有界队列连接：
+    采集 -> 识别 -> 回复（生成 -> 合成 -> 播放）。
+    阻塞的采集与识别在专用线程池中执行，事件循环始终保持响应。
+    
+    各组件默认在本地创建；服务端模式下由多个会话共享的组件（识别模型、TTS、
+    LLM 客户端与连接池、识别线程池、延迟追踪器）与每个会话的存储通过参数注入。
+    """
+    
+    def __init__(self, signal_handler, audio_manager=None, speech_recognizer=None, tts=None,
+                 client=None, http_pool=None, asr_executor=None, tracer=None, asr_scheduler=None,
+                 session_store=None):
         self.signal_handler = signal_handler
         
         # 初始化各个组件
-        self.audio_manager = AudioManager()
-        self.speech_recognizer = SpeechRecognizer()
-        self.tts = TextToSpeech()
+        self.audio_manager = audio_manager or AudioManager()
+        # ASR_WORKER_PROCESSES > 0 时识别在独立的工作进程中进行，不与采集线程争用 GIL
+        self.asr_pool = None
+        if speech_recognizer is None and ASR_WORKER_PROCESSES:
+            self.asr_pool = speech_recognizer = ASRWorkerPool()
+        self.speech_recognizer = speech_recognizer or SpeechRecognizer()
+        self.tts = tts or TextToSpeech()
+        self.streaming_transcriber = None
+        if STREAMING_ASR:
+            self.streaming_transcriber = StreamingTranscriber(
+                self.speech_recognizer, self.audio_manager
+            )
         
-        # 初始化 OpenAI 客户端
-        self.client = OpenAI(api_key=API_KEY, base_url=BASE_URL)
+        # 每轮对话的延迟追踪
+        self.tracer = tracer or LatencyTracer()
         
-        # 初始化对话历史
-        self.conversation_history = [
-            {"role": "system", "content": SYSTEM_PROMPT}
-        ]
+        # OpenAI 异步客户端在后台预热时创建（见 client 属性）
+        self._client = client
+        self._client_lock = threading.Lock()  # 预热线程与事件循环可能同时首次访问 client
+        self.http_pool = http_pool
+        self._keepalive = None
+        self.base_url = BASE_URL
+        # LLM_BACKEND = "mock" 时在对话开始前启动本地替身服务
+        self.mock_server = MockChatServer() if LLM_BACKEND == "mock" else None
+        
+        # 阻塞阶段使用的线程池（采集与识别各占一个线程）
+        self.capture_executor = ThreadPoolExecutor(max_workers=1)
+        self.asr_executor = asr_executor or ThreadPoolExecutor(max_workers=1)
+        # 多会话共享模型时，整段识别交给批处理调度器
+        self.asr_scheduler = asr_scheduler
+        
+        # 未启用插话时，回复结束后才允许采集下一段语音
+        self.capture_allowed = asyncio.Event()
+        # 流式识别器同一时间只跟踪一段语音，上一段识别完成后才能开始下一段
+        self.recognition_done = asyncio.Event()
+        
+        # 初始化对话历史（按 token 预算保留，旧轮次在后台折叠为摘要）
+        self.history = ConversationHistory(SYSTEM_PROMPT, summarizer=self._summarize_history)
+        # 本地命令匹配（退出、停止、重复、音量、清空历史）
+        self.intent_router = IntentRouter()
+        
+        # 会话存储（可选）：每轮对话追加写入磁盘，启动时只读取最近的轮次恢复历史
+        self.session_store = session_store
+        if session_store is None and SESSION_STORE_ENABLED:
+            self.session_store = SessionStore.latest() if SESSION_RESUME else SessionStore.create()
+        if self.session_store is not None and len(self.session_store):
+            summary, pending, turns = self.session_store.recent_history(self.history.token_budget)
+            self.history.restore(summary, turns, pending)
+            log(f"📂 已恢复 {len(turns)} 轮对话历史" + (f"（另有 {len(pending)} 轮待折叠进摘要）" if pending else ""))
+        # 写入（含 fsync）在专用线程中按顺序执行，不阻塞事件循环上的采集、识别与推测请求
+        self.store_executor = ThreadPoolExecutor(max_workers=1) if self.session_store is not None else None
+        self._store_write = None   # 最近一次写入的 Future
+        self._user_audio = {}      # 轮次编号 -> 该轮用户语音（int16 PCM）
+        self._current_turn = None  # 本轮写入历史的对话轮次
+        self._reply_audio = None   # 本轮回复的音频数据块
+        
+        # 推测式 LLM 请求：依赖流式识别在端点静音期间给出的部分结果
+        self.speculative = SPECULATIVE_LLM and self.streaming_transcriber is not None
+        if SPECULATIVE_LLM and not self.speculative:
+            log("⚠️ 推测式 LLM 请求需要启用 STREAMING_ASR，已关闭。")
+        self._speculation = None   # 当前语音段的推测请求
+        self._speculations = {}    # 轮次编号 -> 该轮语音段的推测请求
+        
+        # 语义端点：部分识别结果已是完整语句时缩短端点静音，同样依赖流式识别
+        self.endpointer = None
+        if ENDPOINT_AGGRESSIVENESS > 0:
+            if self.streaming_transcriber is not None:
+                self.endpointer = EndpointDecider(ENDPOINT_AGGRESSIVENESS)
+                self.audio_manager.endpoint_silence = self._endpoint_silence
+                # 静音一开始就解码一次，尽早拿到覆盖全部语音的部分结果
+                self.audio_manager.pause_callback = self.streaming_transcriber.request_decode
+            else:
+                log("⚠️ 语义端点需要启用 STREAMING_ASR，已关闭。")
+        # 简短问句的回复缓存（可选）
+        self.response_cache = ResponseCache() if RESPONSE_CACHE_ENABLED else None
+        
+        if BARGE_IN_ENABLED and not self.audio_manager.has_echo_reference():
+            log("⚠️ 外部播放器没有回声参考，已关闭插话（回复播放完才开始采集）。")
         
         log("✅ 对话管理器初始化完成")
     
-    def _should_exit(self, user_input: str) -> bool:
-        """检查用户是否想要退出"""
-        return any(
-            fuzz.partial_ratio(user_input.lower(), cmd) > EXIT_FUZZY_THRESHOLD
-            for cmd in EXIT_COMMANDS
+    @property
+    def client(self):
+        """OpenAI 异步客户端（首次访问时导入 openai 并创建，请求经共享连接池发出）
+        
+        预热在线程池中访问以免导入阻塞事件循环；加锁保证只创建一个客户端与连接池，
+        预热期间事件循环上的首次访问会等待预热线程创建完成。
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import AsyncOpenAI
+                    self.http_pool = LLMConnectionPool(self.base_url, API_KEY)
+                    self._client = AsyncOpenAI(
+                        api_key=API_KEY, base_url=self.base_url, http_client=self.http_pool.client
+                    )
+        return self._client
+    
+    @client.setter
+    def client(self, client):
+        self._client = client
+    
+    def _open_audio(self):
+        """打开采集与输出设备"""
+        with startup_timer.phase("音频设备打开"):
+            self.audio_manager.start()
+            if self.audio_manager.player is not None:
+                try:
+                    self.audio_manager.player.start()
+                except Exception as e:
+                    log(f"❌ 打开音频输出流失败，回退到外部播放器: {e}")
+                    self.audio_manager.player = None
+    
+    async def _preconnect_llm(self):
+        """预热 LLM：导入 openai、创建客户端并建立连接"""
+        loop = asyncio.get_event_loop()
+        with startup_timer.phase("LLM 预连接"):
+            try:
+                client = await loop.run_in_executor(None, lambda: self.client)
+                await asyncio.wait_for(client.models.list(), timeout=10)
+            except Exception as e:
+                log(f"⚠️ LLM 预连接失败: {e}")
+        
+        if self.http_pool is not None:
+            # 用户说话期间预连接与保活，使握手与说话重叠
+            self._keepalive = asyncio.ensure_future(
+                self.http_pool.run_keepalive(lambda: self.audio_manager.is_recording)
+            )
+    
+    async def _preconnect_tts(self):
+        """预热 TTS"""
+        with startup_timer.phase("TTS 预连接"):
+            await self.tts.preconnect()
+    
+    async def _wait_model(self):
+        """等待 Whisper 模型在后台加载与预热完成"""
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.speech_recognizer.wait_ready)
+    
+    async def _warm_up(self):
+        """与采集并行的后台预热：模型加载、LLM 与 TTS 预连接"""
+        await asyncio.gather(
+            self._wait_model(),
+            self._preconnect_llm(),
+            self._preconnect_tts(),
         )
+        startup_timer.mark("预热全部完成")
+        if STARTUP_REPORT:
+            print(startup_timer.report())
     
-    async def _get_ai_response(self, user_input: str) -> str:
-        """获取 AI 响应"""
-        # 添加用户输入到历史
-        self.conversation_history.append({"role": "user", "content": user_input})
+    @property
+    def barge_in(self) -> bool:
+        """回复期间是否检测插话（需要回声参考，进程内播放器回退到外部播放器后关闭）"""
+        return BARGE_IN_ENABLED and self.audio_manager.has_echo_reference()
+    
+    @property
+    def conversation_history(self) -> list:
+        """发送给模型的消息列表（系统提示、摘要与最近的对话轮次）"""
+        return self.history.messages()
+    
+    async def _summarize_history(self, summary: str, turns: list) -> str:
+        """把被淘汰的对话轮次合并进滚动摘要（后台执行，不在回复的关键路径上）"""
+        lines = [f"已有摘要：{summary or '无'}", "新增对话："]
+        for turn in turns:
+            lines.append(f"用户：{turn.user}")
+            if turn.assistant:
+                lines.append(f"助手：{turn.assistant}")
         
-        # 保持历史长度
-        if len(self.conversation_history) > MAX_HISTORY_LENGTH:
-            self.conversation_history.pop(1)  # 保留系统提示
+        response = await self.client.chat.completions.create(
+            model=MODEL_NAME,
+            messages=[
+                {"role": "system", "content": HISTORY_SUMMARY_PROMPT},
+                {"role": "user", "content": "\n".join(lines)},
+            ],
+            max_tokens=HISTORY_SUMMARY_MAX_TOKENS,
+            stream=False
+        )
+        return response.choices[0].message.content
+    
+    def _add_user_message(self, user_input: str):
+        """添加用户输入到历史（超出 token 预算时整轮淘汰最旧的对话）"""
+        self._current_turn = self.history.add_user(user_input)
+    
+    def _context_fingerprint(self) -> str:
+        """回复缓存的上下文指纹：模型、系统提示与最近 RESPONSE_CACHE_CONTEXT_TURNS 轮对话"""
+        recent = list(self.history.turns)[-RESPONSE_CACHE_CONTEXT_TURNS:] if RESPONSE_CACHE_CONTEXT_TURNS else []
+        return ResponseCache.fingerprint(
+            MODEL_NAME, SYSTEM_PROMPT, [(turn.user, turn.assistant) for turn in recent]
+        )
+    
+    async def _get_ai_response(self, user_input: str, trace=None, cache_key=None, speculation=None) -> str:
+        """获取 AI 响应（推测请求命中时等待其完成）"""
+        self._add_user_message(user_input)
         
         try:
-            log("🤖 正在获取 AI 响应...")
-            response = self.client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=self.conversation_history,
-                max_tokens=MAX_TOKENS,
-                stream=False
-            )
+            if speculation is not None:
+                ai_response = "".join([delta async for delta in speculation.stream()])
+            else:
+                log("🤖 正在获取 AI 响应...")
+                response = await self.client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=self.conversation_history,
+                    max_tokens=MAX_TOKENS,
+                    stream=False
+                )
+                ai_response = response.choices[0].message.content
             
-            ai_response = response.choices[0].message.content
+            if trace is not None:
+                # 非流式请求的首 token 与完成时间相同
+                trace.mark("llm_first_token")
+                trace.mark("llm_done")
             
             # 添加 AI 响应到历史
-            self.conversation_history.append({"role": "assistant", "content": ai_response})
+            self.history.add_assistant(ai_response)
+            if self.response_cache is not None:
+                self.response_cache.put(cache_key, ai_response)
             
             return ai_response
-            
+        
         except Exception as e:
             log(f"❌ 模型请求出错: {e}")
             return ""
     
-    async def start_conversation(self):
-        """启动对话循环"""
-        print("🎯 开始语音对话...")
+    @staticmethod
+    async def _stream_deltas(stream):
+        """从流式响应中取出增量文本"""
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    
+    async def _stream_ai_response(self, user_input: str, trace=None, cache_key=None, speculation=None):
+        """流式获取 AI 响应，按句子/短句逐个产出（推测请求命中时沿用其已生成的内容）"""
+        self._add_user_message(user_input)
+        
+        splitter = SentenceSplitter()
+        parts = []
+        stream = None
+        
+        try:
+            if speculation is not None:
+                deltas = speculation.stream()
+            else:
+                log("🤖 正在获取 AI 响应（流式）...")
+                stream = await self.client.chat.completions.create(
+                    model=MODEL_NAME,
+                    messages=self.conversation_history,
+                    max_tokens=MAX_TOKENS,
+                    stream=True
+                )
+                deltas = self._stream_deltas(stream)
+            
+            async for delta in deltas:
+                if trace is not None and not parts:
+                    trace.mark("llm_first_token")
+                parts.append(delta)
+                for sentence in splitter.feed(delta):
+                    yield sentence
+            
+            # 只缓存完整生成的回复
+            if self.response_cache is not None:
+                self.response_cache.put(cache_key, "".join(parts))
+            
+            tail = splitter.flush()
+            if tail:
+                yield tail
+        
+        except Exception as e:
+            log(f"❌ 模型请求出错: {e}")
+        finally:
+            if trace is not None:
+                trace.mark("llm_done")
+            if stream is not None:
+                try:
+                    await stream.close()
+                except Exception:
+                    pass
+            if speculation is not None:
+                # 回复被打断时停止仍在生成的推测请求
+                await speculation.cancel()
+            # 流结束（或被打断）后写入完整回复
+            if parts:
+                self.history.add_assistant("".join(parts))
+    
+    def _start_speculation(self, text: str):
+        """以部分识别结果提前发出 LLM 请求（历史不变，最终结果确认后才写入；认领时要求历史仍与此时一致）"""
+        if self.intent_router.match(text) is not None:
+            return
+        messages = self.conversation_history + [{"role": "user", "content": text}]
+        self._speculation = SpeculativeRequest(self.client, messages, text)
+        self.tracer.increment("speculation_started")
+        log(f"🚀 推测请求: {text}")
+    
+    async def _discard_speculation(self, speculation):
+        """取消未命中的推测请求并记录浪费的 token"""
+        if speculation is None:
+            return
+        wasted = await speculation.cancel()
+        self.tracer.increment("speculation_miss")
+        self.tracer.increment("speculation_wasted_prompt_tokens", speculation.prompt_tokens)
+        self.tracer.increment("speculation_wasted_completion_tokens", wasted)
+        log(f"🗑️ 推测请求未命中: {speculation.text}（浪费约 {wasted} 个生成 token）")
+    
+    async def _claim_speculation(self, speculation, user_input: str, trace):
+        """最终识别结果与推测一致且对话历史未变化时沿用推测请求，否则取消（调用方重新发出请求）"""
+        if speculation is None:
+            return None
+        if not speculation.based_on(self.conversation_history):
+            # 推测发出后上一轮的回复才写入历史（如插话打断）或摘要已折叠，请求的上下文已过期
+            log("🔀 推测请求发出后对话历史已变化")
+        elif speculation.matches(user_input) and speculation.usable:
+            self.tracer.increment("speculation_hit")
+            trace.set(speculation="hit", speculation_lead=round(time.monotonic() - speculation.started, 3))
+            log(f"🎯 推测请求命中，提前 {time.monotonic() - speculation.started:.2f} 秒发出")
+            return speculation
+        trace.set(speculation="miss")
+        await self._discard_speculation(speculation)
+        return None
+    
+    def _endpoint_silence(self) -> float:
+        """当前语音段所需的端点静音时长（在采集线程中逐帧调用）
+
+        只有覆盖全部已说内容的部分识别结果才参与判定，解码尚未跟上时等待完整的 SILENCE_DURATION。
+        """
+        return self.endpointer.required_silence(self.streaming_transcriber.settled_partial())
+    
+    async def _speculation_stage(self):
+        """推测阶段：端点静音期间部分识别结果保持稳定时提前发出 LLM 请求"""
+        audio_manager = self.audio_manager
+        transcriber = self.streaming_transcriber
+        stable_text, stable_since = None, 0.0
         
         while True:
+            await asyncio.sleep(SPECULATION_POLL_INTERVAL)
+            if not audio_manager.is_recording:
+                stable_text = None
+                continue
+            
+            partial = transcriber.partial
+            now = time.monotonic()
+            if partial != stable_text:
+                stable_text, stable_since = partial, now
+                # 用户继续说话，识别结果变化后先前的推测作废
+                if self._speculation is not None and not self._speculation.matches(partial):
+                    speculation, self._speculation = self._speculation, None
+                    await self._discard_speculation(speculation)
+                continue
+            
+            # 只在最近一次解码已覆盖语音结束位置（即包含全部已说内容）时推测
+            if (partial and self._speculation is None and transcriber.settled_partial() is not None
+                    and now - stable_since >= SPECULATIVE_STABLE_WINDOW
+                    and audio_manager.silence_timer >= SPECULATIVE_MIN_SILENCE):
+                self._start_speculation(partial)
+    
+    async def _split_sentences(self, text: str):
+        """按句子产出一段完整文本（供合成与播放流水线使用）"""
+        splitter = SentenceSplitter()
+        for sentence in splitter.feed(text):
+            yield sentence
+        tail = splitter.flush()
+        if tail:
+            yield tail
+    
+    async def _cached_response(self, user_input: str, reply: str, trace):
+        """回复缓存命中：不请求 LLM，按句子产出缓存的回复"""
+        self._add_user_message(user_input)
+        trace.mark("llm_first_token")
+        trace.mark("llm_done")
+        
+        sentences = self._split_sentences(reply)
+        try:
+            async for sentence in sentences:
+                yield sentence
+        finally:
+            await sentences.aclose()
+            self.history.add_assistant(reply)
+    
+    async def _record_reply(self, chunks):
+        """透传合成的音频数据块，启用会话存储时同时保留，写入本轮记录"""
+        async for data in chunks:
+            if self._reply_audio is not None:
+                self._reply_audio.append(data)
+            yield data
+    
+    async def _trace_first_chunk(self, chunks, trace, *events):
+        """透传音频数据块，在首块到达时记录追踪事件"""
+        async for data in chunks:
+            for event in events:
+                trace.mark(event)
+            yield data
+    
+    async def _until_interrupted(self, items):
+        """透传异步生成器的产出，打断时立即结束
+        
+        等待下一项与等待打断标志同时进行：慢速 LLM 生成下一句期间被打断时，
+        取消正在进行的读取（由 items 自身的 finally 关闭 LLM 流），不必等到下一句产出。
+        """
+        interrupted = asyncio.ensure_future(self.signal_handler.wait_interrupt())
+        try:
+            while True:
+                pending = asyncio.ensure_future(items.__anext__())
+                await asyncio.wait((pending, interrupted), return_when=asyncio.FIRST_COMPLETED)
+                if not pending.done():
+                    pending.cancel()
+                    await asyncio.gather(pending, return_exceptions=True)
+                    return
+                try:
+                    item = pending.result()
+                except StopAsyncIteration:
+                    return
+                yield item
+        finally:
+            interrupted.cancel()
+            await items.aclose()
+    
+    async def _respond_streaming(self, sentences, trace) -> bool:
+        """流式回复：生成、合成与播放三段并行，返回是否获得了回复
+        
+        sentences 为逐句产出回复的异步生成器（LLM 流式输出或缓存的回复）。
+        """
+        sentences = self._until_interrupted(sentences)
+        sentence_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        audio_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        got_response = False
+        
+        async def generate():
+            nonlocal got_response
+            try:
+                async for sentence in sentences:
+                    if self.signal_handler.should_interrupt:
+                        break
+                    if not got_response:
+                        got_response = True
+                        print("🤖 AI 回复: ", end="", flush=True)
+                    print(sentence, end="", flush=True)
+                    await sentence_queue.put(sentence)
+            finally:
+                await sentences.aclose()
+                if got_response:
+                    print()
+                await sentence_queue.put(None)
+        
+        async def synthesize():
+            # 每个句子对应一个数据块队列，合成可领先于播放进行
             try:
-                # 重置打断标志
-                self.signal_handler.reset_interrupt_flag()
-                
-                # 录制用户语音
-                audio_data = self.audio_manager.record_audio()
-                
-                # 转录语音
-                user_input = self.speech_recognizer.transcribe(audio_data)
-                
-                if not user_input:
-                    log("⚠️ 请再说一遍。")
-                    continue
-                
-                print(f"👤 你说: {user_input}")
-                
-                # 检查是否退出
-                if self._should_exit(user_input):
-                    print("👋 再见!")
+                while True:
+                    sentence = await sentence_queue.get()
+                    if sentence is None:
+                        break
+                    if self.signal_handler.should_interrupt:
+                        continue
+                    chunk_queue = asyncio.Queue()
+                    await audio_queue.put(chunk_queue)
+                    try:
+                        async for data in self._record_reply(self.tts.stream(sentence)):
+                            if self.signal_handler.should_interrupt:
+                                break
+                            trace.mark("tts_first_byte")
+                            await chunk_queue.put(data)
+                    finally:
+                        await chunk_queue.put(None)
+            finally:
+                await audio_queue.put(None)
+        
+        async def drain(chunk_queue):
+            while True:
+                data = await chunk_queue.get()
+                if data is None:
+                    break
+                trace.mark("playback_start")
+                yield data
+        
+        async def play():
+            announced = False
+            while True:
+                chunk_queue = await audio_queue.get()
+                if chunk_queue is None:
                     break
-                
-                # 获取 AI 响应
-                ai_response = await self._get_ai_response(user_input)
-                
-                if not ai_response:
-                    log("⚠️ 未获得有效回复，请重试。")
-                    continue
-                
-                print(f"🤖 AI 回复: {ai_response}")
-                
-                # 合成语音
-                audio_file = await self.tts.synthesize(ai_response)
-                
-                if audio_file:
-                    # 播放语音（支持打断）
-                    was_interrupted = await self.audio_manager.play_audio_with_interrupt(
-                        audio_file, self.signal_handler
+                if not announced:
+                    announced = True
+                    log("🔊 正在播放... (按 Ctrl+C 可打断)")
+                # 句子入队即返回，下一句紧接着解码，不等上一句从设备播放完
+                await self.audio_manager.play_stream_with_interrupt(
+                    drain(chunk_queue), self.signal_handler, announce=False, drain=False
+                )
+            await self.audio_manager.drain_playback(self.signal_handler)
+        
+        self.signal_handler.set_responding_state(True)
+        try:
+            await asyncio.gather(generate(), synthesize(), play())
+        finally:
+            self.signal_handler.set_responding_state(False)
+        
+        if self.signal_handler.should_interrupt:
+            trace.mark("interrupted")
+            print("🔄 继续对话...")
+        elif "playback_start" in trace.events:
+            trace.mark("playback_end")
+        
+        return got_response
+    
+    def _on_barge_in(self):
+        """采集线程检测到用户插话：立即打断当前回复（播放在一个音频块内停止）"""
+        self.signal_handler.should_interrupt = True
+        print("\n🎤 检测到插话，停止播放...")
+    
+    async def _handle_turn(self, user_input: str, trace) -> bool:
+        """处理一轮用户输入，返回 False 表示结束对话"""
+        # 重置打断标志
+        self.signal_handler.reset_interrupt_flag()
+        trace.set(user_chars=len(user_input or ""))
+        speculation = self._speculations.pop(trace.turn_id, None)
+        
+        if not user_input:
+            await self._discard_speculation(speculation)
+            log("⚠️ 请再说一遍。")
+            return True
+        
+        print(f"👤 你说: {user_input}")
+        
+        # 本地命令直接处理，不请求 LLM
+        intent = self.intent_router.match(user_input)
+        if intent is not None:
+            await self._discard_speculation(speculation)
+            return await self._handle_intent(intent, trace)
+        
+        if self.barge_in:
+            # 回复期间保持监听，用户开口即打断
+            self.audio_manager.arm_barge_in(self._on_barge_in)
+        
+        # 回复缓存：简短问句命中时跳过 LLM 请求
+        cache_key = cached = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(user_input, self._context_fingerprint())
+            cached = self.response_cache.get(cache_key)
+            if cache_key is not None:
+                trace.set(response_cache="hit" if cached is not None else "miss")
+        
+        if cached is not None:
+            await self._discard_speculation(speculation)
+        else:
+            speculation = await self._claim_speculation(speculation, user_input, trace)
+        
+        if STREAM_RESPONSE:
+            # 流式回复：首句生成完即开始合成与播放
+            if cached is not None:
+                sentences = self._cached_response(user_input, cached, trace)
+            else:
+                sentences = self._stream_ai_response(user_input, trace, cache_key, speculation)
+            if not await self._respond_streaming(sentences, trace):
+                log("⚠️ 未获得有效回复，请重试。")
+            return True
+        
+        # 获取 AI 响应
+        if cached is not None:
+            self._add_user_message(user_input)
+            self.history.add_assistant(cached)
+            trace.mark("llm_first_token")
+            trace.mark("llm_done")
+            ai_response = cached
+        else:
+            ai_response = await self._get_ai_response(user_input, trace, cache_key, speculation)
+        
+        if not ai_response:
+            log("⚠️ 未获得有效回复，请重试。")
+            return True
+        
+        print(f"🤖 AI 回复: {ai_response}")
+        
+        # 边合成边播放（支持打断）
+        was_interrupted = await self.audio_manager.play_stream_with_interrupt(
+            self._trace_first_chunk(self._record_reply(self.tts.stream(ai_response)), trace,
+                                    "tts_first_byte", "playback_start"),
+            self.signal_handler
+        )
+        
+        if was_interrupted:
+            trace.mark("interrupted")
+            print("🔄 继续对话...")
+        elif "playback_start" in trace.events:
+            trace.mark("playback_end")
+        
+        return True
+    
+    async def _handle_intent(self, intent, trace) -> bool:
+        """执行本地命令，返回 False 表示结束对话"""
+        log(f"🧭 本地命令: {intent.intent}（{intent.method}）")
+        trace.set(intent=intent.intent)
+        
+        if intent.intent == "exit":
+            print("👋 再见!")
+            return False
+        
+        if intent.intent == "stop":
+            # 播放已在用户开口（插话）或 Ctrl+C 时停止，这里只需不再请求回复
+            print("⏹️ 已停止。")
+        
+        elif intent.intent == "repeat":
+            last_reply = next(
+                (turn.assistant for turn in reversed(self.history.turns) if turn.assistant), None
+            )
+            if last_reply is None:
+                print("ℹ️ 还没有可以重复的回复。")
+            else:
+                if self.barge_in:
+                    self.audio_manager.arm_barge_in(self._on_barge_in)
+                await self._respond_streaming(self._split_sentences(last_reply), trace)
+        
+        elif intent.intent in ("louder", "quieter"):
+            volume = self.audio_manager.adjust_volume(1 if intent.intent == "louder" else -1)
+            if volume is None:
+                print("⚠️ 外部播放器不支持调节音量。")
+            else:
+                print(f"🔊 音量: {volume:.0%}")
+        
+        elif intent.intent == "clear_history":
+            self.history.clear()
+            print("🧹 已清空对话历史。")
+        
+        return True
+    
+    async def _capture_stage(self, audio_queue: asyncio.Queue):
+        """采集阶段：在线程池中等待完整的语音段"""
+        loop = asyncio.get_event_loop()
+        
+        while True:
+            if not self.barge_in:
+                await self.capture_allowed.wait()
+                self.capture_allowed.clear()
+            
+            if self.streaming_transcriber is not None:
+                # 录音过程中即开始识别，结束后只解码尾部
+                await self.recognition_done.wait()
+                self.recognition_done.clear()
+                self.streaming_transcriber.start()
+            
+            audio_data = await loop.run_in_executor(
+                self.capture_executor, self.audio_manager.record_audio
+            )
+            if audio_data is not None:
+                # record_audio 返回环形缓冲区的视图；插话时下一段语音继续写入缓冲区，
+                # 而本段可能仍在队列中等待识别，离开采集阶段前复制一份
+                audio_data = audio_data.copy()
+            # 采集端 VAD 的语音区间随音频一起传给识别阶段
+            speech_spans = self.audio_manager.segment_speech_spans()
+            trace = self.tracer.new_turn()
+            if self.audio_manager.onset_time is not None:
+                trace.mark("speech_onset", self.audio_manager.onset_time)
+            if self.audio_manager.endpoint_time is not None:
+                trace.mark("endpoint", self.audio_manager.endpoint_time)
+            if self.audio_manager.endpoint_wait is not None:
+                trace.set(endpoint_wait=round(self.audio_manager.endpoint_wait, 3))
+            if self.session_store is not None and SESSION_STORE_AUDIO and audio_data is not None:
+                # 编码为 int16 保留到本轮写入存储
+                self._user_audio[trace.turn_id] = encode_pcm(audio_data)
+            if self._speculation is not None:
+                # 推测请求随本轮交给回复阶段，与最终识别结果比对
+                self._speculations[trace.turn_id] = self._speculation
+                self._speculation = None
+            await audio_queue.put((audio_data, speech_spans, trace))
+    
+    async def _recognition_stage(self, audio_queue: asyncio.Queue, text_queue: asyncio.Queue):
+        """识别阶段：在线程池中运行 Whisper"""
+        loop = asyncio.get_event_loop()
+        
+        while True:
+            audio_data, speech_spans, trace = await audio_queue.get()
+            
+            try:
+                if self.streaming_transcriber is not None:
+                    user_input = await loop.run_in_executor(
+                        self.asr_executor, self.streaming_transcriber.finish, audio_data
+                    )
+                elif self.asr_scheduler is not None:
+                    user_input = await asyncio.wrap_future(
+                        self.asr_scheduler.submit(audio_data, speech_spans)
+                    )
+                else:
+                    user_input = await loop.run_in_executor(
+                        self.asr_executor, self.speech_recognizer.transcribe, audio_data, speech_spans
                     )
-                    
-                    # 清理临时文件
-                    self.tts.cleanup_temp_file(audio_file)
-                    
-                    if was_interrupted:
-                        print("🔄 继续对话...")
-                
+            except Exception as e:
+                log(f"❌ 转录过程中发生错误: {e}")
+                user_input = ""
+            finally:
+                self.recognition_done.set()
+                trace.mark("asr_done")
+            
+            await text_queue.put((user_input, trace))
+    
+    async def _response_stage(self, text_queue: asyncio.Queue):
+        """回复阶段：生成、合成并播放回复，用户要求退出时返回"""
+        while True:
+            user_input, trace = await text_queue.get()
+            self._current_turn = None
+            self._reply_audio = [] if self.session_store is not None and SESSION_STORE_AUDIO else None
+            
+            try:
+                if not await self._handle_turn(user_input, trace):
+                    return
             except Exception as e:
                 log(f"❌ 对话过程中发生错误: {e}")
-                continue
+            finally:
+                # 本轮结束，允许采集下一段语音
+                self.audio_manager.disarm_barge_in()
+                self.capture_allowed.set()
+                self._finish_trace(trace)
+                self._store_turn(user_input, trace)
+    
+    def _finish_trace(self, trace):
+        """结束本轮追踪，同时更新缓存命中率与 LLM 连接复用等指标"""
+        if self.tts.cache is not None:
+            for name, value in self.tts.cache.stats().items():
+                self.tracer.set_gauge(f"tts_cache_{name}", value)
+        if self.response_cache is not None:
+            for name, value in self.response_cache.stats().items():
+                self.tracer.set_gauge(f"response_cache_{name}", value)
+        if self.http_pool is not None:
+            for name, value in self.http_pool.stats().items():
+                self.tracer.set_gauge(f"llm_http_{name}", value)
+        if self.speculative:
+            hits = self.tracer.counters.get("speculation_hit", 0)
+            misses = self.tracer.counters.get("speculation_miss", 0)
+            if hits + misses:
+                self.tracer.set_gauge("speculation_hit_rate", hits / (hits + misses))
+        self.tracer.finish(trace)
+    
+    def _store_turn(self, user_input: str, trace):
+        """把本轮的文本、追踪与音频交给写入线程追加到会话存储"""
+        user_audio = self._user_audio.pop(trace.turn_id, b"")
+        if self.session_store is None:
+            return
+        turn = self._current_turn
+        record = {
+            "time": trace.wall_time,
+            "user": user_input or "",
+            "assistant": turn.assistant if turn is not None else None,
+            # 只有写入了对话历史的轮次在恢复时重新加入历史；清空历史之前的轮次不再恢复
+            "history": turn is not None,
+            "cleared": trace.attributes.get("intent") == "clear_history",
+            "summary": self.history.summary,
+            # 摘要在后台折叠，记录当前窗口与尚未折叠进摘要的轮数，恢复时一并读回
+            "window": len(self.history.turns),
+            "pending": len(self.history.pending),
+            "trace": trace.to_dict(),
+        }
+        reply_audio = b"".join(self._reply_audio) if self._reply_audio else b""
+        self._reply_audio = None
+        self._store_write = asyncio.get_event_loop().run_in_executor(
+            self.store_executor, self._append_turn, record, user_audio, reply_audio
+        )
+    
+    def _append_turn(self, record: dict, user_audio: bytes, reply_audio: bytes):
+        try:
+            self.session_store.append_turn(record, user_audio, reply_audio)
+        except OSError as e:
+            log(f"⚠️ 写入会话存储失败: {e}")
+    
+    async def close_session_store(self):
+        """等待已提交的写入完成后关闭会话存储"""
+        if self.session_store is None:
+            return
+        if self._store_write is not None:
+            await asyncio.gather(self._store_write, return_exceptions=True)
+            self._store_write = None
+        self.store_executor.shutdown(wait=False)
+        self.session_store.close()
+    
+    async def run_conversation(self):
+        """运行对话流水线，直到用户要求退出或任务被取消（不负责打开与关闭共享资源）"""
+        audio_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        text_queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self.capture_allowed.set()
+        self.recognition_done.set()
+        
+        stages = [
+            asyncio.ensure_future(self._capture_stage(audio_queue)),
+            asyncio.ensure_future(self._recognition_stage(audio_queue, text_queue)),
+            asyncio.ensure_future(self._response_stage(text_queue)),
+        ]
+        if self.speculative:
+            stages.append(asyncio.ensure_future(self._speculation_stage()))
+        
+        try:
+            done, _ = await asyncio.wait(stages, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            self.audio_manager.cancel_recording()
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            pending = list(self._speculations.values())
+            if self._speculation is not None:
+                pending.append(self._speculation)
+            self._speculation = None
+            self._speculations.clear()
+            for speculation in pending:
+                await speculation.cancel()
+            self.capture_executor.shutdown(wait=False)
+    
+    async def start_conversation(self):
+        """启动本地麦克风对话循环"""
+        loop = asyncio.get_event_loop()
+        
+        if self.mock_server is not None:
+            self.base_url = await self.mock_server.start()
+        
+        # 其余预热在后台并行进行，采集设备就绪即可开始对话
+        warm_up = asyncio.ensure_future(self._warm_up())
+        await loop.run_in_executor(self.capture_executor, self._open_audio)
+        startup_timer.mark("采集就绪")
+        
+        print("🎯 开始语音对话...")
+        
+        try:
+            await self.run_conversation()
+        finally:
+            warm_up.cancel()
+            self.asr_executor.shutdown(wait=False)
+            if self.asr_pool is not None:
+                self.asr_pool.close()
+            self.audio_manager.close()
+            await self.close_session_store()
+            if self._keepalive is not None:
+                self._keepalive.cancel()
+            if self.http_pool is not None:
+                await self.http_pool.close()
+            if self.mock_server is not None:
+                await self.mock_server.close()
@@ -0,0 +1,131 @@
+"""
+语义端点判定模块
+结合短暂停顿与当前识别文本判断用户是否已说完：完整的句子在短静音后即结束本轮，
+不完整的句子仍等待完整的 SILENCE_DURATION
+"""
+
+import json
+import math
+import re
+
+from config import (
+    SILENCE_DURATION, ENDPOINT_AGGRESSIVENESS, ENDPOINT_MIN_SILENCE, ENDPOINT_WEIGHTS_FILE, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 句末标点
+TERMINAL_PUNCTUATION = "。！？!?.…"
+# 停顿在这些标点上通常意味着还有下文
+CONTINUATION_PUNCTUATION = "，、,;；:：-—"
+# 句末语气词（疑问或陈述的收尾）
+FINAL_PARTICLES = ("吗", "呢", "吧", "嘛", "么", "啊", "呀", "哦", "啦", "了", "没有")
+# 疑问词：出现在句中时整句多为完整的提问
+QUESTION_WORDS = re.compile(
+    r"什么|怎么|为什么|为何|哪|谁|几|多少|多久|是否|能不能|可不可以|有没有|\b(what|how|why|when|where|who|which|can|could|is|are|do|does)\b",
+    re.IGNORECASE,
+)
+# 以这些词结尾时句子大多尚未说完（连词、介词、结构助词、填充词）
+INCOMPLETE_ENDINGS = (
+    "然后", "但是", "可是", "所以", "因为", "而且", "还有", "就是", "那个", "这个", "如果", "或者", "以及",
+    "和", "跟", "与", "的", "地", "得", "在", "把", "被", "给", "对", "从", "向", "比", "是", "想",
+    "嗯", "呃", "额", "那", "我",
+)
+INCOMPLETE_WORDS = re.compile(
+    r"\b(and|but|so|because|or|the|a|an|to|of|with|for|if|when|that|um|uh|like|my|is|are)$",
+    re.IGNORECASE,
+)
+# 独立成句的简短应答
+ACKNOWLEDGEMENTS = {"好", "好的", "对", "对的", "是", "是的", "行", "可以", "不用", "没有", "谢谢", "知道了",
+                    "ok", "okay", "yes", "no", "yeah", "thanks", "thank you"}
+
+FEATURES = (
+    "terminal_punctuation", "continuation_punctuation", "final_particle", "question_word",
+    "incomplete_ending", "acknowledgement", "length",
+)
+# 逻辑回归分类器的默认权重（可用 benchmarks/endpoint_eval.py --fit 在标注数据上重新拟合）
+DEFAULT_WEIGHTS = {
+    "bias": -1.0,
+    "terminal_punctuation": 3.0,
+    "continuation_punctuation": -3.0,
+    "final_particle": 2.5,
+    "question_word": 1.0,
+    "incomplete_ending": -3.5,
+    "acknowledgement": 3.0,
+    "length": 1.0,
+}
+# 计算长度特征时的饱和长度（字符）
+LENGTH_SATURATION = 20
+
+def extract_features(text: str) -> dict:
+    """提取识别文本的端点特征（取值 0~1）"""
+    text = (text or "").strip()
+    stripped = text.rstrip(TERMINAL_PUNCTUATION + CONTINUATION_PUNCTUATION + " ")
+    lowered = stripped.lower()
+    acknowledgement = lowered in ACKNOWLEDGEMENTS
+    incomplete = not acknowledgement and (lowered.endswith(INCOMPLETE_ENDINGS) or bool(INCOMPLETE_WORDS.search(lowered)))
+    return {
+        "terminal_punctuation": float(bool(text) and text[-1] in TERMINAL_PUNCTUATION),
+        "continuation_punctuation": float(bool(text) and text[-1] in CONTINUATION_PUNCTUATION),
+        "final_particle": float(lowered.endswith(FINAL_PARTICLES)),
+        "question_word": float(bool(QUESTION_WORDS.search(stripped))),
+        "incomplete_ending": float(incomplete),
+        "acknowledgement": float(acknowledgement),
+        "length": min(len(stripped), LENGTH_SATURATION) / LENGTH_SATURATION,
+    }
+
+def load_weights(path: str) -> dict:
+    """读取拟合得到的权重（JSON），缺失的项使用默认值"""
+    weights = dict(DEFAULT_WEIGHTS)
+    with open(path, encoding="utf-8") as f:
+        weights.update(json.load(f))
+    return weights
+
+class EndpointDecider:
+    """语义端点判定器
+
+    小型逻辑回归分类器根据句末标点、语气词、疑问词、未完结的结尾词等特征估计
+    “已说完”的概率；概率达到阈值时只需 ENDPOINT_MIN_SILENCE 的静音即结束本轮。
+    aggressiveness（0~1）越大阈值越低、提前结束越积极，0 表示始终等待完整的 SILENCE_DURATION。
+    """
+
+    def __init__(self, aggressiveness: float = ENDPOINT_AGGRESSIVENESS,
+                 min_silence: float = ENDPOINT_MIN_SILENCE, max_silence: float = SILENCE_DURATION,
+                 weights: dict = None):
+        self.aggressiveness = min(max(aggressiveness, 0.0), 1.0)
+        self.min_silence = min(min_silence, max_silence)
+        self.max_silence = max_silence
+        if weights is None:
+            weights = load_weights(ENDPOINT_WEIGHTS_FILE) if ENDPOINT_WEIGHTS_FILE else DEFAULT_WEIGHTS
+        self.weights = weights
+        self._last = (None, max_silence)  # 最近一次判定的 (文本, 静音时长)
+
+    @property
+    def threshold(self) -> float:
+        """判定为已说完所需的概率"""
+        return 0.95 - 0.45 * self.aggressiveness
+
+    def completeness(self, text: str) -> float:
+        """估计文本为完整语句的概率"""
+        if not text or not text.strip():
+            return 0.0
+        features = extract_features(text)
+        z = self.weights.get("bias", 0.0) + sum(
+            self.weights.get(name, 0.0) * value for name, value in features.items()
+        )
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def required_silence(self, text: str) -> float:
+        """当前识别文本对应的端点静音时长（秒）；每帧调用，按文本缓存结果"""
+        if text == self._last[0]:
+            return self._last[1]
+        silence = self.max_silence
+        if text and self.aggressiveness > 0:
+            probability = self.completeness(text)
+            if probability >= self.threshold:
+                silence = self.min_silence
+                log(f"✂️ 语义端点: “{text}” 已说完（{probability:.2f}），静音 {silence} 秒即结束")
+        self._last = (text, silence)
+        return silence
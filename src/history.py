@@ -0,0 +1,202 @@
+"""
+对话历史模块
+按 token 预算保留最近的完整对话轮次，超出预算的旧轮次在后台折叠为滚动摘要
+"""
+
+import asyncio
+import math
+import re
+from collections import deque
+
+from config import (
+    HISTORY_TOKEN_BUDGET, HISTORY_MIN_TURNS, HISTORY_SUMMARY_MAX_TOKENS, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 中日韩字符约一字一 token；其余连续文本约四个字符一 token
+CJK_PATTERN = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+# 每条消息的角色与格式开销
+MESSAGE_OVERHEAD = 4
+
+def estimate_tokens(text: str) -> int:
+    """本地估算文本的 token 数（不依赖具体模型的分词器）"""
+    if not text:
+        return 0
+    cjk = len(CJK_PATTERN.findall(text))
+    rest = len(CJK_PATTERN.sub("", text).strip())
+    return cjk + math.ceil(rest / 4)
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """从开头截断文本，使估算 token 数不超过 budget（保留最新的内容）"""
+    while text and estimate_tokens(text) > budget:
+        # 按超出比例一次截掉一段，避免逐字循环
+        excess = estimate_tokens(text) - budget
+        text = text[max(1, len(text) * excess // max(estimate_tokens(text), 1)):]
+    return text
+
+class Turn:
+    """一轮对话：用户输入与对应的回复，始终作为整体保留或淘汰"""
+
+    __slots__ = ("user", "assistant", "tokens")
+
+    def __init__(self, user: str):
+        self.user = user
+        self.assistant = None
+        self.tokens = estimate_tokens(user) + MESSAGE_OVERHEAD
+
+    def set_reply(self, assistant: str):
+        self.assistant = assistant
+        self.tokens += estimate_tokens(assistant) + MESSAGE_OVERHEAD
+
+    def messages(self) -> list:
+        messages = [{"role": "user", "content": self.user}]
+        if self.assistant is not None:
+            messages.append({"role": "assistant", "content": self.assistant})
+        return messages
+
+class ConversationHistory:
+    """按 token 预算管理的对话历史
+
+    最近的轮次保存在 deque 中，总 token 数超过 HISTORY_TOKEN_BUDGET 时从最旧的一端整轮淘汰
+    （用户输入与回复不会被拆开），被淘汰的轮次交给后台任务与已有摘要合并。
+    摘要本身限制在 HISTORY_SUMMARY_MAX_TOKENS 以内，因此提示长度在长时间会话中保持有界。
+    """
+
+    def __init__(self, system_prompt: str, summarizer=None,
+                 token_budget: int = HISTORY_TOKEN_BUDGET,
+                 summary_budget: int = HISTORY_SUMMARY_MAX_TOKENS,
+                 min_turns: int = HISTORY_MIN_TURNS):
+        self.system_prompt = system_prompt
+        # summarizer(summary, turns) -> 新摘要，async；未提供或失败时使用截断的文本摘要
+        self.summarizer = summarizer
+        self.token_budget = token_budget
+        self.summary_budget = summary_budget
+        self.min_turns = min_turns
+
+        self.turns = deque()
+        self.tokens = 0
+        self.summary = ""
+        self.evicted = []  # 等待折叠进摘要的轮次
+        self._folding = []  # 正在折叠的轮次
+        self._summary_task = None
+
+    def add_user(self, text: str) -> Turn:
+        """开始新一轮对话"""
+        turn = Turn(text)
+        self.turns.append(turn)
+        self.tokens += turn.tokens
+        self._enforce_budget()
+        return turn
+
+    def add_assistant(self, text: str):
+        """记录当前轮次的回复"""
+        if not self.turns or self.turns[-1].assistant is not None:
+            return
+        turn = self.turns[-1]
+        self.tokens -= turn.tokens
+        turn.set_reply(text)
+        self.tokens += turn.tokens
+        self._enforce_budget()
+
+    def clear(self):
+        """清空历史与摘要"""
+        if self._summary_task is not None:
+            self._summary_task.cancel()
+            self._summary_task = None
+        self.turns.clear()
+        self.tokens = 0
+        self.summary = ""
+        self.evicted = []
+        self._folding = []
+
+    @property
+    def pending(self) -> list:
+        """已淘汰但尚未折叠进摘要的轮次（从旧到新）"""
+        return self._folding + self.evicted
+
+    def restore(self, summary: str, turns: list, pending: list = ()):
+        """恢复持久化的摘要、尚未折叠的轮次与最近的对话，均为 [(用户, 回复)]
+
+        调用方保证 turns 在预算内；pending 在下一轮对话开始时于后台折叠进摘要。
+        """
+        self.clear()
+        self.summary = summary
+        for user, assistant in turns:
+            turn = self._make_turn(user, assistant)
+            self.turns.append(turn)
+            self.tokens += turn.tokens
+        self.evicted = [self._make_turn(user, assistant) for user, assistant in pending]
+
+    @staticmethod
+    def _make_turn(user: str, assistant: str) -> Turn:
+        turn = Turn(user)
+        if assistant is not None:
+            turn.set_reply(assistant)
+        return turn
+
+    def messages(self) -> list:
+        """组装发送给模型的消息列表"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"此前对话的摘要：{self.summary}"})
+        for turn in self.turns:
+            messages.extend(turn.messages())
+        return messages
+
+    def prompt_tokens(self) -> int:
+        """当前提示的估算 token 数"""
+        return (estimate_tokens(self.system_prompt) + estimate_tokens(self.summary)
+                + self.tokens + MESSAGE_OVERHEAD * 2)
+
+    def _enforce_budget(self):
+        """整轮淘汰最旧的对话，直到满足预算（至少保留 min_turns 轮）"""
+        while self.tokens > self.token_budget and len(self.turns) > self.min_turns:
+            turn = self.turns.popleft()
+            self.tokens -= turn.tokens
+            self.evicted.append(turn)
+
+        if self.evicted:
+            self._schedule_summary()
+
+    def _schedule_summary(self):
+        """在后台折叠被淘汰的轮次，不阻塞当前回复"""
+        if self._summary_task is not None and not self._summary_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环（同步调用场景），直接使用文本摘要
+            summary = self._fallback_summary(self.summary, self.evicted)
+            self.summary = truncate_to_tokens(summary, self.summary_budget)
+            self.evicted = []
+            return
+        self._summary_task = loop.create_task(self._fold())
+
+    async def _fold(self):
+        while self.evicted:
+            turns, self.evicted = self.evicted, []
+            self._folding = turns
+            summary = None
+            if self.summarizer is not None:
+                try:
+                    summary = await self.summarizer(self.summary, turns)
+                except Exception as e:
+                    log(f"⚠️ 生成对话摘要失败: {e}")
+            if not summary:
+                summary = self._fallback_summary(self.summary, turns)
+            self.summary = truncate_to_tokens(summary.strip(), self.summary_budget)
+            self._folding = []
+            log(f"📝 已折叠 {len(turns)} 轮对话，摘要约 {estimate_tokens(self.summary)} tokens")
+
+    @staticmethod
+    def _fallback_summary(summary: str, turns: list) -> str:
+        """无摘要模型时的退化摘要：拼接旧轮次，超出预算时丢弃最旧的内容"""
+        lines = [summary] if summary else []
+        for turn in turns:
+            lines.append(f"用户：{turn.user}")
+            if turn.assistant:
+                lines.append(f"助手：{turn.assistant}")
+        return " ".join(lines)
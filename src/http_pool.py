@@ -0,0 +1,132 @@
+"""
+LLM HTTP 连接池模块
+为 LLM 请求提供共享的、可复用连接的 httpx 异步客户端（可用时启用 HTTP/2），
+在用户说话期间预连接与保活，使连接建立不计入回复延迟，并统计连接复用情况
+"""
+
+import asyncio
+import importlib.util
+import time
+
+from config import (
+    LLM_HTTP2, LLM_MAX_CONNECTIONS, LLM_KEEPALIVE_EXPIRY, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+    LLM_PRECONNECT_ON_SPEECH, LLM_KEEPALIVE_PING_INTERVAL, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 说话状态的轮询间隔（秒）
+SPEECH_POLL_INTERVAL = 0.05
+
+class LLMConnectionPool:
+    """LLM 请求的共享连接池
+
+    通过 httpcore 的 trace 扩展统计每个请求是否新建了连接，以及 TCP/TLS 握手耗时。
+    """
+
+    def __init__(self, base_url: str, api_key: str = None, http2: bool = LLM_HTTP2,
+                 max_connections: int = LLM_MAX_CONNECTIONS,
+                 keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY):
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+
+        # HTTP/2 需要 h2 包，未安装时使用 HTTP/1.1 keep-alive
+        self.http2 = http2 and importlib.util.find_spec("h2") is not None
+        if http2 and not self.http2:
+            log("⚠️ 未安装 h2，LLM 连接池使用 HTTP/1.1。")
+
+        self.client = httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            event_hooks={"request": [self._on_request], "response": [self._on_response]},
+        )
+
+        self.requests = 0
+        self.new_connections = 0
+        self.tls_handshakes = 0
+        self.http2_responses = 0
+        self.pings = 0
+        self.connect_time = 0.0
+        self.last_activity = 0.0
+        self._connect_started = {}  # 任务 -> 建立连接的开始时间
+
+    async def _on_request(self, request):
+        request.extensions["trace"] = self._trace
+        self.last_activity = time.monotonic()
+
+    async def _on_response(self, response):
+        self.last_activity = time.monotonic()
+        if response.extensions.get("http_version") == b"HTTP/2":
+            self.http2_responses += 1
+
+    async def _trace(self, event_name: str, info: dict):
+        """httpcore trace 回调：区分新建连接与复用连接"""
+        task = asyncio.current_task()
+        if event_name == "connection.connect_tcp.started":
+            self._connect_started[task] = time.perf_counter()
+        elif event_name == "connection.connect_tcp.complete":
+            self.new_connections += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+        elif event_name.endswith("send_request_headers.started"):
+            self.requests += 1
+            started = self._connect_started.pop(task, None)
+            if started is not None:
+                self.connect_time += time.perf_counter() - started
+
+    async def ping(self, timeout: float = LLM_CONNECT_TIMEOUT):
+        """发送轻量请求，建立或保持到 LLM 服务端的连接（忽略响应状态）"""
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else None
+        try:
+            response = await self.client.get(f"{self.base_url}/models", headers=headers, timeout=timeout)
+            await response.aclose()
+            self.pings += 1
+        except Exception as e:
+            log(f"⚠️ LLM 连接预热失败: {e}")
+
+    async def run_keepalive(self, is_speaking):
+        """后台任务：用户开始说话时预连接，说话期间定期保活
+
+        is_speaking 为无参数的可调用对象。流式回复在收到 [DONE] 后即关闭响应，
+        连接常因未读到分块结束标记而被丢弃，因此每段语音开始时都发出一次预连接请求
+        （有空闲连接时只是一次复用连接的轻量往返），使 TCP/TLS 握手与用户说话重叠。
+        """
+        speaking = False
+        while True:
+            await asyncio.sleep(SPEECH_POLL_INTERVAL)
+            now_speaking = is_speaking()
+            idle = time.monotonic() - self.last_activity
+
+            if now_speaking and not speaking:
+                if LLM_PRECONNECT_ON_SPEECH:
+                    log("🔌 检测到语音，预连接 LLM 服务...")
+                    await self.ping()
+            elif now_speaking and LLM_KEEPALIVE_PING_INTERVAL and idle >= LLM_KEEPALIVE_PING_INTERVAL:
+                await self.ping()
+
+            speaking = now_speaking
+
+    async def close(self):
+        await self.client.aclose()
+
+    def stats(self) -> dict:
+        """连接复用统计"""
+        return {
+            "requests": self.requests,
+            "new_connections": self.new_connections,
+            "reused": max(self.requests - self.new_connections, 0),
+            "reuse_rate": 1 - self.new_connections / self.requests if self.requests else 0.0,
+            "tls_handshakes": self.tls_handshakes,
+            "http2_responses": self.http2_responses,
+            "pings": self.pings,
+            "connect_seconds": round(self.connect_time, 6),
+        }
@@ -0,0 +1,94 @@
+"""
+本地意图路由模块
+在请求 LLM 之前匹配控制命令（退出、停止、重复、音量、清空历史），命中时本地处理
+"""
+
+from collections import namedtuple
+
+from .text_utils import normalize_query
+from config import (
+    INTENT_COMMANDS, INTENT_FUZZY_THRESHOLD, INTENT_FUZZY_MIN_LENGTH, INTENT_FUZZY_EXCLUDE,
+    INTENT_MAX_LENGTH, INTENT_PREFIX_MAX_EXTRA, INTENT_PREFIX_PARTICLES, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 匹配结果：意图名称、命中的命令短语、匹配方式（exact / prefix / fuzzy）与得分
+IntentMatch = namedtuple("IntentMatch", ["intent", "phrase", "method", "score"])
+
+class IntentRouter:
+    """本地命令匹配器
+
+    命令表在构造时规范化并编入索引：精确匹配为一次字典查找；前缀匹配按首字符分桶，
+    只对两个字符以上的命令进行，且命令后只允许跟少量 INTENT_PREFIX_PARTICLES 中的语气词
+    （“退出吧”命中，“停电了”“结束了吗”不命中）；模糊匹配只对不超过 INTENT_MAX_LENGTH 的短句进行，
+    只比较不短于 INTENT_FUZZY_MIN_LENGTH 且不属于 INTENT_FUZZY_EXCLUDE 的命令，得分须高于阈值，
+    输入中原样包含命令时不再模糊匹配（额外字符已由前缀规则判定），避免“结束后”“停止了”“说再见”被误判为命令。
+    """
+
+    def __init__(self, commands: dict = INTENT_COMMANDS, fuzzy_threshold: int = INTENT_FUZZY_THRESHOLD,
+                 max_length: int = INTENT_MAX_LENGTH, prefix_max_extra: int = INTENT_PREFIX_MAX_EXTRA,
+                 prefix_particles: str = INTENT_PREFIX_PARTICLES,
+                 fuzzy_min_length: int = INTENT_FUZZY_MIN_LENGTH, fuzzy_exclude=INTENT_FUZZY_EXCLUDE):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_length = max_length
+        self.prefix_max_extra = prefix_max_extra
+        self.prefix_particles = set(prefix_particles)
+
+        self.exact = {}      # 规范化短语 -> 意图
+        self.prefixes = {}   # 首字符 -> [(短语, 意图)]，按短语长度降序（只收录两个字符以上的短语）
+        self.fuzzy = []      # 参与模糊匹配的 (短语, 意图)
+        for intent, phrases in commands.items():
+            for phrase in phrases:
+                key = normalize_query(phrase)
+                if not key:
+                    continue
+                self.exact.setdefault(key, intent)
+                if len(key) >= 2:
+                    self.prefixes.setdefault(key[0], []).append((key, intent))
+                if len(key) >= fuzzy_min_length and intent not in fuzzy_exclude:
+                    self.fuzzy.append((key, intent))
+        for bucket in self.prefixes.values():
+            bucket.sort(key=lambda item: len(item[0]), reverse=True)
+
+    def match(self, text: str) -> IntentMatch:
+        """匹配用户输入，未命中任何命令时返回 None"""
+        query = normalize_query(text or "")
+        if not query or len(query) > self.max_length:
+            return None
+
+        intent = self.exact.get(query)
+        if intent is not None:
+            return IntentMatch(intent, query, "exact", 100)
+
+        for phrase, intent in self.prefixes.get(query[0], ()):
+            extra = query[len(phrase):]
+            if (query.startswith(phrase) and len(extra) <= self.prefix_max_extra
+                    and all(char in self.prefix_particles for char in extra)):
+                return IntentMatch(intent, phrase, "prefix", 100)
+
+        return self._fuzzy_match(query)
+
+    def _fuzzy_match(self, query: str) -> IntentMatch:
+        if not self.fuzzy_threshold:
+            return None
+        from fuzzywuzzy import fuzz
+
+        best = None
+        for phrase, intent in self.fuzzy:
+            # 原样包含命令的输入已由前缀规则判定（如“停止了”“说再见”），不再模糊匹配
+            if phrase in query:
+                continue
+            # ratio 不可能超过 2·min(len)/(len 之和)
+            a, b = len(query), len(phrase)
+            if 200 * min(a, b) <= self.fuzzy_threshold * (a + b):
+                continue
+            score = fuzz.ratio(query, phrase)
+            if score > self.fuzzy_threshold and (best is None or score > best.score):
+                best = IntentMatch(intent, phrase, "fuzzy", score)
+
+        if best is not None:
+            log(f"🧭 模糊匹配命令: {query} ≈ {best.phrase} ({best.score})")
+        return best
@@ -0,0 +1,180 @@
+"""
+延迟追踪模块
+记录每轮对话各阶段的单调时间戳，导出 JSON Lines 追踪与 Prometheus 文本格式指标
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+from config import TRACE_FILE, METRICS_FILE, TRACE_HISTOGRAM_WINDOW, VERBOSE
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 一轮对话中的事件（按发生顺序）
+TURN_EVENTS = (
+    "speech_onset",      # 检测到语音
+    "endpoint",          # 端点检测判定语音结束
+    "asr_done",          # 识别完成
+    "llm_first_token",   # LLM 首个 token
+    "llm_done",          # LLM 回复结束
+    "tts_first_byte",    # TTS 首个音频数据块
+    "playback_start",    # 开始播放
+    "playback_end",      # 播放结束
+    "interrupted",       # 播放被打断
+)
+
+# 由事件推导的阶段耗时：(名称, 起始事件, 结束事件)
+TURN_STAGES = (
+    ("utterance", "speech_onset", "endpoint"),
+    ("asr", "endpoint", "asr_done"),
+    ("llm_first_token", "asr_done", "llm_first_token"),
+    ("llm_total", "asr_done", "llm_done"),
+    ("tts_first_byte", "llm_first_token", "tts_first_byte"),
+    ("first_audio", "endpoint", "playback_start"),
+    ("playback", "playback_start", "playback_end"),
+)
+
+# 直方图桶上界（秒）
+HISTOGRAM_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0)
+
+class TurnTrace:
+    """一轮对话的追踪记录"""
+
+    def __init__(self, turn_id: int):
+        self.turn_id = turn_id
+        self.wall_time = time.time()
+        self.events = {}
+        self.attributes = {}
+
+    def mark(self, event: str, timestamp: float = None):
+        """记录事件时间（time.monotonic），同一事件只记录首次"""
+        if event not in self.events:
+            self.events[event] = timestamp if timestamp is not None else time.monotonic()
+
+    def set(self, **attributes):
+        """附加属性（文本长度、是否命中缓存等）"""
+        self.attributes.update(attributes)
+
+    def stages(self) -> dict:
+        """各阶段耗时（秒），缺少事件的阶段省略"""
+        return {
+            name: self.events[end] - self.events[start]
+            for name, start, end in TURN_STAGES
+            if start in self.events and end in self.events
+        }
+
+    def to_dict(self) -> dict:
+        origin = min(self.events.values()) if self.events else 0.0
+        return {
+            "turn": self.turn_id,
+            "time": self.wall_time,
+            "events": {
+                name: round(self.events[name] - origin, 6)
+                for name in TURN_EVENTS if name in self.events
+            },
+            "stages": {name: round(value, 6) for name, value in self.stages().items()},
+            **self.attributes,
+        }
+
+class LatencyTracer:
+    """延迟追踪器：写入每轮追踪并维护滚动直方图与计数器"""
+
+    def __init__(self, trace_file: str = TRACE_FILE, metrics_file: str = METRICS_FILE,
+                 window: int = TRACE_HISTOGRAM_WINDOW):
+        self.trace_file = trace_file
+        self.metrics_file = metrics_file
+        self.window = window
+
+        self.turn_count = 0
+        self.samples = {name: deque(maxlen=window) for name, _, _ in TURN_STAGES}
+        self.counters = {}
+        self.gauges = {}
+        self._lock = threading.Lock()
+
+        for path in (trace_file, metrics_file):
+            if path and os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def new_turn(self) -> TurnTrace:
+        """开始一轮新的追踪"""
+        with self._lock:
+            self.turn_count += 1
+            return TurnTrace(self.turn_count)
+
+    def increment(self, name: str, value: float = 1):
+        """累加计数器"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float):
+        """设置瞬时值指标"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def finish(self, trace: TurnTrace):
+        """结束一轮追踪：写入 JSON Lines 并更新指标"""
+        record = trace.to_dict()
+        with self._lock:
+            for name, value in trace.stages().items():
+                self.samples[name].append(value)
+
+        if self.trace_file:
+            try:
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            except OSError as e:
+                log(f"⚠️ 写入延迟追踪失败: {e}")
+
+        if self.metrics_file:
+            self.write_metrics()
+
+        log(f"⏱️ 第 {trace.turn_id} 轮: " + ", ".join(
+            f"{name}={value * 1000:.0f}ms" for name, value in trace.stages().items()
+        ))
+
+    def prometheus_text(self) -> str:
+        """生成 Prometheus 文本格式的指标"""
+        lines = [
+            "# HELP voice_turn_stage_seconds Per-turn stage latency over the last "
+            f"{self.window} turns.",
+            "# TYPE voice_turn_stage_seconds histogram",
+        ]
+        with self._lock:
+            for name, values in self.samples.items():
+                values = list(values)
+                for bound in HISTOGRAM_BUCKETS:
+                    count = sum(1 for v in values if v <= bound)
+                    lines.append(f'voice_turn_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+                lines.append(f'voice_turn_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {len(values)}')
+                lines.append(f'voice_turn_stage_seconds_sum{{stage="{name}"}} {sum(values):.6f}')
+                lines.append(f'voice_turn_stage_seconds_count{{stage="{name}"}} {len(values)}')
+
+            lines.append("# TYPE voice_turns_total counter")
+            lines.append(f"voice_turns_total {self.turn_count}")
+
+            if self.counters:
+                lines.append("# TYPE voice_events_total counter")
+                for name, value in sorted(self.counters.items()):
+                    lines.append(f'voice_events_total{{name="{name}"}} {value}')
+
+            if self.gauges:
+                lines.append("# TYPE voice_gauge gauge")
+                for name, value in sorted(self.gauges.items()):
+                    lines.append(f'voice_gauge{{name="{name}"}} {value}')
+
+        return "\n".join(lines) + "\n"
+
+    def write_metrics(self):
+        """原子地写出指标文件"""
+        temp_path = self.metrics_file + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            os.replace(temp_path, self.metrics_file)
+        except OSError as e:
+            log(f"⚠️ 写入指标失败: {e}")
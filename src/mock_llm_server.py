@@ -0,0 +1,272 @@
+"""
+本地 LLM 替身服务
+基于 asyncio 的 OpenAI 兼容 chat completions 服务，支持 SSE 流式输出、脚本化回复、
+可配置的 token 速率与抖动以及错误注入，用于离线压测与基准测试
+
+用法:
+    python -m src.mock_llm_server --port 8000 --tokens-per-second 30 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import re
+import time
+
+from config import (
+    MODEL_NAME, MOCK_LLM_HOST, MOCK_LLM_PORT, MOCK_LLM_REPLIES,
+    MOCK_LLM_FIRST_TOKEN_LATENCY, MOCK_LLM_TOKENS_PER_SECOND, MOCK_LLM_JITTER,
+    MOCK_LLM_ERROR_RATE, MOCK_LLM_SEED, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 英文单词与数字整体作为一个 token，中文与标点约两个字符一个 token
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9']+\s*|[^\sA-Za-z0-9']{1,2}|\s+")
+
+# 可注入的错误：HTTP 500、HTTP 429、流式输出中途断开
+ERROR_KINDS = ("server_error", "rate_limit", "disconnect")
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests",
+           500: "Internal Server Error"}
+
+def split_tokens(text: str) -> list:
+    """把回复切分为近似的 token 序列"""
+    return TOKEN_PATTERN.findall(text)
+
+class MockChatServer:
+    """OpenAI 兼容的本地替身服务（/v1/chat/completions 与 /v1/models）
+
+    回复按脚本循环使用，脚本中的 "{user}" 会替换为最后一条用户消息。
+    随机数种子固定，相同请求序列产生相同的延迟与错误。
+    """
+
+    def __init__(self, replies: list = None, first_token_latency: float = MOCK_LLM_FIRST_TOKEN_LATENCY,
+                 tokens_per_second: float = MOCK_LLM_TOKENS_PER_SECOND, jitter: float = MOCK_LLM_JITTER,
+                 error_rate: float = MOCK_LLM_ERROR_RATE, seed: int = MOCK_LLM_SEED,
+                 host: str = MOCK_LLM_HOST, port: int = MOCK_LLM_PORT):
+        self.replies = itertools.cycle(replies or MOCK_LLM_REPLIES)
+        self.first_token_latency = first_token_latency
+        self.token_interval = 1.0 / tokens_per_second
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.host = host
+        self.port = port
+
+        self.server = None
+        self.connections = {}  # writer -> 处理该连接的任务
+        self.request_count = 0
+        self.error_count = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> str:
+        """启动服务，返回 base_url（端口为 0 时自动分配）"""
+        self.server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        log(f"✅ LLM 替身服务已启动: {self.base_url}")
+        return self.base_url
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # 关闭空闲的 keep-alive 连接，并等待各连接的处理任务退出
+            tasks = list(self.connections.values())
+            for writer in list(self.connections):
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.server.wait_closed()
+            self.server = None
+
+    def _delay(self, base: float) -> float:
+        return max(0.0, base + self.rng.uniform(-self.jitter, self.jitter) * base)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """处理一个连接上的若干请求（HTTP/1.1 keep-alive）"""
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                if not await self._route(method, path.split("?")[0], body, writer):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.connections.pop(writer, None)
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes, writer: asyncio.StreamWriter) -> bool:
+        """分发请求，返回连接是否可以继续复用"""
+        if method == "GET" and path.endswith("/models"):
+            await self._send_json(writer, 200, {
+                "object": "list",
+                "data": [{"id": MODEL_NAME, "object": "model", "created": 0, "owned_by": "mock"}],
+            })
+            return True
+
+        if method != "POST" or not path.endswith("/chat/completions"):
+            await self._send_error(writer, 404, "not_found", f"{method} {path}")
+            return True
+
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            await self._send_error(writer, 400, "invalid_request_error", "invalid JSON body")
+            return True
+
+        self.request_count += 1
+        error = None
+        if self.rng.random() < self.error_rate:
+            error = self.rng.choice(ERROR_KINDS)
+            self.error_count += 1
+            log(f"💥 注入错误: {error}")
+
+        if error == "server_error":
+            await self._send_error(writer, 500, "server_error", "injected server error")
+            return True
+        if error == "rate_limit":
+            await self._send_error(writer, 429, "rate_limit_exceeded", "injected rate limit")
+            return True
+
+        reply = self._next_reply(request.get("messages", []))
+        model = request.get("model", MODEL_NAME)
+        if request.get("stream"):
+            return await self._stream_reply(writer, model, reply, disconnect=error == "disconnect")
+
+        tokens = split_tokens(reply)
+        await asyncio.sleep(self._delay(self.first_token_latency)
+                            + sum(self._delay(self.token_interval) for _ in tokens[1:]))
+        await self._send_json(writer, 200, {
+            "id": f"chatcmpl-mock-{self.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        })
+        return True
+
+    def _next_reply(self, messages: list) -> str:
+        user_text = next(
+            (m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        return next(self.replies).replace("{user}", str(user_text))
+
+    async def _stream_reply(self, writer: asyncio.StreamWriter, model: str, reply: str,
+                            disconnect: bool = False) -> bool:
+        """以 SSE 逐 token 输出回复（分块传输编码，保持连接可复用）"""
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Transfer-Encoding: chunked\r\n\r\n"
+        )
+
+        tokens = split_tokens(reply)
+        # 注入断开时在回复中途关闭连接
+        cut = self.rng.randint(0, len(tokens)) if disconnect else None
+        completion_id = f"chatcmpl-mock-{self.request_count}"
+        created = int(time.time())
+
+        def event(delta: dict, finish_reason=None) -> bytes:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8")
+
+        await asyncio.sleep(self._delay(self.first_token_latency))
+        for i, token in enumerate(tokens):
+            if i == cut:
+                return False
+            if i:
+                await asyncio.sleep(self._delay(self.token_interval))
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            self._write_chunk(writer, event(delta))
+            await writer.drain()
+
+        self._write_chunk(writer, event({}, "stop"))
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        self._write_chunk(writer, b"")
+        await writer.drain()
+        return True
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes):
+        writer.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def _send_error(self, writer: asyncio.StreamWriter, status: int, code: str, message: str):
+        await self._send_json(writer, status, {
+            "error": {"message": message, "type": code, "code": code}
+        })
+
+async def serve(server: MockChatServer):
+    await server.start()
+    print(f"🎯 LLM 替身服务: {server.base_url}（Ctrl+C 退出）")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI 兼容的本地 LLM 替身服务")
+    parser.add_argument("--host", default=MOCK_LLM_HOST)
+    parser.add_argument("--port", type=int, default=MOCK_LLM_PORT or 8000)
+    parser.add_argument("--reply", action="append", help="脚本化回复（可多次指定，循环使用）")
+    parser.add_argument("--first-token", type=float, default=MOCK_LLM_FIRST_TOKEN_LATENCY, help="首 token 延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=MOCK_LLM_TOKENS_PER_SECOND)
+    parser.add_argument("--jitter", type=float, default=MOCK_LLM_JITTER, help="延迟抖动比例")
+    parser.add_argument("--error-rate", type=float, default=MOCK_LLM_ERROR_RATE, help="错误注入概率")
+    parser.add_argument("--seed", type=int, default=MOCK_LLM_SEED)
+    args = parser.parse_args()
+
+    server = MockChatServer(
+        replies=args.reply, first_token_latency=args.first_token,
+        tokens_per_second=args.tokens_per_second, jitter=args.jitter,
+        error_rate=args.error_rate, seed=args.seed, host=args.host, port=args.port
+    )
+    try:
+        asyncio.run(serve(server))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
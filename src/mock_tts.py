@@ -0,0 +1,38 @@
+"""
+本地 TTS 替身
+不访问网络，按首字节延迟与合成速度定时产出静音 MP3 帧，用于离线压测与基准测试
+"""
+
+import asyncio
+
+from config import MOCK_TTS_FIRST_BYTE_LATENCY, MOCK_TTS_SPEED, MOCK_TTS_SECONDS_PER_CHAR
+
+# MPEG-2 Layer III 静音帧：24 kHz、48 kbps、单声道，每帧 576 个采样（24 ms），与 Edge TTS 输出格式一致
+SILENT_MP3_FRAME = bytes([0xFF, 0xF3, 0x64, 0xC4]) + bytes(140)
+SILENT_MP3_FRAME_DURATION = 576 / 24000
+
+# 缓存键中使用的输出格式，避免替身音频与真实合成结果混用缓存
+MOCK_TTS_OUTPUT_FORMAT = "mock-24khz-48kbitrate-mono-mp3"
+
+class MockTTS:
+    """TTS 替身：音频时长与文本长度成正比，按合成速度逐块产出"""
+
+    def __init__(self, first_byte_latency: float = MOCK_TTS_FIRST_BYTE_LATENCY,
+                 speed: float = MOCK_TTS_SPEED, seconds_per_char: float = MOCK_TTS_SECONDS_PER_CHAR,
+                 frames_per_chunk: int = 4):
+        self.first_byte_latency = first_byte_latency
+        self.speed = speed  # 每秒合成的音频秒数
+        self.seconds_per_char = seconds_per_char
+        self.frames_per_chunk = frames_per_chunk
+
+    async def stream(self, text: str):
+        """逐块产出 MP3 数据"""
+        duration = len(text) * self.seconds_per_char
+        frames = max(1, int(duration / SILENT_MP3_FRAME_DURATION))
+        chunk_duration = self.frames_per_chunk * SILENT_MP3_FRAME_DURATION
+
+        await asyncio.sleep(self.first_byte_latency)
+        for i in range(0, frames, self.frames_per_chunk):
+            if i:
+                await asyncio.sleep(chunk_duration / self.speed)
+            yield SILENT_MP3_FRAME * min(self.frames_per_chunk, frames - i)
@@ -0,0 +1,68 @@
+"""
+重采样模块
+流式多相（polyphase）FIR 重采样器，在采集路径中一次性完成采样率转换
+"""
+
+from math import gcd
+
+import numpy as np
+
+# 每个相位的滤波器抽头数，越大过渡带越窄
+TAPS_PER_PHASE = 32
+# 截止频率相对目标奈奎斯特频率的比例
+CUTOFF = 0.95
+# Kaiser 窗参数
+KAISER_BETA = 8.0
+
+class PolyphaseResampler:
+    """流式多相重采样器，可按任意长度分块输入，输出与一次性处理完全一致"""
+
+    def __init__(self, in_rate: int, out_rate: int, taps_per_phase: int = TAPS_PER_PHASE):
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.taps = taps_per_phase
+
+        # 在上采样率下设计低通原型滤波器
+        length = self.up * self.taps
+        fc = 0.5 / max(self.up, self.down) * CUTOFF
+        k = np.arange(length) - (length - 1) / 2.0
+        h = 2 * fc * np.sinc(2 * fc * k) * np.kaiser(length, KAISER_BETA) * self.up
+
+        # phases[p, t] = h[p + up * t]，每行对应一个输出相位
+        self.phases = np.ascontiguousarray(h.reshape(self.taps, self.up).T, dtype=np.float32)
+        self._tap_offsets = np.arange(self.taps)
+        self.reset()
+
+    def reset(self):
+        """清空内部状态，开始新的数据流"""
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.total_in = 0
+        self.total_out = 0
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """输入一块采样，返回当前可计算出的全部输出采样"""
+        # buf[j] 对应全局输入下标 base + j
+        base = self.total_in - len(self.history)
+        buf = np.concatenate((self.history, block))
+        self.total_in += len(block)
+
+        n_end = (self.total_in * self.up - 1) // self.down + 1
+        n = np.arange(self.total_out, n_end, dtype=np.int64)
+        self.total_out = n_end
+
+        if len(n):
+            m = n * self.down
+            idx = (m // self.up - base)[:, None] - self._tap_offsets[None, :]
+            out = np.einsum("ij,ij->i", self.phases[m % self.up], buf[idx])
+        else:
+            out = np.zeros(0, dtype=np.float32)
+
+        self.history = buf[len(buf) - (self.taps - 1):]
+        return out.astype(np.float32, copy=False)
+
+def resample(audio: np.ndarray, in_rate: int, out_rate: int) -> np.ndarray:
+    """一次性重采样整段音频"""
+    if in_rate == out_rate:
+        return np.asarray(audio, dtype=np.float32)
+    return PolyphaseResampler(in_rate, out_rate).process(np.asarray(audio, dtype=np.float32))
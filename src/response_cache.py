@@ -0,0 +1,135 @@
+"""
+LLM 回复缓存模块
+按 (上下文指纹, 规范化识别文本) 缓存简短问句的完整回复，支持模糊匹配、TTL 与 LRU 淘汰
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+
+from .text_utils import normalize_query
+from config import (
+    RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_QUERY_LENGTH,
+    RESPONSE_CACHE_FUZZY_THRESHOLD, RESPONSE_CACHE_EXCLUDE_PATTERN, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+class ResponseCache:
+    """LLM 回复缓存
+
+    精确匹配为一次字典查找；未命中时在同一上下文指纹下做有界的模糊匹配
+    （先按长度排除不可能达到阈值的条目），用于吸收“你是谁”/“你是谁呀”这类识别差异。
+    询问时间、日期、天气等答案随时间变化的问句（RESPONSE_CACHE_EXCLUDE_PATTERN）不缓存；
+    条目超过 TTL 即失效，总数超过上限时淘汰最久未使用的条目。
+    """
+
+    def __init__(self, ttl: float = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 max_query_length: int = RESPONSE_CACHE_MAX_QUERY_LENGTH,
+                 fuzzy_threshold: int = RESPONSE_CACHE_FUZZY_THRESHOLD,
+                 exclude_pattern: str = RESPONSE_CACHE_EXCLUDE_PATTERN):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_query_length = max_query_length
+        self.fuzzy_threshold = fuzzy_threshold
+        self.exclude = re.compile(exclude_pattern, re.IGNORECASE) if exclude_pattern else None
+
+        self.entries = OrderedDict()  # (指纹, 规范化文本) -> (回复, 过期时间)
+
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+
+    normalize = staticmethod(normalize_query)
+
+    @staticmethod
+    def fingerprint(*parts) -> str:
+        """计算上下文指纹（模型、系统提示、最近对话等）"""
+        content = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+    def make_key(self, text: str, fingerprint: str) -> tuple:
+        """计算缓存键，文本为空、过长（不属于简短问句）或答案随时间变化时返回 None"""
+        query = self.normalize(text)
+        if not query or len(query) > self.max_query_length:
+            return None
+        if self.exclude is not None and self.exclude.search(text):
+            log(f"⏰ 与时间相关的问句不缓存: {text}")
+            return None
+        return (fingerprint, query)
+
+    def get(self, key: tuple) -> str:
+        """查找回复，未命中时返回 None"""
+        if key is None:
+            return None
+        now = time.monotonic()
+
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] > now:
+            self.entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry[0]
+
+        match = self._fuzzy_match(key, now)
+        if match is not None:
+            self.entries.move_to_end(match)
+            self.fuzzy_hits += 1
+            log(f"⚡ 回复缓存模糊命中: {key[1]} ≈ {match[1]}")
+            return self.entries[match][0]
+
+        self.misses += 1
+        return None
+
+    def _fuzzy_match(self, key: tuple, now: float) -> tuple:
+        if not self.fuzzy_threshold:
+            return None
+        from fuzzywuzzy import fuzz
+
+        fingerprint, query = key
+        best, best_score = None, self.fuzzy_threshold - 1
+        for candidate, (_, expires) in self.entries.items():
+            if candidate[0] != fingerprint or expires <= now:
+                continue
+            # ratio 不可能超过 2·min(len)/(len 之和)，据此跳过长度相差过大的条目
+            a, b = len(query), len(candidate[1])
+            if 200 * min(a, b) < self.fuzzy_threshold * (a + b):
+                continue
+            score = fuzz.ratio(query, candidate[1])
+            if score > best_score:
+                best, best_score = candidate, score
+        return best
+
+    def put(self, key: tuple, response: str):
+        """写入完整回复"""
+        if key is None or not response:
+            return
+        self.entries[key] = (response, time.monotonic() + self.ttl)
+        self.entries.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        """先清除过期条目，仍超出上限时按 LRU 淘汰"""
+        now = time.monotonic()
+        if len(self.entries) > self.max_entries:
+            for key in [k for k, (_, expires) in self.entries.items() if expires <= now]:
+                del self.entries[key]
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> dict:
+        """命中统计"""
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.fuzzy_hits) / lookups if lookups else 0.0,
+            "entries": len(self.entries),
+        }
@@ -0,0 +1,58 @@
+"""
+环形缓冲区模块
+固定容量的采样缓冲区，按全局采样位置切取连续视图
+"""
+
+import numpy as np
+
+class RingBuffer:
+    """镜像环形缓冲区
+
+    每个采样在底层数组中写入两次（位置 i 与 i + capacity），
+    因此任意长度不超过容量的窗口都能以连续视图返回，无需拼接复制。
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        self.capacity = capacity
+        self.data = np.zeros(2 * capacity, dtype=dtype)
+        self.total = 0  # 累计写入的采样数（全局写入位置）
+
+    @property
+    def oldest(self) -> int:
+        """缓冲区中仍保留的最早采样的全局位置"""
+        return max(0, self.total - self.capacity)
+
+    def write(self, block: np.ndarray):
+        """写入一块采样"""
+        n = len(block)
+        if n > self.capacity:
+            self.total += n - self.capacity
+            block = block[-self.capacity:]
+            n = self.capacity
+
+        pos = self.total % self.capacity
+        first = min(n, self.capacity - pos)
+        self.data[pos:pos + first] = block[:first]
+        self.data[pos + self.capacity:pos + self.capacity + first] = block[:first]
+
+        rest = n - first
+        if rest:
+            self.data[:rest] = block[first:]
+            self.data[self.capacity:self.capacity + rest] = block[first:]
+
+        self.total += n
+
+    def view(self, start: int, end: int = None) -> np.ndarray:
+        """返回全局位置 [start, end) 的连续视图（早于缓冲区保留范围的部分会被截掉）
+
+        视图直接引用底层数组，在缓冲区回绕覆盖这段数据之前有效。
+        """
+        if end is None:
+            end = self.total
+        start = max(start, self.oldest)
+        end = min(end, self.total)
+        if end <= start:
+            return self.data[:0]
+
+        pos = start % self.capacity
+        return self.data[pos:pos + (end - start)]
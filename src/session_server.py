@@ -0,0 +1,230 @@
+"""
+多会话 WebSocket 服务模块
+每个连接运行独立的对话状态（历史、VAD、回复音频流），
+所有会话共享一个 Whisper 模型、TTS 层、LLM 客户端与连接池
+
+协议:
+    客户端 -> 服务端  二进制帧: int16 小端单声道 PCM（默认 SERVER_SAMPLE_RATE）
+                      文本帧:   {"type": "start", "sample_rate": 16000}  声明采样率（可选，需在音频之前发送）
+                                {"type": "interrupt"}                     打断当前回复
+    服务端 -> 客户端  二进制帧: 回复音频（MP3 数据块，按顺序拼接播放）
+                      文本帧:   {"type": "ready"} / {"type": "interrupt"}（清空客户端播放缓冲）
+                                {"type": "busy"}（会话数已满，随后关闭连接）
+"""
+
+import asyncio
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .asr_pool import ASRWorkerPool
+from .asr_scheduler import ASRScheduler
+from .audio_manager import AudioManager
+from .conversation_manager import ConversationManager
+from .http_pool import LLMConnectionPool
+from .latency_tracer import LatencyTracer
+from .mock_llm_server import MockChatServer
+from .session_store import SessionStore
+from .signal_handler import SignalHandler
+from .speech_recognition import SpeechRecognizer
+from .text_to_speech import TextToSpeech
+from config import (
+    API_KEY, BASE_URL, LLM_BACKEND, ASR_WORKER_PROCESSES,
+    SERVER_HOST, SERVER_PORT, SERVER_MAX_SESSIONS, SERVER_SAMPLE_RATE, SERVER_ASR_WORKERS,
+    SERVER_ASR_BATCHING, SERVER_SEND_TIMEOUT, SERVER_MAX_MESSAGE_SIZE, SERVER_MAX_QUEUE,
+    SESSION_STORE_ENABLED, SESSION_STORE_DIR, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+class WebSocketAudioManager(AudioManager):
+    """远程会话的音频管理器：PCM 由 WebSocket 推入，回复音频发回客户端
+
+    回声由客户端处理（如浏览器的 echoCancellation），因此不使用输出电平抬高 VAD 阈值。
+    """
+
+    def __init__(self, send, input_rate: int = SERVER_SAMPLE_RATE):
+        super().__init__(input_rate=input_rate)
+        self.player = None
+        self.external_echo_cancellation = True
+        self.send = send  # async send(data: bytes | str)
+        self._flushed = True
+
+    def start(self):
+        pass
+
+    def close(self):
+        pass
+
+    def feed_pcm(self, data: bytes):
+        """处理一帧 int16 小端 PCM"""
+        usable = len(data) - len(data) % 2
+        if usable:
+            self.feed(np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32768.0)
+
+    async def play_stream_with_interrupt(self, chunks, signal_handler, announce: bool = True,
+                                         drain: bool = True) -> bool:
+        """把回复音频发送给客户端，被打断时通知客户端清空播放缓冲"""
+        signal_handler.set_playing_state(True)
+        try:
+            async for data in chunks:
+                if signal_handler.should_interrupt:
+                    break
+                try:
+                    # websockets 在发送缓冲超过上限时阻塞，客户端读取过慢时超时并打断回复
+                    await asyncio.wait_for(self.send(data), SERVER_SEND_TIMEOUT)
+                except asyncio.TimeoutError:
+                    log("⚠️ 客户端接收过慢，打断回复。")
+                    signal_handler.should_interrupt = True
+                    break
+                self._flushed = False
+        finally:
+            signal_handler.set_playing_state(False)
+
+        if signal_handler.should_interrupt:
+            if not self._flushed:
+                self._flushed = True
+                await self.send(json.dumps({"type": "interrupt"}))
+            return True
+        return False
+
+    async def play_audio_with_interrupt(self, audio_file: str, signal_handler, announce: bool = True) -> bool:
+        async def read_file():
+            with open(audio_file, "rb") as f:
+                yield f.read()
+        return await self.play_stream_with_interrupt(read_file(), signal_handler, announce)
+
+class SessionServer:
+    """WebSocket 会话服务"""
+
+    def __init__(self, host: str = SERVER_HOST, port: int = SERVER_PORT,
+                 max_sessions: int = SERVER_MAX_SESSIONS):
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+
+        # 所有会话共享的组件
+        if ASR_WORKER_PROCESSES:
+            # 每个工作进程各自解码一段语音（批量识别只用于进程内共享的模型）；各会话的语言可能不同，不固定语言
+            self.speech_recognizer = ASRWorkerPool(pin_language=False)
+            self.asr_executor = ThreadPoolExecutor(max_workers=ASR_WORKER_PROCESSES)
+            self.asr_scheduler = None
+        else:
+            # 各会话的语言可能不同，共享模型时不固定语言
+            self.speech_recognizer = SpeechRecognizer(num_workers=SERVER_ASR_WORKERS, pin_language=False)
+            self.asr_executor = ThreadPoolExecutor(max_workers=SERVER_ASR_WORKERS)
+            self.asr_scheduler = (ASRScheduler(self.speech_recognizer, executor=self.asr_executor)
+                                  if SERVER_ASR_BATCHING else None)
+        self.tts = TextToSpeech()
+        self.tracer = LatencyTracer()
+        self.mock_server = MockChatServer() if LLM_BACKEND == "mock" else None
+        self.http_pool = None
+        self.client = None
+
+        self.sessions = {}  # 会话编号 -> ConversationManager
+        self._session_ids = itertools.count(1)
+
+    def _create_client(self, base_url: str):
+        from openai import AsyncOpenAI
+        self.http_pool = LLMConnectionPool(base_url, API_KEY)
+        self.client = AsyncOpenAI(api_key=API_KEY, base_url=base_url, http_client=self.http_pool.client)
+
+    def _any_speaking(self) -> bool:
+        return any(session.audio_manager.is_recording for session in self.sessions.values())
+
+    async def serve(self):
+        """启动服务并一直运行"""
+        import websockets
+
+        base_url = await self.mock_server.start() if self.mock_server is not None else BASE_URL
+        self._create_client(base_url)
+        keepalive = asyncio.ensure_future(self.http_pool.run_keepalive(self._any_speaking))
+
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.speech_recognizer.wait_ready)
+
+        try:
+            async with websockets.serve(
+                self._handle_connection, self.host, self.port,
+                max_size=SERVER_MAX_MESSAGE_SIZE, max_queue=SERVER_MAX_QUEUE
+            ):
+                print(f"🎯 会话服务已启动: ws://{self.host}:{self.port}（最多 {self.max_sessions} 个会话）")
+                await asyncio.Future()
+        finally:
+            keepalive.cancel()
+            for session in list(self.sessions.values()):
+                session.signal_handler.should_interrupt = True
+            self.asr_executor.shutdown(wait=False)
+            if self.asr_scheduler is not None:
+                self.asr_scheduler.close()
+            if isinstance(self.speech_recognizer, ASRWorkerPool):
+                self.speech_recognizer.close()
+            await self.http_pool.close()
+            if self.mock_server is not None:
+                await self.mock_server.close()
+
+    async def _handle_connection(self, websocket):
+        """处理一个客户端连接：会话数已满时拒绝，否则运行独立的对话流水线"""
+        if len(self.sessions) >= self.max_sessions:
+            await websocket.send(json.dumps({"type": "busy"}))
+            await websocket.close(1013, "server busy")
+            return
+
+        session_id = next(self._session_ids)
+        audio_manager = WebSocketAudioManager(websocket.send)
+        # 每个连接新建独立的会话存储，不恢复其他连接的历史
+        session_store = None
+        if SESSION_STORE_ENABLED:
+            session_store = SessionStore.create(os.path.join(SESSION_STORE_DIR, "server"), suffix=str(session_id))
+        session = ConversationManager(
+            SignalHandler(install=False),
+            audio_manager=audio_manager,
+            speech_recognizer=self.speech_recognizer,
+            tts=self.tts,
+            client=self.client,
+            http_pool=self.http_pool,
+            asr_executor=self.asr_executor,
+            tracer=self.tracer,
+            asr_scheduler=self.asr_scheduler,
+            session_store=session_store,
+        )
+        self.sessions[session_id] = session
+        log(f"🔗 会话 {session_id} 已连接（当前 {len(self.sessions)} 个）")
+
+        conversation = asyncio.ensure_future(session.run_conversation())
+        receiver = asyncio.ensure_future(self._receive(websocket, session))
+        try:
+            await websocket.send(json.dumps({"type": "ready"}))
+            # 任一方结束（用户说“退出”或连接断开）即结束会话
+            await asyncio.wait([conversation, receiver], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            session.signal_handler.should_interrupt = True
+            for task in (conversation, receiver):
+                task.cancel()
+            await asyncio.gather(conversation, receiver, return_exceptions=True)
+            del self.sessions[session_id]
+            await session.close_session_store()
+            await websocket.close()
+            log(f"🔌 会话 {session_id} 已断开（当前 {len(self.sessions)} 个）")
+
+    async def _receive(self, websocket, session: ConversationManager):
+        """接收客户端的音频与控制消息"""
+        audio_manager = session.audio_manager
+        async for message in websocket:
+            if isinstance(message, bytes):
+                audio_manager.feed_pcm(message)
+                continue
+
+            try:
+                control = json.loads(message)
+            except ValueError:
+                continue
+            if control.get("type") == "start" and control.get("sample_rate"):
+                audio_manager.set_input_rate(int(control["sample_rate"]))
+            elif control.get("type") == "interrupt":
+                session.signal_handler.should_interrupt = True
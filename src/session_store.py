@@ -0,0 +1,288 @@
+"""
+会话存储模块
+每个会话一个目录，只追加写入：对话轮次（JSON Lines）、定长二进制索引、用户语音（int16 PCM）
+与回复音频（合成得到的 MP3 原样拼接）。启动时通过索引只读取最近的若干轮恢复对话历史，
+音频以内存映射方式按轮次随机读取，供基准测试与调试回放
+
+用法（调试）:
+    python -m src.session_store logs/sessions/20240101-120000
+    python -m src.session_store logs/sessions/20240101-120000 --export 3 --out turn3
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+import wave
+
+import numpy as np
+
+from .history import Turn
+from config import (
+    SESSION_STORE_DIR, SESSION_STORE_FSYNC, HISTORY_TOKEN_BUDGET, ASR_SAMPLE_RATE, VERBOSE
+)
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+FORMAT_VERSION = 1
+META_FILE = "session.json"
+TURNS_FILE = "turns.jsonl"
+INDEX_FILE = "turns.idx"
+USER_AUDIO_FILE = "user.pcm"
+REPLY_AUDIO_FILE = "reply.mp3"
+
+# 定长索引记录：轮次记录的字节偏移与长度、用户语音的采样偏移与采样数、回复音频的字节偏移与长度、写入时间
+INDEX_RECORD = struct.Struct("<QIQIQId")
+
+def encode_pcm(audio: np.ndarray) -> bytes:
+    """float32 音频（-1~1）编码为 int16 小端 PCM"""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+class SessionStore:
+    """单个会话的只追加存储
+
+    每轮的写入顺序为 音频 -> 轮次记录 -> 索引记录，索引记录是提交点：打开时丢弃不完整的
+    索引记录，并把数据文件截断到最后一条有效记录的末尾，因此崩溃最多丢失正在写入的一轮。
+    读取均经索引定位，不需要扫描整个日志。
+    """
+
+    def __init__(self, path: str, fsync: bool = SESSION_STORE_FSYNC):
+        self.path = path
+        self.fsync = fsync
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+            if self.meta.get("version") != FORMAT_VERSION:
+                raise ValueError(f"不支持的会话存储版本: {self.meta.get('version')}")
+        else:
+            self.meta = {
+                "version": FORMAT_VERSION,
+                "created": time.time(),
+                "sample_rate": ASR_SAMPLE_RATE,
+                "reply_format": "mp3",
+            }
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        self.sample_rate = self.meta["sample_rate"]
+
+        # a+b：写入总是追加到末尾，读取时按偏移定位
+        self._files = {
+            name: open(os.path.join(path, name), "a+b")
+            for name in (TURNS_FILE, INDEX_FILE, USER_AUDIO_FILE, REPLY_AUDIO_FILE)
+        }
+        self._maps = {}  # 文件名 -> (映射长度, mmap)
+        self._recover()
+
+    @classmethod
+    def create(cls, root: str = SESSION_STORE_DIR, suffix: str = None) -> "SessionStore":
+        """在 root 下新建一个以开始时间命名的会话"""
+        name = time.strftime("%Y%m%d-%H%M%S")
+        if suffix:
+            name = f"{name}-{suffix}"
+        path = os.path.join(root, name)
+        index = 1
+        while os.path.exists(path):
+            index += 1
+            path = os.path.join(root, f"{name}-{index}")
+        return cls(path)
+
+    @classmethod
+    def latest(cls, root: str = SESSION_STORE_DIR) -> "SessionStore":
+        """打开 root 下最近的会话（按开始时间命名，不存在时新建）"""
+        sessions = []
+        if os.path.isdir(root):
+            sessions = sorted(name for name in os.listdir(root)
+                              if os.path.exists(os.path.join(root, name, META_FILE)))
+        if not sessions:
+            return cls.create(root)
+        store = cls(os.path.join(root, sessions[-1]))
+        log(f"📂 接着会话 {store.path}（已有 {len(store)} 轮）")
+        return store
+
+    def _size(self, name: str) -> int:
+        return os.fstat(self._files[name].fileno()).st_size
+
+    def _read(self, name: str, offset: int, size: int) -> bytes:
+        f = self._files[name]
+        f.seek(offset)
+        return f.read(size)
+
+    def _recover(self):
+        """丢弃不完整的索引记录与其后未提交的数据"""
+        count = self._size(INDEX_FILE) // INDEX_RECORD.size
+        sizes = (self._size(TURNS_FILE), self._size(USER_AUDIO_FILE) // 2, self._size(REPLY_AUDIO_FILE))
+        ends = (0, 0, 0)
+        while count:
+            record = self._index(count - 1)
+            ends = (record[0] + record[1], record[2] + record[3], record[4] + record[5])
+            if all(end <= size for end, size in zip(ends, sizes)):
+                break
+            count -= 1
+            ends = (0, 0, 0)
+
+        dropped = False
+        for name, size in ((INDEX_FILE, count * INDEX_RECORD.size), (TURNS_FILE, ends[0]),
+                           (USER_AUDIO_FILE, ends[1] * 2), (REPLY_AUDIO_FILE, ends[2])):
+            if self._size(name) > size:
+                self._files[name].truncate(size)
+                dropped = True
+        if dropped:
+            log(f"⚠️ 会话存储 {self.path} 末尾有未完整写入的数据，已丢弃")
+
+        self.count = count
+        self._ends = list(ends)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _index(self, i: int) -> tuple:
+        return INDEX_RECORD.unpack(self._read(INDEX_FILE, i * INDEX_RECORD.size, INDEX_RECORD.size))
+
+    def append_turn(self, record: dict, user_audio: bytes = b"", reply_audio: bytes = b"") -> int:
+        """追加一轮：record 为可序列化为 JSON 的轮次记录，user_audio 为 int16 PCM，返回轮次序号"""
+        turns_offset, user_offset, reply_offset = self._ends
+        line = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        user_samples = len(user_audio) // 2
+
+        for name, data in ((USER_AUDIO_FILE, user_audio[:user_samples * 2]),
+                           (REPLY_AUDIO_FILE, reply_audio), (TURNS_FILE, line)):
+            if data:
+                self._files[name].write(data)
+                self._files[name].flush()
+                if self.fsync:
+                    os.fsync(self._files[name].fileno())
+
+        index = self._files[INDEX_FILE]
+        index.write(INDEX_RECORD.pack(turns_offset, len(line), user_offset, user_samples,
+                                      reply_offset, len(reply_audio), time.time()))
+        index.flush()
+        if self.fsync:
+            os.fsync(index.fileno())
+
+        self._ends = [turns_offset + len(line), user_offset + user_samples, reply_offset + len(reply_audio)]
+        self.count += 1
+        return self.count - 1
+
+    def record(self, i: int) -> dict:
+        """第 i 轮的记录"""
+        turns_offset, turns_length = self._index(i)[:2]
+        return json.loads(self._read(TURNS_FILE, turns_offset, turns_length))
+
+    def records(self, start: int = 0, stop: int = None):
+        """按顺序产出 [start, stop) 轮的记录"""
+        for i in range(start, self.count if stop is None else min(stop, self.count)):
+            yield self.record(i)
+
+    def _map(self, name: str) -> mmap.mmap:
+        """只读映射数据文件，文件增长后重新映射"""
+        size = self._size(name)
+        mapped = self._maps.get(name)
+        if mapped is None or mapped[0] < size:
+            # 旧映射可能仍被返回的视图引用，由垃圾回收释放
+            mapped = (size, mmap.mmap(self._files[name].fileno(), size, access=mmap.ACCESS_READ))
+            self._maps[name] = mapped
+        return mapped[1]
+
+    def user_pcm(self, i: int) -> np.ndarray:
+        """第 i 轮用户语音的 int16 视图（直接引用内存映射，不复制）"""
+        _, _, offset, samples = self._index(i)[:4]
+        if not samples:
+            return np.zeros(0, dtype="<i2")
+        return np.frombuffer(self._map(USER_AUDIO_FILE), dtype="<i2", count=samples, offset=offset * 2)
+
+    def user_audio(self, i: int) -> np.ndarray:
+        """第 i 轮用户语音（sample_rate 采样率的 float32）"""
+        return self.user_pcm(i).astype(np.float32) / 32767
+
+    def reply_audio(self, i: int) -> memoryview:
+        """第 i 轮回复音频（MP3）的只读视图"""
+        offset, length = self._index(i)[4:6]
+        if not length:
+            return memoryview(b"")
+        return memoryview(self._map(REPLY_AUDIO_FILE))[offset:offset + length]
+
+    def recent_history(self, token_budget: int = HISTORY_TOKEN_BUDGET) -> tuple:
+        """从末尾向前读取最近的对话，返回 (摘要, 尚未折叠进摘要的轮次, 最近的轮次)，轮次均为 [(用户, 回复)]
+
+        按最后一条记录中的窗口与待折叠轮数读取（窗口同时受 token 预算限制）；
+        遇到“清空历史”的记录即停止。
+        """
+        summary = None
+        window = pending = None
+        turns, folded = [], []
+        tokens = 0
+        for i in range(self.count - 1, -1, -1):
+            record = self.record(i)
+            if summary is None:
+                summary = record.get("summary", "")
+                window = record.get("window")
+                pending = record.get("pending", 0)
+            if record.get("cleared"):
+                break
+            if not record.get("history"):
+                continue
+            turn = Turn(record["user"])
+            if record.get("assistant"):
+                turn.set_reply(record["assistant"])
+            if not folded and (window is None or len(turns) < window):
+                if not turns or tokens + turn.tokens <= token_budget:
+                    tokens += turn.tokens
+                    turns.append((turn.user, turn.assistant))
+                    continue
+            if len(folded) >= pending:
+                break
+            folded.append((turn.user, turn.assistant))
+        turns.reverse()
+        folded.reverse()
+        return summary or "", folded, turns
+
+    def close(self):
+        """关闭映射与文件"""
+        for _, mapped in self._maps.values():
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # 仍有视图引用，随视图一起释放
+        self._maps = {}
+        for f in self._files.values():
+            f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="查看会话存储并导出音频")
+    parser.add_argument("path", help="会话目录")
+    parser.add_argument("--export", type=int, help="导出指定轮次的用户语音（WAV）与回复音频（MP3）")
+    parser.add_argument("--out", help="导出文件名前缀，默认为 turn<序号>")
+    args = parser.parse_args()
+
+    store = SessionStore(args.path, fsync=False)
+    try:
+        if args.export is None:
+            print(f"📂 {store.path}: {len(store)} 轮")
+            for i, record in enumerate(store.records()):
+                user_seconds = len(store.user_pcm(i)) / store.sample_rate
+                print(f"{i:>4}  {time.strftime('%H:%M:%S', time.localtime(record['time']))}"
+                      f"  语音 {user_seconds:5.1f}s  回复 {len(store.reply_audio(i)) / 1024:7.1f}KB"
+                      f"  👤 {record['user']}  🤖 {record.get('assistant') or ''}")
+            return
+
+        prefix = args.out or f"turn{args.export}"
+        with wave.open(f"{prefix}.wav", "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(store.sample_rate)
+            f.writeframes(store.user_pcm(args.export).tobytes())
+        with open(f"{prefix}.mp3", "wb") as f:
+            f.write(store.reply_audio(args.export))
+        print(f"💾 已导出 {prefix}.wav 与 {prefix}.mp3")
+    finally:
+        store.close()
+
+if __name__ == "__main__":
+    main()
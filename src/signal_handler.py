@@ -3,9 +3,10 @@
 处理 Ctrl+C 等系统信号，实现智能打断功能
 """
 
+import asyncio
 import signal
 import sys
-from config import VERBOSE
+from config import INTERRUPT_POLL_INTERVAL, VERBOSE
 
 def log(msg):
     if VERBOSE:
@@ -14,18 +15,20 @@ def log(msg):
 class SignalHandler:
     """系统信号处理器"""
     
-    def __init__(self):
+    def __init__(self, install: bool = True):
         self.is_playing = False
+        self.is_responding = False
         self.should_interrupt = False
         self.playback_process = None
         
-        # 注册信号处理器
-        signal.signal(signal.SIGINT, self._signal_handler)
+        # 注册信号处理器（服务端会话只使用打断状态，不注册）
+        if install:
+            signal.signal(signal.SIGINT, self._signal_handler)
     
     def _signal_handler(self, sig, frame):
         """处理 Ctrl+C 信号"""
-        if self.is_playing:
-            # 如果正在播放，打断播放
+        if self.is_playing or self.is_responding:
+            # 如果正在播放或生成回复，打断播放
             self.should_interrupt = True
             if self.playback_process:
                 try:
@@ -44,8 +47,16 @@ class SignalHandler:
         """设置播放状态"""
         self.is_playing = is_playing
         self.playback_process = process
-        self.should_interrupt = False
+    
+    def set_responding_state(self, is_responding):
+        """设置回复状态（流式回复期间，句子之间的间隙也可打断）"""
+        self.is_responding = is_responding
     
     def reset_interrupt_flag(self):
         """重置打断标志"""
         self.should_interrupt = False
+    
+    async def wait_interrupt(self, interval: float = INTERRUPT_POLL_INTERVAL):
+        """等待打断标志被置位（Ctrl+C、插话与服务端断开都只设置标志，因此按间隔轮询）"""
+        while not self.should_interrupt:
+            await asyncio.sleep(interval)
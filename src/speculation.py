@@ -0,0 +1,107 @@
+"""
+推测式 LLM 请求模块
+用户仍在端点静音等待中、部分识别结果已稳定时提前发出流式请求，
+最终识别结果一致时直接沿用已生成的内容，不一致时取消
+"""
+
+import asyncio
+import time
+
+from .history import estimate_tokens
+from .text_utils import normalize_query
+from config import MODEL_NAME, MAX_TOKENS, VERBOSE
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+# 检查部分识别结果是否稳定的轮询间隔（秒）
+SPECULATION_POLL_INTERVAL = 0.05
+
+class SpeculativeRequest:
+    """基于部分识别结果提前发出的流式 LLM 请求
+
+    请求在后台任务中运行，收到的增量文本先缓存起来；命中时由 stream() 按顺序
+    取出已缓存与后续到达的增量，未命中时 cancel() 取消请求并返回已生成的 token 数。
+    """
+
+    def __init__(self, client, messages: list, text: str):
+        self.text = text
+        self.key = normalize_query(text)
+        self.context = messages[:-1]  # 发出请求时的对话历史（系统提示、摘要与已有轮次）
+        self.prompt_tokens = sum(estimate_tokens(message["content"]) for message in messages)
+        self.started = time.monotonic()
+        self.first_token_time = None
+
+        self.deltas = []
+        self.done = False
+        self.error = None
+        self._updated = asyncio.Event()
+        self.task = asyncio.ensure_future(self._run(client, messages))
+
+    async def _run(self, client, messages: list):
+        stream = None
+        try:
+            stream = await client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+                max_tokens=MAX_TOKENS,
+                stream=True
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if self.first_token_time is None:
+                    self.first_token_time = time.monotonic()
+                self.deltas.append(delta)
+                self._updated.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+            log(f"⚠️ 推测请求出错: {e}")
+        finally:
+            self.done = True
+            self._updated.set()
+            if stream is not None:
+                try:
+                    await stream.close()
+                except Exception:
+                    pass
+
+    def matches(self, text: str) -> bool:
+        """最终识别结果与推测所用的文本是否一致（忽略标点、空白与大小写）"""
+        return normalize_query(text or "") == self.key
+
+    def based_on(self, history: list) -> bool:
+        """对话历史是否仍与发出请求时一致（期间写入了回复、新的轮次或折叠了摘要时不一致）"""
+        return history == self.context
+
+    @property
+    def usable(self) -> bool:
+        """请求未失败（中途出错的请求只有半截回复，丢弃后重新请求）"""
+        return self.error is None
+
+    async def stream(self):
+        """按顺序产出已缓存与后续到达的增量文本"""
+        index = 0
+        while True:
+            while index < len(self.deltas):
+                yield self.deltas[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            self._updated.clear()
+            await self._updated.wait()
+
+    async def cancel(self) -> int:
+        """取消请求，返回已生成（被浪费）的 token 数"""
+        if not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        return estimate_tokens("".join(self.deltas))
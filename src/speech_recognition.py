@@ -3,16 +3,27 @@
 使用 Whisper 模型进行语音转文字
 """
 
-import io
-import soundfile as sf
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from faster_whisper import WhisperModel
+from .startup import startup_timer
 from config import (
     WHISPER_MODEL_PATH, 
     WHISPER_DEVICE, 
     WHISPER_COMPUTE_TYPE,
-    SAMPLE_RATE,
     SILENCE_DURATION,
+    ASR_SAMPLE_RATE,
+    STREAMING_ASR_INTERVAL,
+    STREAMING_ASR_MIN_AUDIO,
+    WHISPER_WARMUP,
+    WHISPER_LANGUAGE,
+    WHISPER_PIN_LANGUAGE,
+    WHISPER_LANGUAGE_PIN_PROBABILITY,
+    WHISPER_DECODING,
+    WHISPER_BEAM_SIZE,
+    WHISPER_LOGPROB_THRESHOLD,
+    WHISPER_COMPRESSION_RATIO_THRESHOLD,
     VERBOSE
 )
 
@@ -20,36 +31,116 @@ def log(msg):
     if VERBOSE:
         print(msg)
 
+# Whisper 的静音判定：no_speech 概率高且平均对数概率低时丢弃结果（与 faster-whisper 默认值一致）
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+# 批量解码的最大输出长度（token）
+MAX_DECODE_LENGTH = 448
+
+def compression_ratio(text: str) -> float:
+    """文本的 zlib 压缩比，重复输出（解码陷入循环）时明显偏高"""
+    data = text.encode("utf-8")
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
 class SpeechRecognizer:
-    """语音识别器"""
+    """语音识别器
+
+    解码策略由 decoding 决定：adaptive 先做贪心解码，只有平均对数概率过低或压缩比过高
+    （低置信度）时才改用束搜索重新解码；greedy / beam 分别固定使用一种。
+    未指定 WHISPER_LANGUAGE 时，首次高置信度识别出的语言会被固定下来，之后跳过逐段的语言检测。
+    """
+    
+    def __init__(self, num_workers: int = 1, cpu_threads: int = 0,
+                 decoding: str = WHISPER_DECODING, pin_language: bool = WHISPER_PIN_LANGUAGE):
+        # num_workers > 1 时同一模型可被多个线程并发调用（服务端多会话共享）
+        self.num_workers = num_workers
+        # 每次推理使用的 CPU 线程数，0 表示使用 CTranslate2 的默认值
+        self.cpu_threads = cpu_threads
+        self.decoding = decoding
+        # 多个会话共享模型时各会话的语言可能不同，不应固定语言
+        self.pin_language = pin_language
+        self.language = WHISPER_LANGUAGE
+        self._tokenizers = {}  # 语言 -> 批量解码使用的分词器
+        
+        self.greedy_decodes = 0
+        self.beam_decodes = 0
+        self.beam_fallbacks = 0
+        
+        # 模型在后台线程中加载，首次使用时才等待加载完成
+        self._loader = ThreadPoolExecutor(max_workers=1)
+        self._model_future = self._loader.submit(self._load_model)
+        self._loader.shutdown(wait=False)
     
-    def __init__(self):
+    def _load_model(self):
+        """加载 Whisper 模型并做一次预热解码"""
         log("🔄 正在加载 Whisper 模型...")
-        self.model = WhisperModel(
-            WHISPER_MODEL_PATH, 
-            device=WHISPER_DEVICE, 
-            compute_type=WHISPER_COMPUTE_TYPE
-        )
+        with startup_timer.phase("导入 faster_whisper"):
+            from faster_whisper import WhisperModel
+        
+        with startup_timer.phase("Whisper 模型加载"):
+            model = WhisperModel(
+                WHISPER_MODEL_PATH, 
+                device=WHISPER_DEVICE, 
+                compute_type=WHISPER_COMPUTE_TYPE,
+                cpu_threads=self.cpu_threads,
+                num_workers=self.num_workers
+            )
+        
+        if WHISPER_WARMUP:
+            # 解码一段静音，提前完成 CTranslate2 内核的初始化
+            with startup_timer.phase("Whisper 预热解码"):
+                segments, _ = model.transcribe(
+                    np.zeros(ASR_SAMPLE_RATE, dtype=np.float32),
+                    beam_size=1,
+                    vad_filter=False
+                )
+                list(segments)
+        
         log("✅ Whisper 模型加载完成")
+        return model
+    
+    @property
+    def model(self):
+        """Whisper 模型（尚未加载完成时阻塞等待）"""
+        return self._model_future.result()
+    
+    def wait_ready(self) -> bool:
+        """等待模型加载完成，返回是否成功"""
+        try:
+            self._model_future.result()
+            return True
+        except Exception as e:
+            log(f"❌ Whisper 模型加载失败: {e}")
+            return False
     
-    def transcribe(self, audio_data: np.ndarray) -> str:
-        """将音频数据转录为文本"""
+    def transcribe(self, audio_data: np.ndarray, speech_spans: list = None) -> str:
+        """将音频数据转录为文本（输入为 16 kHz 单声道 float32 数组）
+
+        speech_spans 为采集端 VAD 给出的语音区间 [(start, end), ...]（采样位置），
+        提供时只解码这些区间并跳过 faster-whisper 自带的第二遍 VAD。
+        """
         if audio_data is None or len(audio_data) == 0:
             return ""
         
         try:
-            # 将音频数据转换为 WAV 格式
-            buf = io.BytesIO()
-            sf.write(buf, audio_data, SAMPLE_RATE, format="WAV")
-            buf.seek(0)
+            audio = self._speech_audio(audio_data, speech_spans)
             
-            # 使用 Whisper 进行转录
-            segments, _ = self.model.transcribe(
-                buf,
-                vad_filter=True,
-                vad_parameters={"min_silence_duration_ms": int(SILENCE_DURATION * 1000)},
-                beam_size=5
-            )
+            if speech_spans:
+                vad_options = {"vad_filter": False}
+            else:
+                vad_options = {
+                    "vad_filter": True,
+                    "vad_parameters": {"min_silence_duration_ms": int(SILENCE_DURATION * 1000)},
+                }
+            
+            if self.decoding == "beam":
+                segments = self._decode(audio, WHISPER_BEAM_SIZE, vad_options)
+            else:
+                segments = self._decode(audio, 1, vad_options)
+                if self.decoding == "adaptive" and self._low_confidence(segments):
+                    self.beam_fallbacks += 1
+                    log("🔁 贪心解码置信度低，改用束搜索")
+                    segments = self._decode(audio, WHISPER_BEAM_SIZE, vad_options)
             
             # 合并所有片段的文本
             text = " ".join(segment.text for segment in segments)
@@ -58,3 +149,362 @@ class SpeechRecognizer:
         except Exception as e:
             log(f"❌ 转录错误: {e}")
             return ""
+    
+    def transcribe_segments(self, audio_data: np.ndarray) -> dict:
+        """转录一整段录音（如通话录音），返回语言、时长与带时间戳的片段，出错时抛出异常
+
+        长录音上整段重新解码的代价过高，adaptive 策略改由 faster-whisper 按 30 秒窗口做温度回退，
+        只重新解码低置信度的窗口。
+        """
+        audio = np.ascontiguousarray(audio_data, dtype=np.float32)
+        options = {
+            "vad_filter": True,
+            "vad_parameters": {"min_silence_duration_ms": int(SILENCE_DURATION * 1000)},
+        }
+        if self.decoding == "beam":
+            options["beam_size"] = WHISPER_BEAM_SIZE
+            self.beam_decodes += 1
+        else:
+            options["beam_size"] = 1
+            self.greedy_decodes += 1
+            if self.decoding == "greedy":
+                options["temperature"] = 0.0
+            else:
+                options["log_prob_threshold"] = WHISPER_LOGPROB_THRESHOLD
+                options["compression_ratio_threshold"] = WHISPER_COMPRESSION_RATIO_THRESHOLD
+        
+        segments, info = self.model.transcribe(audio, language=self.language, **options)
+        segments = [
+            {"start": round(segment.start, 2), "end": round(segment.end, 2), "text": segment.text.strip()}
+            for segment in segments
+        ]
+        self._observe_language(info.language, info.language_probability)
+        return {
+            "language": info.language,
+            "duration": round(len(audio) / ASR_SAMPLE_RATE, 2),
+            "text": " ".join(segment["text"] for segment in segments).strip(),
+            "segments": segments,
+        }
+    
+    def _decode(self, audio: np.ndarray, beam_size: int, vad_options: dict) -> list:
+        """解码一次并返回片段列表；贪心解码不做温度回退，由调用方决定是否改用束搜索"""
+        options = dict(vad_options)
+        if beam_size == 1:
+            options["temperature"] = 0.0
+            self.greedy_decodes += 1
+        else:
+            self.beam_decodes += 1
+        segments, info = self.model.transcribe(
+            audio,
+            beam_size=beam_size,
+            language=self.language,
+            **options
+        )
+        segments = list(segments)
+        self._observe_language(info.language, info.language_probability)
+        return segments
+    
+    def _observe_language(self, language: str, probability: float):
+        """首次高置信度识别后固定语言"""
+        if (self.pin_language and self.language is None and language
+                and probability >= WHISPER_LANGUAGE_PIN_PROBABILITY):
+            self.language = language
+            log(f"🌐 识别语言已固定为 {language}（置信度 {probability:.2f}）")
+    
+    @staticmethod
+    def _low_confidence(segments: list) -> bool:
+        """任一片段平均对数概率过低或压缩比过高"""
+        return any(
+            segment.avg_logprob < WHISPER_LOGPROB_THRESHOLD
+            or segment.compression_ratio > WHISPER_COMPRESSION_RATIO_THRESHOLD
+            for segment in segments
+        )
+    
+    @staticmethod
+    def _speech_audio(audio_data: np.ndarray, speech_spans: list = None) -> np.ndarray:
+        """取出语音区间的采样（直接使用采样数组，跳过 WAV 编解码与重复重采样）"""
+        audio = np.ascontiguousarray(audio_data, dtype=np.float32)
+        if not speech_spans:
+            return audio
+        if len(speech_spans) == 1:
+            start, end = speech_spans[0]
+            return audio[start:end]
+        return np.concatenate([audio[start:end] for start, end in speech_spans])
+    
+    def set_decoding(self, decoding: str):
+        """切换解码策略，同时清空已固定的语言与解码统计"""
+        self.decoding = decoding
+        self.language = WHISPER_LANGUAGE
+        self.greedy_decodes = self.beam_decodes = self.beam_fallbacks = 0
+    
+    def decoding_stats(self) -> dict:
+        """解码次数统计（adaptive 策略下束搜索回退的比例）"""
+        first_pass = self.greedy_decodes if self.decoding != "beam" else self.beam_decodes
+        return {
+            "decoding": self.decoding,
+            "language": self.language,
+            "greedy_decodes": self.greedy_decodes,
+            "beam_decodes": self.beam_decodes,
+            "beam_fallbacks": self.beam_fallbacks,
+            "fallback_rate": self.beam_fallbacks / first_pass if first_pass else 0.0,
+        }
+    
+    def max_batch_samples(self) -> int:
+        """可参与批量解码的最长语音（一个 30 秒的 Whisper 窗口）"""
+        extractor = self.model.feature_extractor
+        return extractor.nb_max_frames * extractor.hop_length
+    
+    def _tokenizer(self, language: str):
+        """按语言缓存 Whisper 分词器"""
+        tokenizers = self._tokenizers
+        if language not in tokenizers:
+            from faster_whisper.tokenizer import Tokenizer
+            model = self.model
+            tokenizers[language] = Tokenizer(
+                model.hf_tokenizer, model.model.is_multilingual, task="transcribe", language=language
+            )
+        return tokenizers[language]
+    
+    def transcribe_batch(self, audios: list) -> list:
+        """对多段语音（每段不超过一个 30 秒窗口）做一次批量编码与解码，返回各段文本
+
+        特征补齐到同一窗口长度后堆叠为一个批次，编码器与解码器各运行一次；
+        未固定语言时在同一批次中逐段检测语言。adaptive 策略下只对低置信度的语音段
+        复用已有的编码结果再做一次批量束搜索。
+        """
+        if not audios:
+            return []
+        model = self.model
+        extractor = model.feature_extractor
+        
+        features = np.zeros((len(audios), extractor.feature_size, extractor.nb_max_frames), dtype=np.float32)
+        for i, audio in enumerate(audios):
+            mel = extractor(np.ascontiguousarray(audio, dtype=np.float32))[:, :extractor.nb_max_frames]
+            features[i, :, :mel.shape[1]] = mel
+        encoder_output = self._encode(features)
+        
+        if self.language is not None:
+            languages = [self.language] * len(audios)
+        elif model.model.is_multilingual:
+            detected = model.model.detect_language(encoder_output)
+            languages = [results[0][0][2:-2] for results in detected]
+        else:
+            languages = ["en"] * len(audios)
+        
+        # 各段的提示只在语言标记上不同，长度一致，可在一次 generate 调用中解码
+        tokenizers = [self._tokenizer(language) for language in languages]
+        prompts = [model.get_prompt(tokenizer, [], without_timestamps=True) for tokenizer in tokenizers]
+        beam_size = WHISPER_BEAM_SIZE if self.decoding == "beam" else 1
+        results = self._generate(encoder_output, prompts, tokenizers, beam_size)
+        
+        if self.decoding == "adaptive":
+            retry = [
+                i for i, (text, score) in enumerate(results)
+                if text and (score < WHISPER_LOGPROB_THRESHOLD
+                             or compression_ratio(text) > WHISPER_COMPRESSION_RATIO_THRESHOLD)
+            ]
+            if retry:
+                self.beam_fallbacks += len(retry)
+                retried = self._generate(
+                    self._select(encoder_output, retry),
+                    [prompts[i] for i in retry],
+                    [tokenizers[i] for i in retry],
+                    WHISPER_BEAM_SIZE,
+                )
+                for i, result in zip(retry, retried):
+                    results[i] = result
+        
+        return [text for text, _ in results]
+    
+    def _encode(self, features: np.ndarray):
+        """批量编码（batch, n_mels, frames）的梅尔特征，返回 ctranslate2.StorageView
+
+        faster-whisper 1.0 之前的 WhisperModel.encode 总会再加一个批次维度，这里直接调用 CTranslate2 模型。
+        adaptive 策略下编码结果放在 CPU 上，重试时可按语音段取出。
+        """
+        import ctranslate2
+        
+        model = self.model.model
+        to_cpu = model.device == "cuda" and (self.decoding == "adaptive" or len(model.device_index) > 1)
+        return model.encode(ctranslate2.StorageView.from_array(features), to_cpu=to_cpu)
+    
+    def _select(self, encoder_output, rows: list):
+        """取出编码结果中的若干语音段"""
+        if len(rows) == encoder_output.shape[0]:
+            return encoder_output
+        import ctranslate2
+        
+        return ctranslate2.StorageView.from_array(np.ascontiguousarray(np.asarray(encoder_output)[rows]))
+    
+    def _generate(self, encoder_output, prompts: list, tokenizers: list, beam_size: int) -> list:
+        """批量解码，返回 [(文本, 平均对数概率)]，判定为静音的语音段文本为空"""
+        results = self.model.model.generate(
+            encoder_output,
+            prompts,
+            beam_size=beam_size,
+            max_length=MAX_DECODE_LENGTH,
+            return_scores=True,
+            return_no_speech_prob=True,
+        )
+        if beam_size == 1:
+            self.greedy_decodes += len(prompts)
+        else:
+            self.beam_decodes += len(prompts)
+        
+        decoded = []
+        for tokenizer, result in zip(tokenizers, results):
+            score = result.scores[0]
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and score < LOGPROB_THRESHOLD:
+                decoded.append(("", score))
+                continue
+            tokens = [token for token in result.sequences_ids[0] if token < tokenizer.eot]
+            decoded.append((tokenizer.decode(tokens).strip(), score))
+        return decoded
+    
+    def transcribe_words(self, audio_data: np.ndarray, initial_prompt: str = None) -> list:
+        """快速转录并返回带时间戳的词列表 [(start, end, word), ...]，用于流式识别"""
+        if audio_data is None or len(audio_data) == 0:
+            return []
+        
+        try:
+            audio = np.ascontiguousarray(audio_data, dtype=np.float32)
+            segments, info = self.model.transcribe(
+                audio,
+                beam_size=1,
+                word_timestamps=True,
+                language=self.language,
+                condition_on_previous_text=False,
+                initial_prompt=initial_prompt
+            )
+            words = [
+                (word.start, word.end, word.word)
+                for segment in segments
+                for word in (segment.words or [])
+            ]
+            self._observe_language(info.language, info.language_probability)
+            return words
+            
+        except Exception as e:
+            log(f"❌ 流式转录错误: {e}")
+            return []
+
+class StreamingTranscriber:
+    """流式转录器
+
+    录音过程中在后台反复解码尚未提交的音频窗口，
+    连续两次解码结果一致的前缀（local agreement）即提交为稳定文本。
+    语音结束时只需解码未提交的尾部，识别延迟不随语音长度增长。
+    """
+    
+    def __init__(self, recognizer: SpeechRecognizer, audio_manager,
+                 interval: float = STREAMING_ASR_INTERVAL):
+        self.recognizer = recognizer
+        self.audio_manager = audio_manager
+        self.interval = interval
+        self.min_samples = int(STREAMING_ASR_MIN_AUDIO * ASR_SAMPLE_RATE)
+        
+        self.thread = None
+        self.stop_event = threading.Event()
+        self._wake = threading.Event()  # 请求立即解码（如检测到停顿时）
+        self._reset()
+    
+    def _reset(self):
+        """清空上一段语音的状态"""
+        self.committed = []          # 已提交的词
+        self.committed_samples = 0   # 已提交部分在语音段中的采样位置
+        self.hypothesis = []         # 上一次解码中未提交的词
+        self.partial_shown = False
+        self.partial = ""            # 最近一次解码的部分识别结果（已提交 + 未提交）
+        self.partial_samples = 0     # 该次解码覆盖到的语音段内采样位置
+    
+    @staticmethod
+    def _normalize(word: str) -> str:
+        return word.strip().lower()
+    
+    def _committed_text(self) -> str:
+        return "".join(word for _, _, word in self.committed).strip()
+    
+    def _decode_window(self, audio: np.ndarray) -> list:
+        """解码已提交位置之后的音频，时间戳换算为语音段内的绝对时间"""
+        offset = self.committed_samples / ASR_SAMPLE_RATE
+        words = self.recognizer.transcribe_words(
+            audio[self.committed_samples:],
+            initial_prompt=self._committed_text() or None
+        )
+        return [(start + offset, end + offset, word) for start, end, word in words]
+    
+    def _update(self, audio: np.ndarray):
+        """解码一次并提交与上次结果一致的前缀"""
+        words = self._decode_window(audio)
+        
+        agreed = 0
+        for previous, current in zip(self.hypothesis, words):
+            if self._normalize(previous[2]) != self._normalize(current[2]):
+                break
+            agreed += 1
+        
+        if agreed:
+            self.committed.extend(words[:agreed])
+            self.committed_samples = int(words[agreed - 1][1] * ASR_SAMPLE_RATE)
+        self.hypothesis = words[agreed:]
+        
+        partial = self._committed_text() + "".join(word for _, _, word in self.hypothesis)
+        self.partial = partial.strip()
+        self.partial_samples = len(audio)
+        if partial.strip():
+            print(f"\r📝 {partial.strip()}", end="", flush=True)
+            self.partial_shown = True
+    
+    def settled_partial(self) -> str:
+        """最近一次解码已覆盖语音结束位置（包含全部已说内容）时返回部分结果，否则返回 None"""
+        audio_manager = self.audio_manager
+        if self.partial and self.partial_samples >= audio_manager.speech_end - audio_manager.segment_start:
+            return self.partial
+        return None
+    
+    def request_decode(self):
+        """请求后台线程立即解码一次（不受 STREAMING_ASR_MIN_AUDIO 限制），可在采集线程中调用"""
+        self._wake.set()
+    
+    def _run(self):
+        """后台解码循环"""
+        while True:
+            self._wake.wait(self.interval)
+            if self.stop_event.is_set():
+                break
+            requested = self._wake.is_set()
+            self._wake.clear()
+            
+            audio = self.audio_manager.current_segment()
+            if audio is None:
+                continue
+            pending = len(audio) - self.committed_samples
+            if pending <= 0 or (not requested and pending < self.min_samples):
+                continue
+            self._update(audio)
+    
+    def start(self):
+        """开始跟踪新的一段语音"""
+        self._reset()
+        self.stop_event.clear()
+        self._wake.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def finish(self, audio_data: np.ndarray) -> str:
+        """语音结束：停止后台解码，只解码未提交的尾部并返回完整文本"""
+        self.stop_event.set()
+        self._wake.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        
+        if self.partial_shown:
+            print()
+        
+        if audio_data is None or len(audio_data) == 0:
+            return ""
+        
+        tail = self._decode_window(audio_data)
+        words = self.committed + tail
+        return "".join(word for _, _, word in words).strip()
@@ -0,0 +1,57 @@
+"""
+启动计时模块
+记录冷启动各阶段的耗时并生成分解报告
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+class StartupTimer:
+    """启动阶段计时器（线程安全，各阶段可在不同线程中并行记录）"""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.phases = []  # (名称, 开始偏移, 结束偏移)
+        self._lock = threading.Lock()
+
+    def reset(self, origin: float = None):
+        """重新设置计时起点（通常为进程入口处记录的时间）"""
+        with self._lock:
+            self.origin = origin if origin is not None else time.perf_counter()
+            self.phases = []
+
+    def _record(self, name: str, start: float, end: float):
+        with self._lock:
+            self.phases.append((name, start - self.origin, end - self.origin))
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个阶段的起止时间"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter())
+
+    def mark(self, name: str):
+        """记录一个时间点"""
+        now = time.perf_counter()
+        self._record(name, now, now)
+
+    def report(self) -> str:
+        """按开始时间排序的耗时分解"""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+
+        width = max((len(name) for name, _, _ in phases), default=0)
+        lines = ["⏱️ 启动耗时分解（秒，自进程启动起）:"]
+        for name, start, end in phases:
+            if end == start:
+                lines.append(f"  {name:<{width}}  @ {start:7.3f}")
+            else:
+                lines.append(f"  {name:<{width}}  {start:7.3f} → {end:7.3f}  ({end - start:.3f})")
+        return "\n".join(lines)
+
+# 进程内共享的启动计时器
+startup_timer = StartupTimer()
@@ -0,0 +1,98 @@
+"""
+文本分句模块
+将流式输出的 token 切分为可独立合成的句子或短句
+"""
+
+from config import STREAM_MIN_CLAUSE_LENGTH, STREAM_MAX_UNIT_LENGTH
+
+# 句末标点（中英文），遇到即切分
+SENTENCE_ENDINGS = "。！？；…!?\n"
+# 分句标点，仅在已积累足够长度时切分，避免碎片过多
+CLAUSE_ENDINGS = "，、：,:;"
+# 英文标点需后接空白（中间可隔闭合符号）才视为边界，避免 3.14、1,000 等被误切
+ASCII_NEEDS_SPACE = ".,:;"
+# 紧跟在标点后的闭合符号应归入前一句
+CLOSING_CHARS = "\"'”’）)】]」』》"
+# 连续的句末标点（如“……”“？！”）归入同一句
+REPEATED_ENDINGS = "。！？…!?"
+# 以这些缩写结尾的 "." 不是句末（不区分大小写）
+ABBREVIATIONS = {"e.g", "i.e", "mr", "mrs", "ms", "dr", "prof", "vs", "st", "jr", "sr", "fig", "approx"}
+
+
+class SentenceSplitter:
+    """流式分句器
+
+    句末标点恰好位于缓冲区末尾时先不切分，等下一个片段到达，
+    使分在后一个片段中的闭合引号或括号（如“「好的。”+“」然后”）仍归入前一句。
+    """
+
+    def __init__(self, min_clause_length: int = STREAM_MIN_CLAUSE_LENGTH,
+                 max_unit_length: int = STREAM_MAX_UNIT_LENGTH):
+        self.min_clause_length = min_clause_length
+        self.max_unit_length = max_unit_length
+        self.buffer = ""
+
+    def _is_abbreviation(self, i: int, start: int) -> bool:
+        """位置 i 处的 "." 是否为缩写的一部分"""
+        words = self.buffer[start:i].split()
+        return bool(words) and words[-1].lstrip("(\"'“‘").lower() in ABBREVIATIONS
+
+    def _boundary(self, i: int, start: int):
+        """判断位置 i 处的字符是否构成边界，返回切分位置；None 表示不是边界，-1 表示需等待后续字符"""
+        ch = self.buffer[i]
+        is_sentence = ch in SENTENCE_ENDINGS or ch == "."
+        is_clause = ch in CLAUSE_ENDINGS
+
+        if not (is_sentence or is_clause):
+            return None
+
+        end = i + 1
+        while end < len(self.buffer) and (self.buffer[end] in CLOSING_CHARS
+                                          or (is_sentence and self.buffer[end] in REPEATED_ENDINGS)):
+            end += 1
+
+        if ch in ASCII_NEEDS_SPACE:
+            if end >= len(self.buffer):
+                return -1
+            if not self.buffer[end].isspace():
+                return None
+            if ch == "." and self._is_abbreviation(i, start):
+                return None
+        elif end >= len(self.buffer) and ch != "\n" and self.buffer[end - 1] not in CLOSING_CHARS:
+            # 闭合符号可能在下一个片段中
+            return -1
+
+        if is_clause and not is_sentence and i + 1 - start < self.min_clause_length:
+            return None
+        return end
+
+    def feed(self, text: str) -> list:
+        """输入新的文本片段，返回已完整的句子列表"""
+        self.buffer += text
+        units = []
+        start = 0
+        i = 0
+
+        while i < len(self.buffer):
+            end = self._boundary(i, start)
+            if end == -1:
+                break
+            if end is None and i + 1 - start >= self.max_unit_length:
+                # 超长且无标点，强制切分
+                end = i + 1
+            if end is not None:
+                unit = self.buffer[start:end].strip()
+                if unit:
+                    units.append(unit)
+                start = i = end
+                continue
+            i += 1
+
+        self.buffer = self.buffer[start:]
+        return units
+
+    def flush(self) -> str:
+        """流结束时取出剩余文本"""
+        tail = self.buffer.strip()
+        self.buffer = ""
+        return tail
@@ -4,10 +4,17 @@
 """
 
 import asyncio
+import importlib
 import tempfile
 import os
-import edge_tts
-from config import TTS_VOICE, VERBOSE
+from .tts_cache import TTSCache
+from .mock_tts import MockTTS, MOCK_TTS_OUTPUT_FORMAT
+from config import TTS_VOICE, TTS_BACKEND, TTS_CACHE_ENABLED, VERBOSE
+
+# Edge TTS 默认输出格式，作为缓存键的一部分
+TTS_OUTPUT_FORMAT = "audio-24khz-48kbitrate-mono-mp3"
+# Edge TTS 服务端域名，启动时预先解析
+TTS_HOST = "speech.platform.bing.com"
 
 def log(msg):
     if VERBOSE:
@@ -18,18 +25,69 @@ class TextToSpeech:
     
     def __init__(self):
         self.voice = TTS_VOICE
+        self.cache = TTSCache() if TTS_CACHE_ENABLED else None
+        
+        # 本地替身（离线压测），缓存键使用独立的输出格式
+        self.mock = MockTTS() if TTS_BACKEND == "mock" else None
+        self.output_format = MOCK_TTS_OUTPUT_FORMAT if self.mock is not None else TTS_OUTPUT_FORMAT
+    
+    async def stream(self, text: str):
+        """流式合成语音，逐块产出 MP3 数据"""
+        key = None
+        if self.cache is not None:
+            key = TTSCache.make_key(self.voice, text, self.output_format)
+            cached = self.cache.get(key)
+            if cached is not None:
+                log("⚡ TTS 缓存命中")
+                yield cached
+                return
+        
+        try:
+            audio_chunks = []
+            async for data in self._synthesize_stream(text):
+                audio_chunks.append(data)
+                yield data
+            
+            # 只缓存完整合成的音频（中途被打断时不会执行到这里）
+            if key is not None and audio_chunks:
+                self.cache.put(key, b"".join(audio_chunks))
+                    
+        except Exception as e:
+            log(f"❌ TTS 合成失败: {e}")
+    
+    async def _synthesize_stream(self, text: str):
+        """调用合成后端，逐块产出 MP3 数据"""
+        if self.mock is not None:
+            async for data in self.mock.stream(text):
+                yield data
+            return
+        
+        import edge_tts
+        
+        # 创建 TTS 通信对象
+        communicate = edge_tts.Communicate(text, self.voice)
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+    
+    async def preconnect(self):
+        """预热：导入 edge_tts 并提前解析服务端域名"""
+        if self.mock is not None:
+            return
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.run_in_executor(None, importlib.import_module, "edge_tts")
+            await loop.getaddrinfo(TTS_HOST, 443)
+        except Exception as e:
+            log(f"⚠️ TTS 预连接失败: {e}")
     
     async def synthesize(self, text: str) -> str:
         """合成语音并返回音频文件路径"""
         try:
-            # 创建 TTS 通信对象
-            communicate = edge_tts.Communicate(text, self.voice)
-            
             # 收集音频数据
             audio_chunks = []
-            async for chunk in communicate.stream():
-                if chunk["type"] == "audio":
-                    audio_chunks.append(chunk["data"])
+            async for data in self.stream(text):
+                audio_chunks.append(data)
             
             if not audio_chunks:
                 log("⚠️ TTS 未生成音频。")
@@ -0,0 +1,15 @@
+"""
+文本工具模块
+回复缓存、本地命令匹配与推测式请求共用的识别文本规范化
+"""
+
+import re
+import unicodedata
+
+# 规范化时去掉的字符：标点、符号与空白（识别结果在这些方面差异最大）
+STRIP_PATTERN = re.compile(r"[\s\W_]+", re.UNICODE)
+
+def normalize_query(text: str) -> str:
+    """规范化识别文本：全半角统一、小写、去掉标点与空白"""
+    text = unicodedata.normalize("NFKC", text).lower()
+    return STRIP_PATTERN.sub("", text)
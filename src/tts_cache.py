@@ -0,0 +1,157 @@
+"""
+TTS 缓存模块
+按 (音色, 规范化文本, 输出格式) 内容寻址的两级 LRU 音频缓存
+"""
+
+import hashlib
+import os
+import re
+import unicodedata
+from collections import OrderedDict
+
+from config import TTS_CACHE_DIR, TTS_CACHE_MEMORY_MB, TTS_CACHE_DISK_MB, VERBOSE
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+class TTSCache:
+    """两级 TTS 音频缓存
+
+    内存层与磁盘层各自按字节数上限做 LRU 淘汰；磁盘层以文件修改时间
+    记录最近使用顺序，进程重启后扫描目录即可恢复。
+    """
+
+    def __init__(self, cache_dir: str = TTS_CACHE_DIR,
+                 memory_limit: int = TTS_CACHE_MEMORY_MB * 1024 * 1024,
+                 disk_limit: int = TTS_CACHE_DISK_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+
+        self.memory = OrderedDict()  # key -> bytes
+        self.memory_bytes = 0
+        self.disk = OrderedDict()    # key -> 文件大小，按最近使用排序
+        self.disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_disk_index()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：全半角统一、合并空白"""
+        text = unicodedata.normalize("NFKC", text)
+        return re.sub(r"\s+", " ", text).strip()
+
+    @classmethod
+    def make_key(cls, voice: str, text: str, output_format: str) -> str:
+        """计算缓存键"""
+        content = "\n".join((voice, output_format, cls.normalize(text)))
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".mp3")
+
+    def _load_disk_index(self):
+        """扫描缓存目录，按修改时间重建磁盘层的 LRU 顺序"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".mp3"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+
+        for _, key, size in sorted(entries):
+            self.disk[key] = size
+            self.disk_bytes += size
+        log(f"✅ TTS 缓存已加载：{len(self.disk)} 条，{self.disk_bytes / 1024 / 1024:.1f} MB")
+
+    def _put_memory(self, key: str, data: bytes):
+        """写入内存层并淘汰最久未使用的条目"""
+        if len(data) > self.memory_limit:
+            return
+        if key in self.memory:
+            self.memory_bytes -= len(self.memory.pop(key))
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+
+        while self.memory_bytes > self.memory_limit:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def _put_disk(self, key: str, data: bytes):
+        """写入磁盘层并淘汰最久未使用的文件"""
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        if key in self.disk:
+            self.disk_bytes -= self.disk.pop(key)
+        self.disk[key] = len(data)
+        self.disk_bytes += len(data)
+
+        while self.disk_bytes > self.disk_limit and len(self.disk) > 1:
+            evicted, size = self.disk.popitem(last=False)
+            self.disk_bytes -= size
+            try:
+                os.unlink(self._path(evicted))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> bytes:
+        """读取缓存，未命中返回 None"""
+        data = self.memory.get(key)
+        if data is not None:
+            self.memory.move_to_end(key)
+            self.memory_hits += 1
+            return data
+
+        if key in self.disk:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                os.utime(path)  # 记录最近使用时间
+            except OSError:
+                self.disk_bytes -= self.disk.pop(key)
+            else:
+                self.disk.move_to_end(key)
+                self._put_memory(key, data)
+                self.disk_hits += 1
+                return data
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, data: bytes):
+        """写入缓存"""
+        if not data:
+            return
+        self._put_memory(key, data)
+        try:
+            self._put_disk(key, data)
+        except OSError as e:
+            log(f"⚠️ TTS 缓存写入失败: {e}")
+
+    def stats(self) -> dict:
+        """命中统计"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory_bytes,
+            "disk_entries": len(self.disk),
+            "disk_bytes": self.disk_bytes,
+        }
@@ -0,0 +1,47 @@
+"""
+批量转写入口
+并行转写目录或清单中的录音文件，结果写入 JSON Lines（每个文件一行，含片段时间戳），
+中断后使用相同的输出文件重新运行即可从未完成的文件继续
+
+用法:
+    python transcribe_batch.py recordings/ -o transcripts.jsonl
+    python transcribe_batch.py manifest.jsonl --workers 4 --cpu-threads 2 --decoding greedy
+"""
+
+import argparse
+import sys
+
+from src.batch_transcription import BatchTranscriber, discover, format_stats
+from config import BATCH_WORKERS, BATCH_CPU_THREADS, BATCH_DECODING, BATCH_OUTPUT, WHISPER_LANGUAGE
+
+def main():
+    parser = argparse.ArgumentParser(description="并行批量转写录音文件")
+    parser.add_argument("sources", nargs="+", help="录音目录、录音文件或清单（每行一个路径，或含 path 字段的 .jsonl）")
+    parser.add_argument("-o", "--output", default=BATCH_OUTPUT, help="结果文件（JSON Lines，已完成的文件会被跳过）")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="转写进程数，0 表示自动")
+    parser.add_argument("--cpu-threads", type=int, default=BATCH_CPU_THREADS, help="每个进程的推理线程数")
+    parser.add_argument("--decoding", default=BATCH_DECODING, choices=("adaptive", "greedy", "beam"),
+                        help="解码策略，greedy 吞吐量最高")
+    parser.add_argument("--language", default=WHISPER_LANGUAGE, help="指定语言（如 zh），默认逐个文件检测")
+    args = parser.parse_args()
+
+    items = []
+    for source in args.sources:
+        items.extend(discover(source))
+    if not items:
+        parser.error("没有找到录音文件")
+
+    transcriber = BatchTranscriber(args.output, workers=args.workers, cpu_threads=args.cpu_threads,
+                                   decoding=args.decoding, language=args.language)
+    stats = None
+    try:
+        stats = transcriber.run(items)
+    except KeyboardInterrupt:
+        print("\n⏸️ 已中断，使用相同的输出文件重新运行即可继续。")
+        sys.exit(130)
+    print(format_stats(stats))
+    if stats["failed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()